@@ -0,0 +1,219 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from controllers import CONTROLLERS
+from runner import SUMOCFG, run
+from scenarios import parse_scenario
+from sumo_backend import BACKENDS
+from traci_profile import Profiler
+
+# ---------------- CONFIG ----------------
+BENCH_DIR = "benchmarks"
+SCENARIO_DIR = os.path.join(BENCH_DIR, "scenarios")
+TRACE_DIR = os.path.join(BENCH_DIR, "traces")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.json")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_BACKEND = "headless"
+
+TOLERANCE = 0.10               # allowed slowdown against the baseline
+# ---------------------------------------
+
+
+def scenario_config(scenario):
+    """"grid" -> the bundled scenario, "grid:10x10[:demand]" -> generated"""
+    if scenario == "grid":
+        return SUMOCFG
+    return parse_scenario(scenario, SCENARIO_DIR)
+
+
+def trace_path(trace_dir, controller, scenario):
+    return os.path.join(trace_dir, f"{controller}@{scenario}.trace")
+
+
+def run_case(job):
+    """Worker: one controller on one scenario in a fresh process."""
+    controller, scenario, backend, max_sim_time, trace_dir = job
+    # replay needs neither SUMO nor the generated scenario files
+    sumocfg = None if backend == "replay" else scenario_config(scenario)
+    trace = trace_path(trace_dir, controller, scenario) if trace_dir else None
+    profiler = Profiler()
+
+    with tempfile.TemporaryDirectory() as out_dir, \
+            open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        summary = run(
+            controller,
+            backend=backend,
+            sumocfg=sumocfg,
+            max_sim_time=max_sim_time,
+            out_dir=out_dir,
+            quiet=True,
+            label=f"bench-{controller}",
+            trace=trace,
+            profiler=profiler,
+        )
+        wall = time.perf_counter() - started
+
+    ticks = np.asarray(profiler.samples.get("control_tick", [0.0])) * 1000
+    steps = max(summary["steps"], 1)
+    calls = sum(profiler.calls.values())
+    report = profiler.report()
+
+    return {
+        "controller": controller,
+        "scenario": scenario,
+        "backend": backend,
+        "steps": summary["steps"],
+        "wall_seconds": round(wall, 4),
+        "steps_per_second": round(steps / wall, 2),
+        "ticks": len(profiler.samples.get("control_tick", [])),
+        "tick_p50_ms": round(float(np.percentile(ticks, 50)), 4),
+        "tick_p99_ms": round(float(np.percentile(ticks, 99)), 4),
+        "traci_calls_per_step": round(calls / steps, 2),
+        "traci_calls": dict(profiler.calls.most_common()),
+        "section_seconds": {
+            name: s["total_s"] for name, s in report["sections"].items()
+        },
+        # ru_maxrss is in KiB on Linux; children = the SUMO process
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "sumo_peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def case_key(result):
+    return f"{result['controller']}@{result['scenario']}@{result['backend']}"
+
+
+def benchmark(controllers, scenarios, backend=DEFAULT_BACKEND,
+              max_sim_time=None, trace_dir=None):
+    """
+    Run every controller on every scenario, one at a time, each in its own
+    process (clean peak RSS, no state shared between cases).
+    trace_dir: with backend "replay" the cases run on the traces recorded
+    there (no SUMO); with a live backend the traces are recorded into it.
+    Returns {case key: result}.
+    """
+    if backend == "replay" and not trace_dir:
+        raise ValueError("the replay backend needs trace_dir")
+    if backend != "replay":
+        # scenarios are generated up front, outside the timed runs
+        for scenario in scenarios:
+            scenario_config(scenario)
+
+    jobs = [
+        (c, s, backend, max_sim_time, trace_dir)
+        for s in scenarios for c in controllers
+    ]
+    results = {}
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        for result in pool.imap(run_case, jobs):
+            results[case_key(result)] = result
+            print(f"{case_key(result):28s} {result['steps_per_second']:9.1f} "
+                  f"steps/s | tick p50 {result['tick_p50_ms']:7.3f} ms "
+                  f"p99 {result['tick_p99_ms']:7.3f} ms | "
+                  f"{result['traci_calls_per_step']:7.1f} calls/step | "
+                  f"RSS {result['peak_rss_mb']:.0f}+"
+                  f"{result['sumo_peak_rss_mb']:.0f} MB")
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Cases slower than the baseline by more than tolerance (steps/s down or
+    p99 tick latency up) -> list of (case, metric, baseline, now).
+    """
+    regressions = []
+    for key, now in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if now["steps_per_second"] < old["steps_per_second"] * (1 - tolerance):
+            regressions.append(
+                (key, "steps_per_second", old["steps_per_second"],
+                 now["steps_per_second"]))
+        if now["tick_p99_ms"] > old["tick_p99_ms"] * (1 + tolerance):
+            regressions.append(
+                (key, "tick_p99_ms", old["tick_p99_ms"], now["tick_p99_ms"]))
+    return regressions
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": platform.node(),
+            "python": platform.python_version(),
+            "cases": results,
+        }, f, indent=2)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)["cases"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Step throughput / control-tick latency of the controllers."
+    )
+    parser.add_argument(
+        "--controllers", nargs="+", choices=sorted(CONTROLLERS),
+        default=list(CONTROLLERS)
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", default=["grid"],
+        help="grid (bundled 3x3) and/or generated grids like grid:10x10 "
+             "or grid:20x20:peak (see scenarios.py)"
+    )
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        default=DEFAULT_BACKEND)
+    parser.add_argument("--max-sim-time", type=int, default=None)
+    parser.add_argument(
+        "--trace-dir", nargs="?", const=TRACE_DIR, default=None,
+        help=f"record TraCI traces there (default {TRACE_DIR}); with "
+             f"--backend replay, benchmark on them without SUMO"
+    )
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="store this run as the new baseline instead of comparing"
+    )
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = benchmark(
+        args.controllers, args.scenarios, args.backend, args.max_sim_time,
+        args.trace_dir
+    )
+    save_results(args.output, results)
+
+    if args.save_baseline:
+        save_results(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    regressions = compare(results, load_results(args.baseline), args.tolerance)
+    for key, metric, old, now in regressions:
+        print(f"REGRESSION {key}: {metric} {old} -> {now}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,136 @@
+import os
+import pickle
+
+from sumo_backend import traci
+
+# ---------------- CHECKPOINTS ----------------
+# A checkpoint is a pair of files next to each other:
+#   <name>.state.xml.gz   SUMO's own state (saveState): vehicles, signals, RNG
+#   <name>.ckpt           pickle of what lives in Python: controller state
+#                         (last_switch, fairness_age ...), pending decisions,
+#                         runner counters (KPIs, gridlock timer) and the byte
+#                         size of every log file at that moment
+# Signal programs installed through TraCI are not part of SUMO's state, so
+# they are stored in the pickle as plain tuples and reinstalled before the
+# state is loaded.
+#
+# The network comes back exactly as saved. SUMO's routing engine keeps
+# averaged edge speeds that saveState does not store, so checkpointed runs
+# switch that averaging off (SAVE_STATE_ARGS): trips are routed on the
+# network's static speeds and a resumed run matches the uninterrupted
+# checkpointed run byte for byte. The routes, and so the KPIs, can differ
+# from a run without checkpoints. Checkpoints saved with other SUMO args
+# still load, with a warning that the resumed run will drift.
+# ---------------------------------------------
+
+CHECKPOINT_DIR = "checkpoints"
+STATE_SUFFIX = ".state.xml.gz"
+META_SUFFIX = ".ckpt"
+
+# A resumed run continues exactly like the original only with the random
+# number generators and full float precision (default: 2 digits) in the
+# state, and with all trips loaded up front: trips read ahead of time
+# (route-steps) draw from the route RNG before they are part of the state.
+# Rerouting adaptation is off because its edge speeds are not in the state.
+SAVE_STATE_ARGS = [
+    "--save-state.rng", "true",
+    "--save-state.precision", "17",
+    "--route-steps", "0",
+    "--device.rerouting.adaptation-interval", "0",
+]
+
+
+def checkpoint_name(directory, controller_name, step):
+    return os.path.join(directory, f"{controller_name}_t{step:06d}")
+
+
+def _dump_programs(tls_ids):
+    programs = {}
+    for tls in tls_ids:
+        logics = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls)
+        programs[tls] = [
+            (logic.programID, logic.type, logic.currentPhaseIndex, [
+                (p.duration, p.state, p.minDur, p.maxDur, list(p.next))
+                for p in logic.phases
+            ])
+            for logic in logics
+        ]
+    return programs
+
+
+def _load_programs(programs):
+    for tls, logics in programs.items():
+        for program_id, kind, current, phases in logics:
+            traci.trafficlight.setCompleteRedYellowGreenDefinition(
+                tls, traci.trafficlight.Logic(program_id, kind, current, [
+                    traci.trafficlight.Phase(duration, state, min_dur,
+                                             max_dur, list(next_phases))
+                    for duration, state, min_dur, max_dur, next_phases in phases
+                ])
+            )
+
+
+def save_checkpoint(name, sim, loop):
+    """
+    Write <name>.state.xml.gz and <name>.ckpt for the current step.
+    loop holds the runner's own counters, restored as they are.
+    """
+    os.makedirs(os.path.dirname(name) or ".", exist_ok=True)
+
+    # every row logged so far is on disk, offsets mark where to resume
+    sim.telemetry.flush()
+    traci.simulation.saveState(name + STATE_SUFFIX)
+
+    meta = {
+        "step": sim.step,
+        "controller": sim.controller.name,
+        "params": sim.controller.p,
+        "controller_state": sim.controller.checkpoint_state(),
+        "scheduled": sim.scheduler.pending(),
+        "loop": loop,
+        "programs": _dump_programs(sim.tls_ids),
+        "log_format": sim.log_format,
+        "log_offsets": sim.telemetry.offsets(),
+        "state_file": os.path.basename(name + STATE_SUFFIX),
+        "sumo_args": list(SAVE_STATE_ARGS),
+    }
+    # written aside and renamed: a crash never leaves a half checkpoint
+    tmp = name + META_SUFFIX + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(meta, f)
+    os.replace(tmp, name + META_SUFFIX)
+    return name + META_SUFFIX
+
+
+def load_checkpoint(path):
+    """Read a .ckpt file (the suffix may be left out)."""
+    if not path.endswith(META_SUFFIX):
+        path += META_SUFFIX
+    with open(path, "rb") as f:
+        meta = pickle.load(f)
+    meta["state_file"] = os.path.join(os.path.dirname(path), meta["state_file"])
+    return meta
+
+
+def exact_restore(meta):
+    """False when the checkpoint's SUMO ran without today's SAVE_STATE_ARGS."""
+    return meta.get("sumo_args") == SAVE_STATE_ARGS
+
+
+def restore_simulation(meta):
+    """Bring a freshly started SUMO to the checkpointed network state."""
+    _load_programs(meta["programs"])
+    traci.simulation.loadState(meta["state_file"])
+
+
+def latest_checkpoint(directory, controller_name=None):
+    """Newest .ckpt in directory (of one controller), None if there is none."""
+    if not os.path.isdir(directory):
+        return None
+    prefix = f"{controller_name}_t" if controller_name else ""
+    names = sorted(
+        (f for f in os.listdir(directory)
+         if f.endswith(META_SUFFIX) and f.startswith(prefix)),
+        key=lambda f: f.rsplit("_t", 1)[-1]     # zero-padded step
+    )
+    return os.path.join(directory, names[-1]) if names else None
@@ -0,0 +1,391 @@
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# ---------------- COLUMNAR LOG FORMAT ----------------
+# Binary alternative to the CSV logs: one file per log, written as a stream
+# of chunks, each chunk holding every column of a batch of rows as a typed
+# array, zlib-compressed per column when that is smaller.
+#
+#   MAGIC
+#   u32 length + JSON header   {"columns": [...]}
+#   per chunk:
+#     u32 length + JSON meta   {"rows": n, "columns": [column meta, ...]}
+#     the column blobs, back to back
+#   footer (written by close()):
+#     u32 length + JSON index  {"rows": N, "chunks": [[offset, rows], ...]}
+#     u64 offset of the index + END_MAGIC
+#
+# A file without footer (run still going, or killed) is read by scanning
+# the chunks from the start.
+#
+# Column kinds (chosen per chunk from the values):
+#   int    -> narrowest of int8 / int16 / int32 / int64 holding the chunk
+#   float  -> float64
+#   mixed  -> float64 + packed bit mask of the values that were ints, so
+#             2 and 2.0 come back exactly as they were written to the CSV
+#   cat    -> narrow int codes into the column's category list (tls ids,
+#             switch reasons); new categories are stored in the chunk that
+#             first uses them
+# -----------------------------------------------------
+
+MAGIC = b"TLOG1\n"
+END_MAGIC = b"TLOGEND\n"
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+COMPRESS_LEVEL = 1      # fast; most of the gain is on repeated ints / codes
+
+INT_DTYPES = [np.int8, np.int16, np.int32, np.int64]
+
+
+def _narrow(array):
+    if len(array) == 0:
+        return array.astype(np.int8)
+    low, high = array.min(), array.max()
+    for dtype in INT_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return array.astype(dtype)
+    return array
+
+
+def _kind(values):
+    has_int = has_float = False
+    for v in values:
+        t = type(v)
+        if t is int:
+            has_int = True
+        elif t is float:
+            has_float = True
+        else:
+            return "cat"
+    if has_float:
+        return "mixed" if has_int else "float"
+    return "int"
+
+
+class ColumnarWriter:
+
+    def __init__(self, path, header, compress=True, offset=None):
+        """offset: resume an existing file, dropping everything after it"""
+        self.path = path
+        self.header = list(header)
+        self.compress = compress
+        self.categories = [dict() for _ in self.header]
+        self.rows = 0
+        self.chunks = []
+
+        if offset is None:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+            self._write_json({"columns": self.header})
+            return
+
+        # cut off the footer / later chunks, then pick up chunk index and
+        # category codes from what is left
+        with open(path, "r+b") as f:
+            f.truncate(offset)
+        with ColumnarReader(path) as reader:
+            if reader.columns != self.header:
+                raise ValueError(f"{path}: columns differ from {self.header}")
+            self.chunks = [list(chunk) for chunk in reader.chunks]
+            self.rows = reader.rows
+            for i, name in enumerate(self.header):
+                self.categories[i] = {
+                    v: code for code, v in enumerate(reader.categories(name))
+                }
+        self._file = open(path, "r+b")
+        self._file.seek(offset)
+
+    def _write_json(self, obj):
+        data = json.dumps(obj).encode()
+        self._file.write(_U32.pack(len(data)))
+        self._file.write(data)
+
+    def _encode(self, i, values):
+        kind = _kind(values)
+        meta = {"kind": kind}
+        extra = b""
+
+        if kind == "int":
+            array = _narrow(np.asarray(values, dtype=np.int64))
+        elif kind == "float":
+            array = np.asarray(values, dtype=np.float64)
+        elif kind == "mixed":
+            array = np.asarray(values, dtype=np.float64)
+            is_int = np.fromiter(
+                (type(v) is not float for v in values), bool, len(values)
+            )
+            extra = np.packbits(is_int).tobytes()
+        else:
+            categories = self.categories[i]
+            new = []
+            codes = np.empty(len(values), dtype=np.int32)
+            for n, v in enumerate(values):
+                v = "" if v is None else str(v)
+                code = categories.get(v)
+                if code is None:
+                    code = categories[v] = len(categories)
+                    new.append(v)
+                codes[n] = code
+            meta["new_categories"] = new
+            array = _narrow(codes)
+
+        data = array.tobytes()
+        blob = data + extra
+        meta["dtype"] = array.dtype.str
+        meta["nbytes"] = len(data)
+        meta["mask_nbytes"] = len(extra)
+        meta["codec"] = "raw"
+
+        if self.compress:
+            packed = zlib.compress(blob, COMPRESS_LEVEL)
+            if len(packed) < len(blob):
+                blob = packed
+                meta["codec"] = "zlib"
+
+        meta["size"] = len(blob)
+        return meta, blob
+
+    def write_batch(self, columns):
+        """columns: one list of values per header column, equal lengths"""
+        rows = len(columns[0]) if columns else 0
+        if rows == 0:
+            return
+        metas, blobs = [], []
+        for i, values in enumerate(columns):
+            meta, blob = self._encode(i, values)
+            metas.append(meta)
+            blobs.append(blob)
+
+        self.chunks.append([self._file.tell(), rows])
+        self._write_json({"rows": rows, "columns": metas})
+        for blob in blobs:
+            self._file.write(blob)
+        self.rows += rows
+
+    def flush(self):
+        self._file.flush()
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        index_offset = self._file.tell()
+        self._write_json({"rows": self.rows, "chunks": self.chunks})
+        self._file.write(_U64.pack(index_offset))
+        self._file.write(END_MAGIC)
+        self._file.close()
+
+
+class ColumnarReader:
+    """
+    Memory-maps a .tlog file. Uncompressed column blobs come back as
+    zero-copy views into the map; compressed ones are inflated per chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a columnar log file")
+        header, self._data_start = self._read_json(len(MAGIC))
+        self.columns = header["columns"]
+        self.chunks = self._chunk_offsets()
+        self.rows = sum(rows for _, rows in self.chunks)
+        self._categories = None
+
+    def _read_json(self, pos):
+        (length,) = _U32.unpack_from(self._mm, pos)
+        start = pos + _U32.size
+        return json.loads(self._mm[start:start + length]), start + length
+
+    def _chunk_offsets(self):
+        tail = _U64.size + len(END_MAGIC)
+        if len(self._mm) >= tail and self._mm[-len(END_MAGIC):] == END_MAGIC:
+            (index_offset,) = _U64.unpack_from(self._mm, len(self._mm) - tail)
+            index, _ = self._read_json(index_offset)
+            return [tuple(chunk) for chunk in index["chunks"]]
+
+        # no footer: scan the chunks, ignore a partly written last one
+        chunks = []
+        pos = self._data_start
+        while pos + _U32.size <= len(self._mm):
+            try:
+                meta, data_pos = self._read_json(pos)
+            except ValueError:
+                break
+            next_pos = data_pos + sum(col["size"] for col in meta["columns"])
+            if next_pos > len(self._mm):
+                break
+            chunks.append((pos, meta["rows"]))
+            pos = next_pos
+        return chunks
+
+    def _decode(self, col, rows, pos):
+        if col["codec"] == "zlib":
+            buffer = zlib.decompress(self._mm[pos:pos + col["size"]])
+            start = 0
+        else:
+            buffer = self._mm
+            start = pos
+
+        dtype = np.dtype(col["dtype"])
+        array = np.frombuffer(
+            buffer, dtype, count=col["nbytes"] // dtype.itemsize, offset=start
+        )
+        if not col["mask_nbytes"]:
+            return array, None
+
+        mask_start = start + col["nbytes"]
+        mask = np.frombuffer(
+            buffer, np.uint8, count=col["mask_nbytes"], offset=mask_start
+        )
+        return array, np.unpackbits(mask, count=rows).astype(bool)
+
+    def iter_chunks(self):
+        """Yield (chunk meta, [(array, int mask or None), ...]) per chunk."""
+        for offset, _ in self.chunks:
+            meta, pos = self._read_json(offset)
+            arrays = []
+            for col in meta["columns"]:
+                arrays.append(self._decode(col, meta["rows"], pos))
+                pos += col["size"]
+            yield meta, arrays
+
+    def categories(self, name):
+        """Category list of a categorical column (code -> original text)."""
+        if self._categories is None:
+            self._categories = [[] for _ in self.columns]
+            for offset, _ in self.chunks:
+                meta, _ = self._read_json(offset)
+                for i, col in enumerate(meta["columns"]):
+                    self._categories[i].extend(col.get("new_categories", ()))
+        return self._categories[self.columns.index(name)]
+
+    def column(self, name):
+        """
+        Whole column as one NumPy array: codes for categorical columns
+        (see categories()), float64 for columns mixing ints and floats.
+        """
+        i = self.columns.index(name)
+        parts = [arrays[i][0] for _, arrays in self.iter_chunks()]
+        if not parts:
+            return np.zeros(0)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts)
+
+    def read(self):
+        return {name: self.column(name) for name in self.columns}
+
+    def iter_rows(self):
+        """Rows as Python values, exactly as they were logged."""
+        categories = [self.categories(name) for name in self.columns]
+        for meta, arrays in self.iter_chunks():
+            columns = []
+            for col, (array, is_int), cats in zip(
+                    meta["columns"], arrays, categories):
+                if col["kind"] == "cat":
+                    columns.append([cats[c] for c in array.tolist()])
+                elif is_int is not None:
+                    columns.append([
+                        int(v) if flag else v
+                        for v, flag in zip(array.tolist(), is_int.tolist())
+                    ])
+                else:
+                    columns.append(array.tolist())
+            yield from zip(*columns)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------- CSV CONVERSION ----------------
+
+def _parse(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def to_csv(tlog_path, csv_path=None):
+    csv_path = csv_path or os.path.splitext(tlog_path)[0] + ".csv"
+    with ColumnarReader(tlog_path) as reader, \
+            open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(reader.columns)
+        writer.writerows(reader.iter_rows())
+    return csv_path
+
+
+def from_csv(csv_path, tlog_path=None, chunk_rows=4096):
+    tlog_path = tlog_path or os.path.splitext(csv_path)[0] + ".tlog"
+    with open(csv_path, newline="") as f:
+        rows = csv.reader(f)
+        writer = ColumnarWriter(tlog_path, next(rows))
+        batch = []
+        for row in rows:
+            batch.append([_parse(v) for v in row])
+            if len(batch) >= chunk_rows:
+                writer.write_batch([list(c) for c in zip(*batch)])
+                batch = []
+        if batch:
+            writer.write_batch([list(c) for c in zip(*batch)])
+        writer.close()
+    return tlog_path
+
+# ------------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Inspect / convert columnar .tlog run logs."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("to-csv", help=".tlog -> .csv, original header")
+    p.add_argument("src")
+    p.add_argument("dst", nargs="?")
+    p = commands.add_parser("from-csv", help=".csv -> .tlog")
+    p.add_argument("src")
+    p.add_argument("dst", nargs="?")
+    p = commands.add_parser("info", help="rows, chunks and column dtypes")
+    p.add_argument("src")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-csv":
+        print(to_csv(args.src, args.dst))
+    elif args.command == "from-csv":
+        print(from_csv(args.src, args.dst))
+    else:
+        with ColumnarReader(args.src) as reader:
+            print(f"{args.src}: {reader.rows} rows, {len(reader.chunks)} "
+                  f"chunks, {os.path.getsize(args.src)} bytes")
+            for name, array in reader.read().items():
+                print(f"  {name:16s} {array.dtype}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
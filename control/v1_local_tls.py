@@ -1,9 +1,13 @@
-import traci
 import traci.constants as tc
 import os
 import sys
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from sumo_backend import sumo_binary, traci
+from lane_sensing import lane_queue, read_lane_states, subscribe_lanes, topology_lanes
+from tls_topology import build_topology
+
 # ---------------- CONFIG ----------------
 SUMO_CFG = "config/grid.sumocfg"
 
@@ -16,13 +20,13 @@ def get_queue_length(lanes):
     """Return total halting vehicles on given lanes"""
     q = 0
     for lane in lanes:
-        q += traci.lane.getLastStepHaltingNumber(lane)
+        q += lane_queue(lane)
     return q
 
 
 def main():
     sumo_cmd = [
-        "sumo-gui",
+        sumo_binary(),
         "-c", SUMO_CFG,
         "--step-length", "1"
     ]
@@ -32,6 +36,8 @@ def main():
 
     tls_ids = traci.trafficlight.getIDList()
     print("Traffic Lights:", tls_ids)
+    topology = build_topology(tls_ids)
+    subscribe_lanes(topology_lanes(topology))
 
     # Track timing
     last_switch = {tls: 0 for tls in tls_ids}
@@ -46,9 +52,10 @@ def main():
         if sim_time % CONTROL_STEP != 0:
             continue
 
+        read_lane_states()
+
         for tls in tls_ids:
-            logic = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls)[0]
-            phases = logic.phases
+            phases = topology[tls]["phases"]
             current_phase = traci.trafficlight.getPhase(tls)
 
             # Enforce min / max green
@@ -59,11 +66,11 @@ def main():
             # Collect pressure per phase
             phase_pressure = []
 
-            controlled_lanes = traci.trafficlight.getControlledLanes(tls)
+            controlled_lanes = topology[tls]["controlled_lanes"]
 
-            for i, phase in enumerate(phases):
+            for i, phase_state in enumerate(phases):
                 lanes_for_phase = []
-                for idx, state in enumerate(phase.state):
+                for idx, state in enumerate(phase_state):
                     if state == 'G':
                         lanes_for_phase.append(controlled_lanes[idx])
 
@@ -0,0 +1,628 @@
+import statistics
+
+from forecast import QueueForecaster
+from policy import MLPPolicy, PhaseLayout, linear_policy
+from sumo_backend import traci
+from tls_topology import set_program_logic
+
+# ---------------- CONTROLLER PLUGINS ----------------
+# Every signal strategy (Base, V1 ... V5) is a Controller subclass registered
+# under its short name. The runner owns the simulation loop, metrics,
+# gridlock detection and CSV setup; a controller only declares its CONFIG
+# (params), its extra logs and what happens when a junction is due. After
+# each decision the controller schedules the junction's next decision time,
+# so junctions that are not due cost nothing per step.
+# ----------------------------------------------------
+
+CONTROLLERS = {}
+
+
+def register_controller(name):
+    def decorator(cls):
+        cls.name = name
+        CONTROLLERS[name] = cls
+        return cls
+    return decorator
+
+
+def get_controller(name, params=None):
+    if name not in CONTROLLERS:
+        raise KeyError(
+            f"unknown controller {name!r} (available: {', '.join(CONTROLLERS)})"
+        )
+    return CONTROLLERS[name](params)
+
+
+class Controller:
+    name = None
+    title = ""
+    params = {}              # CONFIG defaults, overridable per run
+    max_sim_time = 4000      # hard stop (seconds)
+    print_every = 20         # progress print interval, None = silent
+    gridlock_check = True
+    results_file = None      # default: results_<name>_experiment.csv
+    logs = {}                # log name -> (file name, header)
+
+    def __init__(self, params=None):
+        unknown = set(params or {}) - set(self.params)
+        if unknown:
+            raise KeyError(
+                f"{self.name}: unknown params {sorted(unknown)} "
+                f"(available: {sorted(self.params)})"
+            )
+        self.p = dict(self.params)
+        self.p.update(params or {})
+        self.run = None
+        self.forecaster = None
+
+    def start(self, run):
+        """
+        Called once after the network is loaded (or a checkpoint forked);
+        schedule the first decisions relative to run.step.
+        """
+        self.run = run
+        mode = self.p.get("QUEUE_INPUT", "current")
+        if mode not in ("current", "forecast"):
+            raise ValueError(f"{self.name}: unknown QUEUE_INPUT {mode!r}")
+        if mode == "forecast":
+            # the runner feeds it every step (runner.py)
+            self.forecaster = QueueForecaster(
+                len(run.engine.lanes) + 1,
+                horizon=self.p["FORECAST_HORIZON"])
+
+    def checkpoint_state(self):
+        """Everything the controller keeps between decisions, picklable."""
+        return {k: v for k, v in vars(self).items() if k not in ("run", "p")}
+
+    def restore_state(self, run, state):
+        """Resume from checkpoint_state() instead of start()."""
+        self.run = run
+        vars(self).update(state)
+
+    def schedule(self, tls, time):
+        self.run.scheduler.schedule(tls, time)
+
+    def queue_input(self):
+        """
+        Halting vector over the engine lanes for the pressure scores: the
+        current one, or with QUEUE_INPUT "forecast" the forecast
+        FORECAST_HORIZON seconds ahead (forecast.py), learnt from the
+        vectors of every step so far.
+        """
+        if self.forecaster is not None:
+            return self.forecaster.predict()
+        return self.run.engine.lane_vector(self.run.lane_states["halting"])
+
+    def control(self, step, due):
+        """Decide for the junctions due at this step (lane states are fresh)."""
+
+
+# ---------------- SHARED LOG HEADERS ----------------
+QUEUE_CONTROL_HEADER = [
+    "time",
+    "tls",
+    "selected_phase",
+    "max_queue",
+    "avg_queue",
+    "phase_switched"
+]
+
+SWITCH_REASON_HEADER = [
+    "time", "tls",
+    "prev_phase", "new_phase",
+    "switch_reason"
+]
+# ----------------------------------------------------
+
+
+@register_controller("base")
+class BaseController(Controller):
+    """Base model: SUMO's own static programs, no external control."""
+    title = "Base model"
+    print_every = 1
+    results_file = "results_base_experimental.csv"
+
+
+def _native_segment(durations, phase, length):
+    """
+    Phases the native program runs for `length` seconds starting fresh in
+    `phase` -> [(phase, seconds), ...], and the phase showing at the end.
+    """
+    segment = []
+    t = 0
+    while t + durations[phase] <= length:
+        segment.append((phase, durations[phase]))
+        t += durations[phase]
+        phase = (phase + 1) % len(durations)
+    if t < length:
+        segment.append((phase, length - t))
+    return segment, phase
+
+
+def fixed_time_schedule(durations, hold, first_switch):
+    """
+    Compile "advance one phase every `hold` seconds on top of the native
+    program" into a static phase list.
+
+    Between two forced switches the native program runs on its own, so the
+    phase forced at a switch only depends on the phase forced at the one
+    before: the sequence becomes periodic after a short lead-in. Returns
+    (entries, loop_to, forced, loop_from):
+      entries   [(native phase, seconds), ...] in program order
+      loop_to   entry the program continues with after the last one
+      forced    phase selected at each switch time, in order
+      loop_from index into forced where its repeating part starts
+    """
+    entries, first = _native_segment(durations, 0, first_switch)
+    forced = []
+    seen = {}      # forced phase -> (entry index, index in forced)
+
+    phase = (first + 1) % len(durations)
+    while phase not in seen:
+        seen[phase] = (len(entries), len(forced))
+        forced.append(phase)
+        segment, last = _native_segment(durations, phase, hold)
+        entries.extend(segment)
+        phase = (last + 1) % len(durations)
+
+    loop_to, loop_from = seen[phase]
+    return entries, loop_to, forced, loop_from
+
+
+@register_controller("v1")
+class FixedTimeController(Controller):
+    """
+    V1 fixed-time: advance every TLS one phase each CONTROL_INTERVAL.
+
+    The schedule is compiled into a static SUMO program at start, so SUMO
+    switches the signals by itself; the controller is only called at the
+    switch times to log the queues. OFFSET shifts the switch times of each
+    junction by that many seconds relative to the previous one.
+    """
+    title = "V1 Fixed-Time"
+    params = {
+        "CONTROL_INTERVAL": 60,
+        "MIN_GREEN": 15,
+        "MAX_GREEN": 60,
+        "OFFSET": 0,
+    }
+    max_sim_time = 2000
+    print_every = None
+    gridlock_check = False
+    logs = {
+        "control": ("control_log_v1_experiment.csv", QUEUE_CONTROL_HEADER),
+    }
+
+    def start(self, run):
+        super().start(run)
+        self.hold = max(self.p["CONTROL_INTERVAL"], self.p["MIN_GREEN"])
+        self.first_switch = {}
+        self.forced = {}
+
+        for i, tls in enumerate(run.tls_ids):
+            first = (i * self.p["OFFSET"]) % self.hold or self.hold
+            self.first_switch[tls] = run.step + first
+            self.install_program(tls, first)
+            self.schedule(tls, run.step + first)
+
+    def install_program(self, tls, first_switch):
+        logic = self.run.topology[tls]["logic"]
+        durations = [phase.duration for phase in logic.phases]
+        entries, loop_to, forced, loop_from = fixed_time_schedule(
+            durations, self.hold, first_switch
+        )
+        self.forced[tls] = (forced, loop_from)
+        if len(durations) == 1:
+            return      # nothing to advance: the native program stays
+
+        phases = [
+            traci.trafficlight.Phase(seconds, logic.phases[phase].state)
+            for phase, seconds in entries
+        ]
+        if loop_to:
+            phases[-1].next = [loop_to]
+        program = traci.trafficlight.Logic(
+            f"{logic.programID}_v1_fixed", logic.type, 0, phases
+        )
+        set_program_logic(tls, program)
+
+    def forced_phase(self, tls, step):
+        """Native phase index the fixed-time schedule selects at step."""
+        forced, loop_from = self.forced[tls]
+        k = (step - self.first_switch[tls]) // self.hold
+        if k >= len(forced):
+            k = loop_from + (k - loop_from) % (len(forced) - loop_from)
+        return forced[k]
+
+    def control(self, step, due):
+        queues_now = self.run.lane_states["halting"]
+
+        for tls in due:
+            topo = self.run.topology[tls]
+            next_phase = self.forced_phase(tls, step)
+            self.schedule(tls, step + self.hold)
+
+            # ---- CONTROL LOGGING ----
+            queues = [queues_now[l] for l in topo["controlled_lanes"]]
+
+            self.run.log("control", [
+                step,
+                tls,
+                next_phase,
+                max(queues) if queues else 0,
+                statistics.mean(queues) if queues else 0,
+                1  # always switches in fixed-time
+            ])
+
+
+@register_controller("v2")
+class QueueThresholdController(Controller):
+    """V2: advance to the next phase once any incoming lane has a queue."""
+    title = "V2 Queue-Threshold"
+    params = {
+        "MIN_GREEN": 15,
+        "MAX_GREEN": 40,
+        "CONTROL_INTERVAL": 10,
+    }
+    print_every = 10
+    logs = {
+        "control": ("control_log_v2_experiment.csv", QUEUE_CONTROL_HEADER),
+    }
+
+    def start(self, run):
+        super().start(run)
+        self.hold = max(self.p["MIN_GREEN"], self.p["CONTROL_INTERVAL"])
+        self.last_switch_time = {tls: run.step for tls in run.tls_ids}
+        for tls in run.tls_ids:
+            if run.topology[tls]["incoming_lanes"]:
+                self.schedule(tls, run.step + self.hold)
+
+    def control(self, step, due):
+        queues_now = self.run.lane_states["halting"]
+
+        for tls in due:
+            topo = self.run.topology[tls]
+            incoming_lanes = topo["incoming_lanes"]
+            elapsed = step - self.last_switch_time[tls]
+
+            queues = [queues_now[lane] for lane in incoming_lanes]
+            current_phase = traci.trafficlight.getPhase(tls)
+
+            switched = 0
+            next_phase = current_phase
+
+            if elapsed >= self.p["MAX_GREEN"] or max(queues) > 0:
+                next_phase = (current_phase + 1) % topo["num_phases"]
+                traci.trafficlight.setPhase(tls, next_phase)
+                self.last_switch_time[tls] = step
+                switched = 1
+
+            # re-checked every step until the queue threshold fires
+            self.schedule(tls, step + (self.hold if switched else 1))
+
+            # ---- CONTROL LOGGING (DECISION INSTANT) ----
+            self.run.log("control", [
+                step,
+                tls,
+                next_phase,
+                max(queues),
+                statistics.mean(queues),
+                switched
+            ])
+
+
+def top_two(pressures):
+    sorted_p = sorted(pressures, reverse=True)
+    second = sorted_p[1] if len(sorted_p) > 1 else 0
+    return sorted_p[0], second, sorted_p[0] - second
+
+
+@register_controller("v3")
+class MaxPressureController(Controller):
+    """V3 TRUE Max-Pressure: sum of (q_up - q_down) over green movements."""
+    title = "V3 TRUE Max-Pressure"
+    params = {
+        "CONTROL_INTERVAL": 10,
+        "QUEUE_INPUT": "current",
+        "FORECAST_HORIZON": 10,
+    }
+    logs = {
+        "control": ("control_log_v3_experiment.csv", [
+            "time",
+            "tls",
+            "selected_phase",
+            "pressure_best",
+            "pressure_second",
+            "pressure_gap",
+            "phase_switched"
+        ]),
+    }
+
+    def start(self, run):
+        super().start(run)
+        for tls in run.tls_ids:
+            self.schedule(tls, run.step + self.p["CONTROL_INTERVAL"])
+
+    def score(self):
+        return self.run.engine.score(self.queue_input(), scoring="v3")
+
+    def control(self, step, due):
+        engine = self.run.engine
+        # scored for every junction at once
+        with self.run.profiler.section("pressure"):
+            scores = self.score()
+
+        for tls in due:
+            pressures = scores["pressure"][engine.phases(tls)].tolist()
+            best_phase = pressures.index(max(pressures))
+
+            current_phase = traci.trafficlight.getPhase(tls)
+            switched = int(best_phase != current_phase)
+
+            traci.trafficlight.setPhase(tls, best_phase)
+            self.schedule(tls, step + self.p["CONTROL_INTERVAL"])
+
+            self.run.log("control", [step, tls, best_phase, *top_two(pressures), switched])
+
+
+class FairnessController(Controller):
+    """Shared V4 / V5 loop: pressure + fairness age, MIN/MAX green, reasons."""
+
+    def start(self, run):
+        super().start(run)
+        self.hold = max(self.p["CONTROL_INTERVAL"], self.p["MIN_GREEN"])
+        self.last_switch = {tls: run.step for tls in run.tls_ids}
+        self.fairness_age = run.engine.age_vector()
+        for tls in run.tls_ids:
+            self.schedule(tls, run.step + self.hold)
+
+    def phase_values(self, scores, tls, step):
+        """-> pressures, ages and the extra control-log columns of each phase"""
+        raise NotImplementedError
+
+    def switch_reason(self, pressure_wants_switch, tmax_forces_switch):
+        raise NotImplementedError
+
+    def control(self, step, due):
+        with self.run.profiler.section("pressure"):
+            scores = self.score()
+
+        for tls in due:
+            elapsed = step - self.last_switch[tls]
+            pressures, ages, extra = self.phase_values(scores, tls, step)
+
+            best_phase = pressures.index(max(pressures))
+            current_phase = traci.trafficlight.getPhase(tls)
+
+            pressure_wants_switch = (best_phase != current_phase)
+            tmax_forces_switch = (elapsed >= self.p["MAX_GREEN"])
+            reason = self.switch_reason(pressure_wants_switch, tmax_forces_switch)
+
+            if reason:
+                traci.trafficlight.setPhase(tls, best_phase)
+                self.last_switch[tls] = step
+
+                self.run.log("switch", [
+                    step, tls, current_phase, best_phase, reason
+                ])
+
+                # reset the age value after switch happens
+                self.run.engine.reset_age(self.fairness_age, tls)
+
+            # held for MIN_GREEN / CONTROL_INTERVAL after a switch,
+            # otherwise re-evaluated (and state-logged) every step
+            self.schedule(tls, step + (self.hold if reason else 1))
+
+            # every controlled incoming lane ages by one per link each tick
+            self.run.engine.advance_age(self.fairness_age, tls)
+
+            self.run.log("control", [
+                step,
+                tls,
+                best_phase,
+                *top_two(pressures),
+                max(ages),
+                statistics.mean(ages),
+                *extra[best_phase],
+                int(pressure_wants_switch)
+            ])
+
+
+@register_controller("v4")
+class FairnessMaxPressureController(FairnessController):
+    """V4 Fairness + downstream aware: ALPHA*qi - BETA*qj + GAMMA*ai."""
+    title = "V4 Fairness + Downstream Aware Max-Pressure"
+    params = {
+        "CONTROL_INTERVAL": 10,
+        "MIN_GREEN": 15,
+        "MAX_GREEN": 40,
+        "ALPHA": 1,
+        "BETA": 0.7,
+        "GAMMA": 0.3,
+        "QUEUE_INPUT": "current",
+        "FORECAST_HORIZON": 10,
+    }
+    logs = {
+        "state": ("state_log_v4_experiment.csv",
+                  ["time", "tls", "phase", "qi", "qj", "ai"]),
+        "control": ("control_log_v4_experiment.csv", [
+            "time", "tls",
+            "selected_phase",
+            "pressure_best", "pressure_second",
+            "pressure_gap",
+            "max_age", "avg_age",
+            "phase_switched"
+        ]),
+        "switch": ("switch_reason_v4_experiment.csv", SWITCH_REASON_HEADER),
+    }
+
+    def score(self):
+        return self.run.engine.score(
+            self.queue_input(), self.fairness_age, scoring="v4",
+            alpha=self.p["ALPHA"], beta=self.p["BETA"], gamma=self.p["GAMMA"]
+        )
+
+    def phase_values(self, scores, tls, step):
+        rows = self.run.engine.phases(tls)
+        qi = scores["q_up"][rows].tolist()
+        qj = scores["q_down"][rows].tolist()
+        ages = scores["age"][rows].tolist()
+
+        for p in range(len(ages)):
+            self.run.log("state", [step, tls, p, qi[p], qj[p], ages[p]])
+
+        return scores["pressure"][rows].tolist(), ages, [()] * len(ages)
+
+    def switch_reason(self, pressure_wants_switch, tmax_forces_switch):
+        if tmax_forces_switch:
+            return "TMAX"
+        if pressure_wants_switch:
+            return "PRESSURE"
+        return None
+
+
+@register_controller("v5")
+class AdaptiveMaxPressureController(FairnessController):
+    """V5 adaptive beta(t)/gamma(t) max-pressure with fairness age."""
+    title = "V5 Adaptive β(t)/γ(t) Max-Pressure"
+    params = {
+        "CONTROL_INTERVAL": 10,
+        "MIN_GREEN": 15,
+        "MAX_GREEN": 40,
+        "ALPHA": 1.0,
+        "BETA_MIN": 0.3,
+        "BETA_MAX": 0.9,
+        "GAMMA_MIN": 0.1,
+        "GAMMA_MAX": 0.5,
+        "FAIRNESS_LIMIT": 60,
+        "QUEUE_INPUT": "current",
+        "FORECAST_HORIZON": 10,
+    }
+    logs = {
+        "state": ("state_log_v5_experiment.csv", [
+            "time", "tls", "phase",
+            "q_up", "q_down", "max_age",
+            "beta", "gamma", "pressure"
+        ]),
+        "control": ("control_log_v5_experiment.csv", [
+            "time", "tls", "selected_phase",
+            "pressure_best", "pressure_second",
+            "pressure_gap",
+            "max_age", "avg_age",
+            "beta", "gamma",
+            "phase_switched"
+        ]),
+        "switch": ("switch_reason_v5_experiment.csv", SWITCH_REASON_HEADER),
+    }
+
+    def score(self):
+        p = self.p
+        return self.run.engine.score(
+            self.queue_input(), self.fairness_age, scoring="v5",
+            alpha=p["ALPHA"],
+            beta_min=p["BETA_MIN"], beta_max=p["BETA_MAX"],
+            gamma_min=p["GAMMA_MIN"], gamma_max=p["GAMMA_MAX"],
+            fairness_limit=p["FAIRNESS_LIMIT"]
+        )
+
+    def phase_values(self, scores, tls, step):
+        """Phases without a green movement score 0 and are not state-logged."""
+        rows = self.run.engine.phases(tls)
+        green = scores["has_green"][rows].tolist()
+        q_up = scores["q_up"][rows].tolist()
+        q_down = scores["q_down"][rows].tolist()
+        max_age = scores["max_age"][rows].tolist()
+        beta = scores["beta"][rows].tolist()
+        gamma = scores["gamma"][rows].tolist()
+        raw = scores["raw"][rows].tolist()
+        pressure = scores["pressure"][rows].tolist()
+
+        pressures, betas, gammas, ages = [], [], [], []
+
+        for p in range(len(green)):
+            if not green[p]:
+                pressures.append(0.0)
+                betas.append(0.0)
+                gammas.append(0.0)
+                ages.append(0.0)
+                continue
+
+            self.run.log("state", [
+                step, tls, p,
+                q_up[p], q_down[p], max_age[p],
+                beta[p], gamma[p], raw[p]
+            ])
+
+            pressures.append(pressure[p])
+            betas.append(beta[p])
+            gammas.append(gamma[p])
+            ages.append(max_age[p])
+
+        return pressures, ages, list(zip(betas, gammas))
+
+    def switch_reason(self, pressure_wants_switch, tmax_forces_switch):
+        if tmax_forces_switch and not pressure_wants_switch:
+            return "TMAX"
+        if pressure_wants_switch:
+            return "PRESSURE"
+        return None
+
+
+@register_controller("policy")
+class PolicyController(Controller):
+    """
+    Learned / parametric policy: the phases of all due junctions are scored
+    in one batched forward pass (policy.py). WEIGHTS is a .npz policy file;
+    None uses a linear policy with V4's terms and weights. It is not V4:
+    scores are not floored at 0 and there is no MAX_GREEN, so ties and
+    all-negative junctions can pick other phases than V4 does.
+    """
+    title = "Batched Policy"
+    params = {
+        "CONTROL_INTERVAL": 10,
+        "MIN_GREEN": 15,
+        "WEIGHTS": None,
+    }
+    logs = {
+        "control": ("control_log_policy_experiment.csv", [
+            "time", "tls",
+            "selected_phase",
+            "score_best", "score_second",
+            "score_gap",
+            "phase_switched"
+        ]),
+    }
+
+    def start(self, run):
+        super().start(run)
+        self.hold = max(self.p["CONTROL_INTERVAL"], self.p["MIN_GREEN"])
+        self.policy = (MLPPolicy.load(self.p["WEIGHTS"]) if self.p["WEIGHTS"]
+                       else linear_policy())
+        self.layout = PhaseLayout(run.engine, run.topology, run.tls_ids)
+        self.fairness_age = run.engine.age_vector()
+        for tls in run.tls_ids:
+            self.schedule(tls, run.step + self.hold)
+
+    def control(self, step, due):
+        engine = self.run.engine
+        current = [traci.trafficlight.getPhase(tls) for tls in due]
+        with self.run.profiler.section("pressure"):
+            queues = engine.lane_vector(self.run.lane_states["halting"])
+            terms = engine.terms(queues, self.fairness_age)
+            junctions = [self.layout.index[tls] for tls in due]
+            obs = self.layout.observe(terms, current, junctions)
+            choice, scores = self.policy.act(obs, self.layout.mask[junctions])
+
+        for tls, phase, best_phase, row in zip(due, current, choice.tolist(),
+                                               scores.tolist()):
+            switched = int(best_phase != phase)
+            if switched:
+                traci.trafficlight.setPhase(tls, best_phase)
+                engine.reset_age(self.fairness_age, tls)
+            self.schedule(tls, step + (self.hold if switched
+                                       else self.p["CONTROL_INTERVAL"]))
+            engine.advance_age(self.fairness_age, tls)
+
+            valid = [s for s in row if s != float("-inf")]
+            self.run.log("control", [step, tls, best_phase, *top_two(valid),
+                                     switched])
@@ -0,0 +1,297 @@
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+from columnar import ColumnarReader
+from controllers import CONTROLLERS
+from pressure_engine import SCORING
+from sweep import grid_configs, parse_values
+from telemetry import FORMATS, log_path
+
+# ---------------- COUNTERFACTUAL EVALUATION ----------------
+# Re-scores the per-phase state a V4 / V5 run logged (state_log_*) with other
+# scoring parameters, or another formula, and reports how often the decision
+# would have been the same, the pressure gaps and the switches it implies.
+# Open loop: every decision sees the states of the recorded run, so this is
+# a fast pre-filter for parameter sets, not a substitute for simulating them.
+#
+# Decisions are the consecutive state rows of one (time, tls). They are read
+# in chunks and all parameter sets of a batch are scored at once, as a
+# (params x rows) array.
+# -----------------------------------------------------------
+
+CHUNK_ROWS = 1 << 16
+
+# state log columns -> pressure engine terms, per logging controller
+SOURCES = {
+    "v4": {"q_up": "qi", "q_down": "qj", "age": "ai"},
+    "v5": {"q_up": "q_up", "q_down": "q_down", "max_age": "max_age"},
+}
+# v5 only state-logs phases with a green movement; the others score 0
+UNLOGGED_PHASES_SCORE_ZERO = {"v4": False, "v5": True}
+
+# terms each scoring needs, and its controller params
+SCORING_TERMS = {
+    "v3": ["q_up", "q_down"],
+    "v4": ["q_up", "q_down", "age"],
+    "v5": ["q_up", "q_down", "max_age"],
+}
+SCORING_PARAMS = {
+    "v3": [],
+    "v4": ["ALPHA", "BETA", "GAMMA"],
+    "v5": ["ALPHA", "BETA_MIN", "BETA_MAX", "GAMMA_MIN", "GAMMA_MAX",
+           "FAIRNESS_LIMIT"],
+}
+
+
+# ---------------- LOG READING ----------------
+
+def iter_columns(path, names, chunk_rows=CHUNK_ROWS):
+    """Yield {name: array} chunks of a .csv or .tlog log."""
+    if path.endswith(FORMATS["binary"]):
+        with ColumnarReader(path) as reader:
+            index = [reader.columns.index(name) for name in names]
+            categories = {
+                name: np.asarray(reader.categories(name), dtype=object)
+                for name in names if reader.categories(name)
+            }
+            for _, arrays in reader.iter_chunks():
+                chunk = {}
+                for name, i in zip(names, index):
+                    array = arrays[i][0]
+                    chunk[name] = (categories[name][array]
+                                   if name in categories else array)
+                yield chunk
+        return
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        index = [header.index(name) for name in names]
+        rows = []
+        for row in reader:
+            rows.append([row[i] for i in index])
+            if len(rows) >= chunk_rows:
+                yield _csv_chunk(names, rows)
+                rows = []
+        if rows:
+            yield _csv_chunk(names, rows)
+
+
+def _csv_chunk(names, rows):
+    chunk = {}
+    for name, values in zip(names, zip(*rows)):
+        try:
+            chunk[name] = np.array(values, dtype=np.float64)
+        except ValueError:
+            chunk[name] = np.array(values, dtype=object)
+    return chunk
+
+
+def iter_decisions(path, columns, chunk_rows=CHUNK_ROWS):
+    """
+    Like iter_columns, but every chunk ends on a decision boundary and also
+    holds "starts", the first row of each decision.
+    """
+    names = ["time", "tls", "phase", *columns]
+    carry = None
+    for chunk in iter_columns(path, names, chunk_rows):
+        if carry is not None:
+            chunk = {n: np.concatenate([carry[n], chunk[n]]) for n in names}
+        new = np.ones(len(chunk["time"]), dtype=bool)
+        new[1:] = ((chunk["time"][1:] != chunk["time"][:-1])
+                   | (chunk["tls"][1:] != chunk["tls"][:-1]))
+        starts = np.flatnonzero(new)
+        # the last decision may go on in the next chunk
+        cut = starts[-1]
+        carry = {n: chunk[n][cut:] for n in names}
+        if len(starts) > 1:
+            done = {n: chunk[n][:cut] for n in names}
+            done["starts"] = starts[:-1]
+            yield done
+    if carry is not None and len(carry["time"]):
+        carry["starts"] = np.zeros(1, dtype=np.int64)
+        yield carry
+
+# ---------------------------------------------
+
+
+def decide(scores, phases, starts, unlogged_zero):
+    """
+    Best phase and the two top scores of every decision, for every row of
+    scores (params x state rows). Ties go to the lowest phase, like the
+    controllers. With unlogged_zero the first phase number missing from a
+    decision stands for the phases scored 0 without being logged.
+    -> best_phase, best, second (each params x decisions)
+    """
+    k, n = scores.shape
+    sizes = np.diff(np.append(starts, n))
+    group = np.repeat(np.arange(len(starts)), sizes)
+    rows = np.arange(n)
+
+    best = np.maximum.reduceat(scores, starts, axis=1)
+    at_best = scores == best[:, group]
+    first = np.minimum.reduceat(np.where(at_best, rows, n), starts, axis=1)
+    best_phase = phases[first]
+
+    rest = scores.copy()
+    np.put_along_axis(rest, first, -np.inf, axis=1)
+    second = np.maximum.reduceat(rest, starts, axis=1)
+    second = np.where(sizes > 1, second, 0.0)    # top_two of one phase
+
+    if unlogged_zero:
+        rank = rows - np.repeat(starts, sizes)
+        gap = np.minimum.reduceat(np.where(phases != rank, rank, n), starts)
+        has_gap = gap < n
+        zero_wins = has_gap & ((best < 0) | ((best == 0) & (gap < best_phase)))
+        second = np.where(has_gap & ~zero_wins, np.maximum(second, 0.0),
+                          second)
+        second = np.where(zero_wins, best, second)
+        best_phase = np.where(zero_wins, gap, best_phase)
+        best = np.where(zero_wins, 0.0, best)
+    return best_phase, best, second
+
+
+def current_phases(control_path, switch_path):
+    """
+    Phase each junction showed at each decision: the selected phase when the
+    run did not want to switch, else the prev_phase of its switch row.
+    """
+    names = ["time", "tls", "selected_phase", "phase_switched"]
+    chunks = list(iter_columns(control_path, names))
+    control = {n: np.concatenate([c[n] for c in chunks]) for n in names}
+    switched_from = {}
+    for chunk in iter_columns(switch_path, ["time", "tls", "prev_phase"]):
+        for t, tls, prev in zip(chunk["time"].tolist(), chunk["tls"].tolist(),
+                                chunk["prev_phase"].tolist()):
+            switched_from[(t, tls)] = prev
+
+    current = control["selected_phase"].copy()
+    for i in np.flatnonzero(control["phase_switched"]):
+        current[i] = switched_from[(control["time"][i], control["tls"][i])]
+    return control["selected_phase"], current
+
+
+def evaluate(source, scoring, configs, out_dir=".", log_format="csv",
+             chunk_rows=CHUNK_ROWS):
+    """
+    Score the state log a source ("v4" / "v5") run left in out_dir with
+    scoring ("v3" / "v4" / "v5") under every params dict of configs (missing
+    params: the scoring controller's defaults). -> one result dict per config
+    """
+    if source not in SOURCES:
+        raise ValueError(f"no state log to replay for {source!r}")
+    missing = [t for t in SCORING_TERMS[scoring] if t not in SOURCES[source]]
+    if missing:
+        raise ValueError(
+            f"{scoring} scoring needs {missing}, not in the {source} state log")
+    unknown = {n for config in configs for n in config} \
+        - set(SCORING_PARAMS[scoring])
+    if unknown:
+        raise KeyError(f"{scoring} scoring has no params {sorted(unknown)}")
+
+    logs = CONTROLLERS[source].logs
+    state_path, control_path, switch_path = (
+        log_path(out_dir, logs[name][0], log_format)
+        for name in ("state", "control", "switch")
+    )
+    logged_phase, current = current_phases(control_path, switch_path)
+
+    defaults = CONTROLLERS[scoring].params
+    params = {
+        name.lower(): np.array(
+            [config.get(name, defaults[name]) for config in configs],
+            dtype=np.float64)[:, None]
+        for name in SCORING_PARAMS[scoring]
+    }
+    k = max(len(configs), 1)
+    columns = {term: SOURCES[source][term] for term in SCORING_TERMS[scoring]}
+
+    decisions = 0
+    agree = np.zeros(k, dtype=np.int64)
+    switches = np.zeros(k, dtype=np.int64)
+    gaps = [[] for _ in range(k)]
+    for chunk in iter_decisions(state_path, list(columns.values()),
+                                chunk_rows):
+        terms = {term: chunk[col] for term, col in columns.items()}
+        terms["has_green"] = np.ones(len(chunk["time"]), dtype=bool)
+        scores = np.broadcast_to(
+            SCORING[scoring](terms, **params)["pressure"],
+            (k, len(chunk["time"]))
+        )
+        best_phase, best, second = decide(
+            scores, chunk["phase"], chunk["starts"],
+            UNLOGGED_PHASES_SCORE_ZERO[source]
+        )
+        n = len(chunk["starts"])
+        window = slice(decisions, decisions + n)
+        agree += (best_phase == logged_phase[window]).sum(axis=1)
+        switches += (best_phase != current[window]).sum(axis=1)
+        for i in range(k):
+            gaps[i].append(best[i] - second[i])
+        decisions += n
+
+    if decisions != len(logged_phase):
+        raise ValueError(
+            f"{state_path} has {decisions} decisions, "
+            f"{control_path} {len(logged_phase)}")
+
+    logged_switches = int((logged_phase != current).sum())
+    results = []
+    for i, config in enumerate(configs or [{}]):
+        gap = np.concatenate(gaps[i]) if gaps[i] else np.zeros(0)
+        results.append({
+            **config,
+            "decisions": decisions,
+            "agreement": round(float(agree[i]) / max(decisions, 1), 4),
+            "switches": int(switches[i]),
+            "logged_switches": logged_switches,
+            "mean_gap": round(float(gap.mean()), 4) if len(gap) else 0.0,
+            "median_gap": round(float(np.median(gap)), 4) if len(gap) else 0.0,
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay logged V4 / V5 decision states through other "
+                    "scoring parameters, without SUMO."
+    )
+    parser.add_argument("source", choices=sorted(SOURCES),
+                        help="controller whose logs are replayed")
+    parser.add_argument("--scoring", choices=sorted(SCORING), default=None,
+                        help="formula to score with (default: the source's)")
+    parser.add_argument(
+        "--grid", action="append", metavar="NAME=V1,V2,...",
+        help="scoring param values, e.g. --grid ALPHA=0.8,1.0,1.2"
+    )
+    parser.add_argument("--out-dir", default=".",
+                        help="folder holding the source run's logs")
+    parser.add_argument("--log-format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--output", default=None,
+                        help="also write the results to this CSV")
+    args = parser.parse_args(argv)
+
+    configs = grid_configs(parse_values(args.grid))
+    results = evaluate(args.source, args.scoring or args.source, configs,
+                       args.out_dir, args.log_format)
+    results.sort(key=lambda r: -r["agreement"])
+
+    header = list(results[0])
+    print(" ".join(f"{h:>14s}" for h in header))
+    for r in results:
+        print(" ".join(f"{r[h]!s:>14s}" for h in header))
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
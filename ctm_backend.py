@@ -0,0 +1,556 @@
+import heapq
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import traci.constants as tc
+
+from net_index import config_net_file, load_net
+from tls_program import Logic, Phase
+
+# ---------------- CELL TRANSMISSION BACKEND ----------------
+# A macroscopic stand-in for SUMO ("ctm" in sumo_backend): the scenario's
+# network and trips run through a cell transmission model, and this module
+# answers the traci calls the runner and controllers make, so they run on it
+# unchanged and write the same results / control logs. Used to pre-screen
+# controllers and parameter sets (see surrogate.py), not to replace SUMO.
+#
+#   cells        every normal lane is cut into cells one free-flow step
+#                long; a cell holds a (fractional) number of vehicles,
+#                sends min(n, capacity) and receives min(capacity,
+#                WAVE_RATIO x free room) per step, all cells at once
+#   routing      vehicles are tracked per (lane, destination edge) and take
+#                the shortest (free-flow time) route there; flow entering an
+#                edge spreads over the lanes connected to its next edge
+#                (trips with an explicit route only keep its last edge)
+#   junctions    lane ends send into the next edges through the network's
+#                connections; a lane's vehicles leave in proportion to its
+#                destination mix and the share facing a red (or closed)
+#                link waits; merging flows share the downstream room in
+#                proportion
+#   signals      the network's programs run by themselves; setPhase,
+#                setProgram and setCompleteRedYellowGreenDefinition work as
+#                in SUMO; yellow passes
+#
+# Lane results: halting = vehicles in cells slower than HALTING_SPEED,
+# speed = distance moved per vehicle, vehicles / occupancy from the counts;
+# counts are whole vehicles (see VISIBLE_FRACTION). State files
+# (checkpoints) are not supported.
+# ------------------------------------------------------------
+
+# ---------------- CONFIG ----------------
+STEP = 1                  # s per simulation step (step-length of grid.sumocfg)
+VEHICLE_LENGTH = 5.0      # m, SUMO's default passenger car
+JAM_SPACING = 7.5         # m per vehicle in a standing queue (length + minGap)
+SATURATION_FLOW = 0.5     # veh/s per lane
+WAVE_RATIO = 0.4          # backward wave speed / free-flow speed
+PASSING_SIGNALS = "GgyOo"  # link states vehicles drive through
+HALTING_SPEED = 0.1       # m/s, a cell moving slower holds halting vehicles
+VISIBLE_FRACTION = 0.25   # a lane holds a vehicle from this fraction on
+# ---------------------------------------
+
+
+def config_route_files(sumocfg):
+    """Paths of the route-files a .sumocfg loads."""
+    for _, elem in ET.iterparse(sumocfg):
+        if elem.tag == "route-files":
+            base = os.path.dirname(sumocfg)
+            return [os.path.join(base, name.strip())
+                    for name in elem.get("value").split(",")]
+    raise ValueError(f"{sumocfg} has no route-files")
+
+
+def read_trips(route_files):
+    """-> [(depart, [edges] or None, from edge, to edge)] in file order"""
+    trips = []
+    for path in route_files:
+        route = None
+        for event, elem in ET.iterparse(path, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "route":
+                    route = elem.get("edges", "").split()
+                continue
+            if elem.tag == "trip":
+                trips.append((float(elem.get("depart")), None,
+                              elem.get("from"), elem.get("to")))
+            elif elem.tag == "vehicle" and route:
+                trips.append((float(elem.get("depart")), route,
+                              route[0], route[-1]))
+                route = None
+            if elem.tag in ("trip", "vehicle"):
+                elem.clear()
+    return trips
+
+
+def next_hops(successors, cost, targets):
+    """
+    {(edge, target): next edge} on the shortest (free-flow time) routes into
+    every target edge, one backward Dijkstra per target; absent when the
+    target cannot be reached.
+    """
+    predecessors = {}
+    for edge, nexts in successors.items():
+        for nxt in nexts:
+            predecessors.setdefault(nxt, []).append(edge)
+    hops = {}
+    for target in targets:
+        best = {target: cost[target]}
+        heap = [(cost[target], target)]
+        while heap:
+            t, edge = heapq.heappop(heap)
+            if t > best[edge]:
+                continue
+            for prev in predecessors.get(edge, ()):
+                arrive = t + cost[prev]
+                if arrive < best.get(prev, np.inf):
+                    best[prev] = arrive
+                    hops[(prev, target)] = edge
+                    heapq.heappush(heap, (arrive, prev))
+    return hops
+
+
+class CellNetwork:
+    """Static cell layout, connections and routing of one scenario."""
+
+    def __init__(self, net, trips):
+        self.net = net
+        edge_internal = net.edge_internal
+        normal = [i for i, e in enumerate(net.lane_edge)
+                  if not edge_internal[e]]
+        self.lane_ids = [net.lane_ids[i] for i in normal]
+        self.lane_index = {lane: i for i, lane in enumerate(self.lane_ids)}
+        row = {net_row: i for i, net_row in enumerate(normal)}
+
+        # ---- edges (lanes of an edge are consecutive in the network) ----
+        lane_edge_name = [net.edge_ids[net.lane_edge[i]] for i in normal]
+        self.edge_ids = list(dict.fromkeys(lane_edge_name))
+        edge_index = {edge: i for i, edge in enumerate(self.edge_ids)}
+        self.lane_edge = np.array([edge_index[e] for e in lane_edge_name])
+        self.edge_start = np.searchsorted(
+            self.lane_edge, np.arange(len(self.edge_ids)))
+        num_lanes = len(self.lane_ids)
+        num_edges = len(self.edge_ids)
+        edge_lanes = np.bincount(self.lane_edge, minlength=num_edges)
+
+        # ---- cells ----
+        length = net.lane_length[normal].astype(np.float64)
+        self.lane_speed = net.lane_speed[normal].astype(np.float64)
+        self.lane_length = length
+        cells = np.maximum(
+            np.round(length / (self.lane_speed * STEP)), 1).astype(np.int64)
+        self.first = np.concatenate([[0], np.cumsum(cells)[:-1]])
+        self.last = self.first + cells - 1
+        self.num_cells = int(cells.sum())
+        self.cell_lane = np.repeat(np.arange(num_lanes), cells)
+        self.cell_length = (length / cells)[self.cell_lane]
+        self.capacity = self.cell_length / JAM_SPACING
+        self.max_flow = SATURATION_FLOW * STEP
+        is_last = np.zeros(self.num_cells, dtype=bool)
+        is_last[self.last] = True
+        self.inner = np.flatnonzero(~is_last)
+
+        # ---- moves: one per (lane, next edge) with its signal link ----
+        successors = {}
+        lane_to = {}
+        for c in range(len(net.conn_from)):
+            src, dst = net.conn_from[c], net.conn_to[c]
+            if src not in row or dst not in row:
+                continue
+            src, dst = row[src], row[dst]
+            successors.setdefault(self.lane_edge[src], set()).add(
+                self.lane_edge[dst])
+            lane_to.setdefault((src, self.lane_edge[dst]),
+                               (int(net.conn_tls[c]), int(net.conn_link[c])))
+        keys = sorted(lane_to)
+        move_index = {key: m for m, key in enumerate(keys)}
+        self.move_tls = np.array([lane_to[k][0] for k in keys], dtype=np.int64)
+        self.move_link = np.array([lane_to[k][1] for k in keys],
+                                  dtype=np.int64)
+
+        # ---- routing by destination edge ----
+        cost = {i: float((length / self.lane_speed)[self.lane_edge == i]
+                         .mean())
+                for i in range(num_edges)}
+        self.dests = sorted({edge_index[dst] for _, _, _, dst in trips})
+        k_of = {edge: k for k, edge in enumerate(self.dests)}
+        hops = next_hops(successors, cost, self.dests)
+        num_dests = len(self.dests)
+
+        # per (lane, destination): where the lane's vehicles go next (-1:
+        # they arrive at its end), the move taking them there and the share
+        # of an edge's entering flow that lane gets
+        self.target = np.full((num_lanes, num_dests), -1, dtype=np.int64)
+        self.move = np.zeros((num_lanes, num_dests), dtype=np.int64)
+        self.entry = np.zeros((num_lanes, num_dests))
+        for e in range(num_edges):
+            lanes_e = range(self.edge_start[e], self.edge_start[e]
+                            + edge_lanes[e])
+            for k, dst in enumerate(self.dests):
+                nxt = -1 if e == dst else hops.get((e, dst), -2)
+                serve = [lane for lane in lanes_e
+                         if (lane, nxt) in move_index]
+                serve = serve or list(lanes_e)
+                for lane in serve:
+                    self.target[lane, k] = nxt
+                    self.move[lane, k] = move_index.get((lane, nxt), 0)
+                    self.entry[lane, k] = 1.0 / len(serve)
+        self.arrives = self.target < 0
+        self.num_dests = num_dests
+        self.entry_key = (self.target * num_dests
+                          + np.arange(num_dests))[~self.arrives]
+
+        # ---- departures: each trip enters the lanes serving its next edge
+        steps, lanes, dest, weights = [], [], [], []
+        for depart, _, src, dst in sorted(trips, key=lambda trip: trip[0]):
+            e, k = edge_index[src], k_of[edge_index[dst]]
+            if self.target[self.edge_start[e], k] == -2:
+                raise ValueError(f"no route from {src} to {dst}")
+            lanes_e = np.arange(self.edge_start[e],
+                                self.edge_start[e] + edge_lanes[e])
+            for lane in lanes_e[self.entry[lanes_e, k] > 0]:
+                steps.append(int(depart // STEP))
+                lanes.append(lane)
+                dest.append(k)
+                weights.append(self.entry[lane, k])
+        self.depart_step = np.array(steps, dtype=np.int64)
+        self.depart_lane = np.array(lanes, dtype=np.int64)
+        self.depart_dest = np.array(dest, dtype=np.int64)
+        self.depart_weight = np.array(weights)
+        self.num_trips = len(trips)
+        self.trip_departs = np.sort(
+            [int(depart // STEP) for depart, _, _, _ in trips])
+
+    def tls_moves(self, tls_row):
+        return np.flatnonzero(self.move_tls == tls_row)
+
+
+# ---------------- SIMULATION STATE ----------------
+
+class _Signal:
+
+    def __init__(self, programs):
+        self.programs = dict(programs)      # programID -> Logic
+        self.program = next(iter(self.programs))
+        self.phase = 0
+        self.phase_end = self.logic().phases[0].duration
+
+    def logic(self):
+        return self.programs[self.program]
+
+
+class CellModel:
+
+    def __init__(self, network):
+        self.network = network
+        net = network.net
+        self.time = 0
+        self.n = np.zeros(network.num_cells)
+        self.out = np.zeros(network.num_cells)     # moved on the last step
+        # vehicles per (lane, destination); a lane's mix is well stirred
+        self.mix = np.zeros((len(network.lane_ids), network.num_dests))
+        self.backlog = np.zeros_like(self.mix)
+        self.departed = 0
+        self.next_departure = 0
+        self.subscribed = []
+
+        self.tls_ids = list(net.tls_ids)
+        self.signals = {
+            tls: _Signal((p.programID, p) for p in
+                         (net.logic(tls, i)
+                          for i in range(len(net.programs[tls]))))
+            for tls in self.tls_ids
+        }
+        self.tls_moves = {tls: network.tls_moves(i)
+                          for i, tls in enumerate(self.tls_ids)}
+        self.green = network.move_tls < 0      # unsignalised moves pass
+        for tls in self.tls_ids:
+            self._update_green(tls)
+
+    # ---- signals ----
+    def _update_green(self, tls):
+        moves = self.tls_moves[tls]
+        signal = self.signals[tls]
+        state = signal.logic().phases[signal.phase].state
+        self.green[moves] = [
+            link < len(state) and state[link] in PASSING_SIGNALS
+            for link in self.network.move_link[moves]
+        ]
+
+    def set_phase(self, tls, phase):
+        signal = self.signals[tls]
+        signal.phase = phase
+        signal.phase_end = self.time + signal.logic().phases[phase].duration
+        self._update_green(tls)
+
+    def _advance_signals(self):
+        for tls, signal in self.signals.items():
+            while self.time >= signal.phase_end:
+                phases = signal.logic().phases
+                nxt = phases[signal.phase].next
+                signal.phase = nxt[0] if nxt else \
+                    (signal.phase + 1) % len(phases)
+                signal.phase_end += phases[signal.phase].duration
+                self._update_green(tls)
+
+    def _entering(self, flows):
+        """(lane, destination) flows -> (edge, destination) entering flows."""
+        net = self.network
+        return np.bincount(
+            net.entry_key, flows[~net.arrives],
+            minlength=len(net.edge_start) * net.num_dests,
+        ).reshape(len(net.edge_start), net.num_dests)
+
+    # ---- one step ----
+    def step(self):
+        net = self.network
+        self._advance_signals()
+        n = self.n
+        send = np.minimum(n, net.max_flow)
+        room = np.maximum(
+            np.minimum(net.max_flow, WAVE_RATIO * (net.capacity - n)), 0.0)
+        first_room = room[net.first]
+
+        # lane ends: the lane's mix leaves in proportion; the share whose
+        # turn is red waits (the head vehicle is that likely to block)
+        total = self.mix.sum(axis=1)
+        share = self.mix / np.where(total > 0, total, 1)[:, None]
+        share *= net.arrives | self.green[net.move]
+        outflow = send[net.last]
+
+        # merges: flow above an entrance lane's room is cut in proportion,
+        # and a lane sends only what its tightest next edge takes
+        wanted = (self._entering(outflow[:, None] * share)[net.lane_edge]
+                  * net.entry).sum(axis=1)
+        fits = np.minimum.reduceat(
+            first_room / np.maximum(wanted, 1e-12), net.edge_start)
+        scale = np.minimum(1.0, fits)[np.maximum(net.target, 0)]
+        outflow = outflow * np.where((share > 0) & ~net.arrives, scale,
+                                     1.0).min(axis=1)
+
+        flows = outflow[:, None] * share
+        joining = self._entering(flows)[net.lane_edge] * net.entry
+        lane_in = joining.sum(axis=1)
+        self.mix += joining - flows
+
+        inner = net.inner
+        moved = np.minimum(send[inner], room[inner + 1])
+        out = np.zeros_like(n)
+        out[inner] = moved
+        out[net.last] = flows.sum(axis=1)
+        n -= out
+        n[inner + 1] += moved
+        n[net.first] += lane_in
+
+        # departures wait at the edge entrance until there is room
+        self.time += STEP
+        first = self.next_departure
+        last = np.searchsorted(net.depart_step, self.time, side="left")
+        if last > first:
+            np.add.at(self.backlog, (net.depart_lane[first:last],
+                                     net.depart_dest[first:last]),
+                      net.depart_weight[first:last])
+            self.next_departure = last
+        waiting = self.backlog.sum(axis=1)
+        inserted = np.minimum(waiting, np.maximum(first_room - lane_in, 0.0))
+        fraction = inserted / np.where(waiting > 0, waiting, 1)
+        self.mix += self.backlog * fraction[:, None]
+        self.backlog *= (1.0 - fraction)[:, None]
+        n[net.first] += inserted
+        self.departed = int(np.searchsorted(net.trip_departs, self.time,
+                                            side="left"))
+        self.out = out
+
+    # ---- readings ----
+    def _motion(self):
+        """-> per lane: vehicles, vehicles in stopped cells, distance moved"""
+        net = self.network
+        n, out = self.n, self.out
+        stopped = out * net.cell_length < HALTING_SPEED * STEP * n
+        return (np.add.reduceat(n, net.first),
+                np.add.reduceat(np.where(stopped, n, 0.0), net.first),
+                np.add.reduceat(out * net.cell_length, net.first))
+
+    def lane_results(self):
+        net = self.network
+        lanes, halting, distance = self._motion()
+        speed = np.where(lanes > 1e-9,
+                         distance / STEP / np.where(lanes > 1e-9, lanes, 1),
+                         net.lane_speed)
+        occupancy = np.minimum(lanes * VEHICLE_LENGTH / net.lane_length, 1.0)
+        return (self._count(halting), self._count(lanes),
+                np.minimum(speed, net.lane_speed), occupancy)
+
+    @staticmethod
+    def _count(vehicles):
+        """
+        Whole vehicles per lane: a partial one counts from VISIBLE_FRACTION
+        on (small queues still get served), less is numerical residue.
+        """
+        return np.maximum(np.ceil(vehicles - VISIBLE_FRACTION), 0).astype(
+            np.int64)
+
+    def vehicle_speeds(self):
+        """Per lane, the stopped vehicles at 0 and the rest at the lane's
+        mean moving speed."""
+        lanes, halting, distance = self._motion()
+        running = self._count(self.mix.sum(axis=1))
+        stopped = np.minimum(self._count(halting), running)
+        moving = lanes - halting
+        speed = distance / STEP / np.where(moving > 1e-9, moving, 1)
+        return np.concatenate([np.repeat(speed, running - stopped),
+                               np.zeros(int(stopped.sum()))])
+
+    def expected(self):
+        """Vehicles in the network or still to depart."""
+        waiting = self._count(self.backlog.sum(axis=1)).sum()
+        return (self.network.num_trips - self.departed) + int(waiting) + \
+            int(self._count(self.mix.sum(axis=1)).sum())
+
+
+# ---------------- TRACI SURFACE ----------------
+# module level: select_backend("ctm") copies this namespace onto the traci
+# proxy, like it does for traci / libsumo
+
+_ctm = {"model": None, "networks": {}}
+
+
+def _model():
+    if _ctm["model"] is None:
+        raise RuntimeError("ctm backend: start() was not called")
+    return _ctm["model"]
+
+
+def load_network(sumocfg):
+    """CellNetwork of a .sumocfg, built once per process and file version."""
+    net_file = config_net_file(sumocfg)
+    route_files = config_route_files(sumocfg)
+    key = (os.path.abspath(sumocfg),
+           tuple(os.stat(path).st_mtime_ns for path in [net_file,
+                                                         *route_files]))
+    networks = _ctm["networks"]
+    if key not in networks:
+        networks[key] = CellNetwork(load_net(net_file),
+                                    read_trips(route_files))
+    return networks[key]
+
+
+class _TrafficLightDomain:
+
+    Phase = Phase
+    Logic = Logic
+
+    def getIDList(self):
+        return list(_model().tls_ids)
+
+    def getCompleteRedYellowGreenDefinition(self, tls):
+        signal = _model().signals[tls]
+        logic = signal.logic()
+        rest = [p for name, p in signal.programs.items()
+                if name != signal.program]
+        return [logic, *rest]
+
+    def getControlledLinks(self, tls):
+        return _model().network.net.controlled_links(tls)
+
+    def getPhase(self, tls):
+        return _model().signals[tls].phase
+
+    def getProgram(self, tls):
+        return _model().signals[tls].program
+
+    def setPhase(self, tls, phase):
+        _model().set_phase(tls, phase)
+
+    def setProgram(self, tls, program):
+        model = _model()
+        model.signals[tls].program = program
+        model.set_phase(tls, 0)
+
+    def setCompleteRedYellowGreenDefinition(self, tls, logic):
+        model = _model()
+        signal = model.signals[tls]
+        signal.programs[logic.programID] = logic
+        signal.program = logic.programID
+        model.set_phase(tls, logic.currentPhaseIndex)
+
+
+class _LaneDomain:
+
+    def subscribe(self, lane, var_ids=None, *args):
+        model = _model()
+        if lane not in model.subscribed:
+            model.subscribed.append(lane)
+
+    def getAllSubscriptionResults(self):
+        model = _model()
+        index = model.network.lane_index
+        halting, vehicles, speed, occupancy = model.lane_results()
+        rows = [index[lane] for lane in model.subscribed]
+        return {
+            lane: {
+                tc.LAST_STEP_VEHICLE_HALTING_NUMBER: h,
+                tc.LAST_STEP_VEHICLE_NUMBER: v,
+                tc.LAST_STEP_MEAN_SPEED: s,
+                tc.LAST_STEP_OCCUPANCY: o,
+            }
+            for lane, h, v, s, o in zip(
+                model.subscribed, halting[rows].tolist(),
+                vehicles[rows].tolist(), speed[rows].tolist(),
+                occupancy[rows].tolist())
+        }
+
+    def getLastStepHaltingNumber(self, lane):
+        model = _model()
+        return int(model.lane_results()[0][model.network.lane_index[lane]])
+
+
+class _JunctionDomain:
+
+    def getIDList(self):
+        return list(_model().network.net.junction_ids)
+
+    def subscribeContext(self, *args):
+        pass
+
+    def getContextSubscriptionResults(self, junction):
+        """{vehicle id: {VAR_SPEED: speed}} for every running vehicle."""
+        return {f"ctm{i}": {tc.VAR_SPEED: speed}
+                for i, speed in enumerate(_model().vehicle_speeds().tolist())}
+
+
+class _SimulationDomain:
+
+    def getMinExpectedNumber(self):
+        return _model().expected()
+
+    def getTime(self):
+        return float(_model().time)
+
+    def saveState(self, path):
+        raise NotImplementedError("ctm backend: no state files")
+
+    def loadState(self, path):
+        raise NotImplementedError("ctm backend: no state files")
+
+
+trafficlight = _TrafficLightDomain()
+lane = _LaneDomain()
+junction = _JunctionDomain()
+simulation = _SimulationDomain()
+
+
+def start(cmd, label=None, **kwargs):
+    """cmd is the SUMO command line; only its -c sumocfg is used."""
+    sumocfg = cmd[cmd.index("-c") + 1]
+    _ctm["model"] = CellModel(load_network(sumocfg))
+
+
+def simulationStep(step=0):
+    model = _model()
+    target = step if step else model.time + STEP
+    while model.time < target:
+        model.step()
+
+
+def close(wait=True):
+    _ctm["model"] = None
@@ -0,0 +1,437 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from policy import FEATURES, PhaseLayout
+from sumo_backend import traci
+
+# ---------------- EXPERIENCE STORE ----------------
+# (state, phase, reward, next_state, done) transitions for training, kept in
+# preallocated NumPy ring buffers: appending writes into existing rows (one
+# slice assignment per batch, no Python object per transition) and once the
+# store is full the oldest rows are overwritten.
+#
+# With a directory the buffers are memory-mapped .npy files there, so a
+# store can outgrow RAM and be reopened to append more; meta.json records
+# the fill state. Prioritized sampling uses a sum tree over the priorities,
+# updated and descended level by level for a whole batch at once.
+#
+# Transitions come in as batches: VectorGridEnv steps (one row per worker,
+# actions for every junction, see rl_env.collect) or the runner's
+# TransitionRecorder (one row per due junction, see below). Parallel runner
+# processes (sweep.py --experience) each write their own store folder under
+# one root; StoreSet reads such a root as one store.
+# ---------------------------------------------------
+
+# ---------------- CONFIG ----------------
+CAPACITY = 1_000_000
+PRIORITY_ALPHA = 0.6       # how strongly priorities skew sampling
+PRIORITY_BETA = 0.4        # importance-sampling correction
+PRIORITY_EPS = 1e-3
+EXPORT_CHUNK = 1 << 16     # rows copied at a time by export()
+# ---------------------------------------
+
+META_FILE = "meta.json"
+
+
+class SumTree:
+    """Binary tree of priority sums over capacity leaves (leaf i = row i)."""
+
+    def __init__(self, capacity):
+        self.leaves = 1 << max(int(capacity - 1).bit_length(), 0)
+        self.tree = np.zeros(2 * self.leaves)
+
+    def total(self):
+        return self.tree[1]
+
+    def update(self, rows, priorities):
+        nodes = np.asarray(rows, dtype=np.int64) + self.leaves
+        self.tree[nodes] = priorities
+        while nodes[0] > 1:
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def get(self, rows):
+        return self.tree[np.asarray(rows) + self.leaves]
+
+    def find(self, targets):
+        """Leaf of every cumulative-priority target in [0, total)."""
+        nodes = np.ones(len(targets), dtype=np.int64)
+        targets = np.array(targets, dtype=np.float64)
+        while nodes[0] < self.leaves:
+            left = 2 * nodes
+            right = targets >= self.tree[left]
+            targets -= np.where(right, self.tree[left], 0.0)
+            nodes = left + right
+        return nodes - self.leaves
+
+
+class ExperienceStore:
+
+    def __init__(self, obs_shape, capacity=CAPACITY, directory=None,
+                 obs_dtype=np.float32, action_shape=()):
+        self.directory = directory
+        meta = None
+        if directory and os.path.exists(os.path.join(directory, META_FILE)):
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+            if tuple(meta["obs_shape"]) != tuple(obs_shape):
+                raise ValueError(
+                    f"{directory} holds observations of shape "
+                    f"{tuple(meta['obs_shape'])}, not {tuple(obs_shape)}")
+            if tuple(meta.get("action_shape", ())) != tuple(action_shape):
+                raise ValueError(
+                    f"{directory} holds actions of shape "
+                    f"{tuple(meta.get('action_shape', ()))}, "
+                    f"not {tuple(action_shape)}")
+            capacity = meta["capacity"]
+        elif directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.obs_shape = tuple(obs_shape)
+        self.action_shape = tuple(action_shape)
+        self.capacity = capacity
+        self.head = meta["head"] if meta else 0      # next row to write
+        self.size = meta["size"] if meta else 0
+        self.max_priority = meta["max_priority"] if meta else 1.0
+
+        columns = {
+            "obs": (self.obs_shape, obs_dtype),
+            "action": (self.action_shape, np.int32),
+            "reward": ((), np.float32),
+            "next_obs": (self.obs_shape, obs_dtype),
+            "done": ((), bool),
+            "priority": ((), np.float64),
+        }
+        self.arrays = {
+            name: self._allocate(name, (capacity, *shape), dtype,
+                                 meta is not None)
+            for name, (shape, dtype) in columns.items()
+        }
+        self.tree = SumTree(capacity)
+        if self.size:
+            self.tree.update(np.arange(self.size),
+                             self.arrays["priority"][:self.size])
+
+    def _allocate(self, name, shape, dtype, existing):
+        if self.directory is None:
+            return np.zeros(shape, dtype=dtype)
+        path = os.path.join(self.directory, f"{name}.npy")
+        if existing:
+            return np.load(path, mmap_mode="r+")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                         shape=shape)
+
+    def __len__(self):
+        return self.size
+
+    # ---- append ----
+    def add(self, obs, action, reward, next_obs, done):
+        """Append a batch of n transitions (leading axis n); O(n)."""
+        n = len(action)
+        if n > self.capacity:
+            raise ValueError(f"batch of {n} exceeds capacity {self.capacity}")
+        rows = (self.head + np.arange(n)) % self.capacity
+        # at most two contiguous slices: up to the end, then from row 0
+        first = min(n, self.capacity - self.head)
+        values = {"obs": obs, "action": action, "reward": reward,
+                  "next_obs": next_obs, "done": done}
+        for name, value in values.items():
+            array = self.arrays[name]
+            value = np.asarray(value)
+            array[self.head:self.head + first] = value[:first]
+            array[:n - first] = value[first:]
+        self.arrays["priority"][rows] = self.max_priority
+        self.tree.update(rows, self.max_priority)
+        self.head = (self.head + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return rows
+
+    # ---- sampling ----
+    def _batch(self, rows):
+        batch = {name: self.arrays[name][rows]
+                 for name in ("obs", "action", "reward", "next_obs", "done")}
+        batch["rows"] = rows
+        return batch
+
+    def sample(self, batch_size, rng):
+        """Uniform batch -> {obs, action, reward, next_obs, done, rows}"""
+        if not self.size:
+            raise ValueError("empty experience store")
+        return self._batch(rng.integers(0, self.size, batch_size))
+
+    def sample_prioritized(self, batch_size, rng, beta=PRIORITY_BETA):
+        """
+        Batch drawn proportionally to priority (one draw per equal slice of
+        the priority mass), plus importance-sampling "weights" (max 1).
+        """
+        if not self.size:
+            raise ValueError("empty experience store")
+        total = self.tree.total()
+        targets = (np.arange(batch_size) + rng.random(batch_size)) \
+            * (total / batch_size)
+        rows = np.minimum(self.tree.find(targets), self.size - 1)
+        # a zero-priority leaf can be hit at a slice boundary
+        probs = np.maximum(self.tree.get(rows), PRIORITY_EPS) / total
+        weights = (self.size * probs) ** -beta
+        batch = self._batch(rows)
+        batch["weights"] = (weights / weights.max()).astype(np.float32)
+        return batch
+
+    def update_priorities(self, rows, errors, alpha=PRIORITY_ALPHA):
+        """New priorities from the TD errors of sampled rows."""
+        priorities = (np.abs(errors) + PRIORITY_EPS) ** alpha
+        self.arrays["priority"][rows] = priorities
+        self.tree.update(rows, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    # ---- persistence ----
+    def order(self):
+        """Rows oldest first."""
+        start = (self.head - self.size) % self.capacity
+        return (start + np.arange(self.size)) % self.capacity
+
+    def flush(self):
+        if self.directory is None:
+            return
+        for array in self.arrays.values():
+            array.flush()
+        tmp = os.path.join(self.directory, META_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"obs_shape": list(self.obs_shape),
+                       "action_shape": list(self.action_shape),
+                       "capacity": self.capacity, "head": self.head,
+                       "size": self.size,
+                       "max_priority": self.max_priority}, f)
+        os.replace(tmp, os.path.join(self.directory, META_FILE))
+
+    def export(self, directory):
+        """Write the transitions oldest first as <name>.npy files, in chunks."""
+        os.makedirs(directory, exist_ok=True)
+        order = self.order()
+        paths = []
+        for name, array in self.arrays.items():
+            path = os.path.join(directory, f"{name}.npy")
+            out = np.lib.format.open_memmap(
+                path, mode="w+", dtype=array.dtype,
+                shape=(self.size, *array.shape[1:]))
+            for start in range(0, self.size, EXPORT_CHUNK):
+                rows = order[start:start + EXPORT_CHUNK]
+                out[start:start + len(rows)] = array[rows]
+            out.flush()
+            paths.append(path)
+        return paths
+
+
+def open_store(directory):
+    """Reopen the store folder directory with the shapes it was made with."""
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    return ExperienceStore(meta["obs_shape"], directory=directory,
+                           action_shape=meta.get("action_shape", ()))
+
+
+def store_dirs(root):
+    """root itself if it is a store folder, else its store subfolders."""
+    if os.path.exists(os.path.join(root, META_FILE)):
+        return [root]
+    return sorted(
+        os.path.join(root, name) for name in os.listdir(root)
+        if os.path.exists(os.path.join(root, name, META_FILE))
+    )
+
+
+class StoreSet:
+    """
+    Several store folders (e.g. one per sweep worker) read as one store:
+    uniform samples over all their transitions, export concatenated in
+    folder order. Shapes must agree.
+    """
+
+    def __init__(self, root):
+        self.stores = [open_store(d) for d in store_dirs(root)]
+        if not self.stores:
+            raise ValueError(f"no experience store in {root}")
+        shapes = {(s.obs_shape, s.action_shape) for s in self.stores}
+        if len(shapes) > 1:
+            raise ValueError(f"stores in {root} differ in shape: {shapes}")
+        self.obs_shape, self.action_shape = shapes.pop()
+        self.sizes = np.array([len(s) for s in self.stores], dtype=np.int64)
+
+    def __len__(self):
+        return int(self.sizes.sum())
+
+    def sample(self, batch_size, rng):
+        """Uniform batch -> {obs, action, reward, next_obs, done, store, rows}"""
+        if not len(self):
+            raise ValueError("empty experience stores")
+        flat = rng.integers(0, len(self), batch_size)
+        store = np.searchsorted(np.cumsum(self.sizes), flat, side="right")
+        rows = flat - np.concatenate([[0], np.cumsum(self.sizes)])[store]
+        batch = {}
+        for name in ("obs", "action", "reward", "next_obs", "done"):
+            batch[name] = np.empty(
+                (batch_size, *self.stores[0].arrays[name].shape[1:]),
+                dtype=self.stores[0].arrays[name].dtype)
+        for i in np.unique(store):
+            picked = store == i
+            part = self.stores[i]._batch(rows[picked])
+            for name in batch:
+                batch[name][picked] = part[name]
+        batch["store"] = store
+        batch["rows"] = rows
+        return batch
+
+    def export(self, directory):
+        """All transitions, store after store and oldest first in each."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, array in self.stores[0].arrays.items():
+            path = os.path.join(directory, f"{name}.npy")
+            out = np.lib.format.open_memmap(
+                path, mode="w+", dtype=array.dtype,
+                shape=(len(self), *array.shape[1:]))
+            start = 0
+            for store in self.stores:
+                order = store.order()
+                for first in range(0, len(order), EXPORT_CHUNK):
+                    rows = order[first:first + EXPORT_CHUNK]
+                    out[start:start + len(rows)] = store.arrays[name][rows]
+                    start += len(rows)
+            out.flush()
+            paths.append(path)
+        return paths
+
+
+# ---------------- RUNNER FEED ----------------
+
+class TransitionRecorder:
+    """
+    Turns the decisions of a runner controller into transitions, one per
+    due junction: the state is the junction's PhaseLayout observation before
+    the controller acts, the action the phase it shows afterwards, and
+    reward / next state are read at that junction's next decision (reward:
+    minus the vehicles halting on its incoming lanes then).
+    """
+
+    def __init__(self, engine, topology, tls_ids, directory=None,
+                 capacity=CAPACITY):
+        self.engine = engine
+        self.layout = PhaseLayout(engine, topology, tls_ids)
+        n = len(self.layout.tls_ids)
+        self.store = ExperienceStore(
+            (self.layout.max_phases, len(FEATURES)), capacity, directory)
+        self.pending = np.zeros(n, dtype=bool)
+        self.pending_obs = np.zeros(
+            (n, self.layout.max_phases, len(FEATURES)), dtype=np.float32)
+        self.pending_action = np.zeros(n, dtype=np.int32)
+
+        # incoming lanes of junction i: _lanes[_starts[i]:_starts[i + 1]]
+        incoming = [[engine.lane_index[lane]
+                     for lane in topology[tls]["incoming_lanes"]]
+                    for tls in self.layout.tls_ids]
+        self._lanes = np.array(
+            [lane for lanes in incoming for lane in lanes] + [engine.no_lane],
+            dtype=np.int64)
+        self._starts = np.cumsum([0] + [len(lanes) for lanes in incoming])[:-1]
+
+    def observe(self, lane_states, ages, due):
+        """Observation of the due junctions before the controller acts."""
+        queues = self.engine.lane_vector(lane_states["halting"])
+        if ages is None:        # controllers without fairness age
+            ages = self.engine.age_vector()
+        terms = self.engine.terms(queues, ages)
+        current = [traci.trafficlight.getPhase(tls) for tls in due]
+        junctions = np.array([self.layout.index[tls] for tls in due],
+                             dtype=np.int64)
+        halted = np.add.reduceat(queues[self._lanes], self._starts)
+        return junctions, self.layout.observe(terms, current, junctions), \
+            halted[junctions]
+
+    def record(self, observed, due, done=False):
+        """Store the finished transitions of the due junctions, open new ones."""
+        junctions, obs, halted = observed
+        prev = self.pending[junctions]
+        if prev.any():
+            closing = junctions[prev]
+            self.store.add(self.pending_obs[closing],
+                           self.pending_action[closing],
+                           -halted[prev].astype(np.float32),
+                           obs[prev],
+                           np.full(len(closing), done))
+        if done:
+            self.pending[junctions] = False
+            return
+        self.pending[junctions] = True
+        self.pending_obs[junctions] = obs
+        self.pending_action[junctions] = [
+            traci.trafficlight.getPhase(tls) for tls in due
+        ]
+
+    def finish(self, lane_states, ages):
+        """Close every open transition as terminal at the end of the run."""
+        due = [tls for tls, open_ in zip(self.layout.tls_ids, self.pending)
+               if open_]
+        if due:
+            self.record(self.observe(lane_states, ages, due), due, done=True)
+        self.store.flush()
+
+# ---------------------------------------------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarise an experience store, export it, or time "
+                    "appends and sampling on a synthetic one."
+    )
+    parser.add_argument("directory", nargs="?", default=None,
+                        help="store folder, or a folder of store folders "
+                             "(omit with --bench)")
+    parser.add_argument("--export", metavar="DIR", default=None,
+                        help="write the transitions oldest first to DIR")
+    parser.add_argument("--bench", type=int, default=None, metavar="N",
+                        help="append N synthetic transitions and sample")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        obs_shape = (4, len(FEATURES))
+        store = ExperienceStore(obs_shape, capacity=args.bench,
+                                directory=args.directory)
+        rng = np.random.default_rng(0)
+        batch = 64
+        obs = rng.random((batch, *obs_shape), dtype=np.float32)
+        started = time.perf_counter()
+        for _ in range(args.bench // batch):
+            store.add(obs, np.zeros(batch, np.int32), np.zeros(batch),
+                      obs, np.zeros(batch, bool))
+        added = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(1000):
+            sample = store.sample_prioritized(256, rng)
+            store.update_priorities(sample["rows"], rng.random(256))
+        sampled = time.perf_counter() - started
+        store.flush()
+        print(f"{len(store)} transitions: "
+              f"{len(store) / added:,.0f} appends/s (batches of {batch}), "
+              f"{1000 / sampled:,.0f} prioritized batches of 256/s")
+        return
+
+    stores = StoreSet(args.directory)
+    for directory, store in zip(store_dirs(args.directory), stores.stores):
+        rewards = store.arrays["reward"][:store.size]
+        print(f"{directory}: {len(store)} / {store.capacity} transitions, "
+              f"obs {store.obs_shape}, mean reward "
+              f"{float(rewards.mean()) if len(rewards) else 0.0:.2f}")
+    if len(stores.stores) > 1:
+        print(f"{len(stores.stores)} stores, {len(stores)} transitions")
+    if args.export:
+        for path in stores.export(args.export):
+            print(path)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
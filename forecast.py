@@ -0,0 +1,146 @@
+import argparse
+import sys
+import time
+from collections import deque
+
+import numpy as np
+
+# ---------------- QUEUE FORECASTER ----------------
+# Short-horizon queue forecast per lane, learnt online while the run goes.
+# Each sample of the halting numbers updates, for all lanes at once:
+#
+#   rolling statistics   previous queue (trend) and an exponential moving
+#                        average (EWMA_RATE per second)
+#   features             x = [1, queue, trend per second, moving average]
+#   model                one linear model per lane, y(t + HORIZON) = w . x(t),
+#                        fitted by recursive least squares with forgetting
+#                        factor FORGETTING; the arrays are feature-major
+#                        (4 x 4 x lanes), so every update is a few
+#                        contiguous vector operations over all lanes
+#
+# The runner feeds it every simulation second, so a sample's target is the
+# sample exactly HORIZON seconds later. With gaps in the samples the target
+# is the one closest to HORIZON seconds later and the trend is divided by
+# the gap, so a model fitted on gappy samples still means "HORIZON ahead".
+# Weights start as persistence (forecast = current queue) and move from
+# there as targets arrive. Forecasts are clipped at 0.
+# ---------------------------------------------------
+
+# ---------------- CONFIG ----------------
+HORIZON = 10            # s ahead
+FORGETTING = 0.995      # RLS forgetting factor per update
+EWMA_RATE = 0.1         # moving average weight per second
+INITIAL_COVARIANCE = 10.0
+# ---------------------------------------
+
+NUM_FEATURES = 4
+
+
+class QueueForecaster:
+
+    def __init__(self, num_lanes, horizon=HORIZON, forgetting=FORGETTING,
+                 ewma_rate=EWMA_RATE):
+        self.horizon = horizon
+        self.forgetting = forgetting
+        self.ewma_rate = ewma_rate
+
+        self.weights = np.zeros((NUM_FEATURES, num_lanes))
+        self.weights[1] = 1.0                   # persistence to start with
+        self.covariance = np.tile(
+            np.eye(NUM_FEATURES)[:, :, None] * INITIAL_COVARIANCE,
+            (1, 1, num_lanes))
+        self.features = np.zeros((NUM_FEATURES, num_lanes))
+        self.features[0] = 1.0
+        self.last_time = None
+        self.pending = deque()      # (time, features) waiting for a target
+        self.updates = 0
+
+    def update(self, time, queues):
+        """Add the queues (per lane) sampled at time."""
+        queues = np.asarray(queues, dtype=np.float64)
+        x = self.features
+        if self.last_time is None:
+            dt, previous, average = 1.0, queues, queues
+        else:
+            dt = time - self.last_time
+            if dt <= 0:
+                return
+            share = 1.0 - (1.0 - self.ewma_rate) ** dt
+            previous = x[1]
+            average = x[3] + share * (queues - x[3])
+
+        while self.pending and time - self.pending[0][0] >= self.horizon:
+            sampled, features = self.pending.popleft()
+            # the previous sample is less than horizon after this one
+            early = self.horizon - (self.last_time - sampled)
+            late = time - sampled - self.horizon
+            closer = self.last_time > sampled and early < late
+            self._fit(features, previous if closer else queues)
+
+        x = np.empty_like(x)
+        x[0] = 1.0
+        x[1] = queues
+        x[2] = (queues - previous) / dt
+        x[3] = average
+        self.features = x
+        self.last_time = time
+        self.pending.append((time, x))
+
+    def _fit(self, x, y):
+        """One RLS step for every lane: x (features x lanes) -> y (lanes)."""
+        px = (self.covariance * x[None]).sum(axis=1)
+        gain = px / (self.forgetting + (x * px).sum(axis=0))
+        error = y - (self.weights * x).sum(axis=0)
+        self.weights += gain * error
+        self.covariance -= gain[:, None] * px[None]
+        self.covariance *= 1.0 / self.forgetting
+        self.updates += 1
+
+    def predict(self):
+        """Queue per lane HORIZON seconds after the last sample."""
+        return np.maximum((self.weights * self.features).sum(axis=0), 0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time forecaster updates and check its error on a "
+                    "synthetic queue signal."
+    )
+    parser.add_argument("--lanes", type=int, default=1600,
+                        help="default: about a 10x10 grid")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    phase = rng.random(args.lanes) * 2 * np.pi
+    period = rng.integers(60, 120, args.lanes)
+
+    def queues(t):
+        wave = 6 * (1 + np.sin(2 * np.pi * t / period + phase))
+        return np.round(wave + rng.normal(0, 0.5, args.lanes))
+
+    forecaster = QueueForecaster(args.lanes, horizon=args.horizon)
+    forecasts = {}
+    errors, persistence = [], []
+    elapsed = 0.0
+    for t in range(args.steps):
+        q = queues(t)
+        started = time.perf_counter()
+        forecaster.update(t, q)
+        forecast = forecaster.predict()
+        elapsed += time.perf_counter() - started
+        forecasts[t] = (forecast, q)
+        if t - args.horizon in forecasts:
+            forecast, then = forecasts.pop(t - args.horizon)
+            if t > args.steps // 2:
+                errors.append(np.abs(forecast - q).mean())
+                persistence.append(np.abs(then - q).mean())
+
+    print(f"{args.lanes} lanes: {elapsed / args.steps * 1e6:.0f} us per "
+          f"update + forecast; {args.horizon}s-ahead MAE "
+          f"{np.mean(errors):.2f} (persistence {np.mean(persistence):.2f})")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
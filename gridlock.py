@@ -0,0 +1,221 @@
+import numpy as np
+
+from lane_sensing import topology_lanes
+
+# ---------------- GRIDLOCK DETECTOR ----------------
+# The runner's speed check only calls a gridlock once the network average
+# speed has stayed under LOW_SPEED_THRESHOLD for LOW_SPEED_DURATION, long
+# after the run was lost. This detector watches the subscribed lanes instead
+# and reports three irrecoverable situations as soon as they are certain:
+#
+#   spillback   a cycle of junctions each blocked by the next one: the
+#               outgoing lane from A into B stays full and stopped, B's into
+#               C too ... back to A. Nothing on the cycle can ever move.
+#   starvation  one lane stopped (halting vehicles, no movement) for longer
+#               than its longest possible red plus STARVATION_MARGIN, while
+#               no queue anywhere discharged for STALL_TIME; the controller
+#               will not serve it any more.
+#   stall       every lane with vehicles on it stopped for STALL_TIME.
+#
+# Occupancy, halting and speed of the last HISTORY samples per lane are kept
+# in ring buffers (one row per metrics step); "jammed" looks at the samples
+# of the last JAM_WINDOW seconds. How long each lane has been stopped is a
+# timestamp per lane, so long waits cost nothing per step.
+#
+# A lane's longest possible red is the longest run of phases of its
+# junction's program without a green link for it (all-red programs: the
+# whole cycle); with max_green (adaptive controllers stretch phases up to
+# it) at least max_green x the other phases. Never below STARVATION_TIME.
+# ----------------------------------------------------
+
+HISTORY = 64                # samples kept per lane
+JAM_WINDOW = 20             # s a lane must stay full and stopped to be jammed
+JAM_OCCUPANCY = 0.5         # share of the lane length covered by vehicles
+STOP_SPEED = 0.1            # m/s, lane mean speed below this = not moving
+STARVATION_TIME = 90        # s, shortest starvation limit of any lane
+STARVATION_MARGIN = 60      # s on top of a lane's longest red
+STALL_TIME = 40             # s
+
+
+class GridlockDetector:
+
+    def __init__(self, topology, history=HISTORY, jam_window=JAM_WINDOW,
+                 jam_occupancy=JAM_OCCUPANCY, starvation_time=STARVATION_TIME,
+                 starvation_margin=STARVATION_MARGIN, stall_time=STALL_TIME,
+                 max_green=None):
+        self.lanes = topology_lanes(topology)
+        self.jam_window = jam_window
+        self.jam_occupancy = jam_occupancy
+        self.stall_time = stall_time
+        self.starvation_time = starvation_limits(
+            topology, self.lanes, starvation_time, starvation_margin,
+            max_green)
+        self.progress_at = -np.inf      # last step a queue discharged
+
+        n = len(self.lanes)
+        self.times = np.full(history, -np.inf)
+        self.occupancy = np.zeros((history, n))
+        self.halting = np.zeros((history, n), dtype=np.int64)
+        self.speed = np.zeros((history, n))
+        self.head = 0               # next row to write
+        self.vehicles = np.zeros(n, dtype=np.int64)     # latest sample only
+        self.stopped_since = np.full(n, np.nan)
+
+        # links between junctions: lane index -> (upstream tls, downstream tls)
+        lane_index = {lane: i for i, lane in enumerate(self.lanes)}
+        entering = {
+            lane: tls
+            for tls, topo in topology.items()
+            for lane in topo["incoming_lanes"]
+        }
+        self.links = [
+            (lane_index[lane], tls, entering[lane])
+            for tls, topo in topology.items()
+            for lane in topo["outgoing_lanes"]
+            if lane in entering and entering[lane] != tls
+        ]
+
+    def update(self, step, lane_states):
+        """Add the lane states of step (read_lane_states() result)."""
+        lanes = self.lanes
+        n = len(lanes)
+        row = self.head
+        self.times[row] = step
+        self.occupancy[row] = np.fromiter(
+            map(lane_states["occupancy"].__getitem__, lanes), float, n)
+        self.halting[row] = np.fromiter(
+            map(lane_states["halting"].__getitem__, lanes), np.int64, n)
+        self.speed[row] = np.fromiter(
+            map(lane_states["speed"].__getitem__, lanes), float, n)
+        self.vehicles = np.fromiter(
+            map(lane_states["vehicles"].__getitem__, lanes), np.int64, n)
+        previous = row - 1
+        if (not np.isfinite(self.times[previous])
+                or (self.halting[row] < self.halting[previous]).any()):
+            self.progress_at = step
+        self.head = (row + 1) % len(self.times)
+
+        stopped = (self.halting[row] > 0) & (self.speed[row] < STOP_SPEED)
+        self.stopped_since = np.where(
+            stopped, np.fmin(self.stopped_since, step), np.nan)
+
+    # ---- per-lane state ----
+    def jammed(self):
+        """Bool per lane: full and stopped in every sample of the jam window."""
+        start = self.times[self.head - 1] - self.jam_window
+        recent = self.times > start
+        # only once the buffer reaches back over the whole window
+        if not (np.isfinite(self.times) & ~recent).any():
+            return np.zeros(len(self.lanes), dtype=bool)
+        return (
+            (self.occupancy[recent] >= self.jam_occupancy).all(axis=0)
+            & (self.halting[recent] > 0).all(axis=0)
+            & (self.speed[recent] < STOP_SPEED).all(axis=0)
+        )
+
+    def stopped_for(self):
+        """Seconds every lane has been stopped for (0 if moving or empty)."""
+        now = self.times[self.head - 1]
+        return np.nan_to_num(now - self.stopped_since, nan=0.0)
+
+    def spillback(self):
+        """{tls: [downstream tls whose jammed queue reaches back into it]}"""
+        jammed = self.jammed()
+        blocked = {}
+        for lane, upstream, downstream in self.links:
+            if jammed[lane]:
+                blocked.setdefault(upstream, []).append(downstream)
+        return blocked
+
+    # ---- verdict ----
+    def check(self):
+        """None while the run can recover, else (kind, detail)."""
+        cycle = _find_cycle(self.spillback())
+        if cycle:
+            return "spillback", " > ".join(cycle + cycle[:1])
+
+        stopped_for = self.stopped_for()
+        now = self.times[self.head - 1]
+        starved = np.flatnonzero(stopped_for >= self.starvation_time)
+        if len(starved) and now - self.progress_at >= self.stall_time:
+            lane = starved[np.argmax(stopped_for[starved])]
+            return "starvation", (
+                f"{self.lanes[lane]} stopped for {stopped_for[lane]:.0f}s"
+            )
+
+        occupied = self.vehicles > 0
+        if occupied.any() and (stopped_for[occupied] >= self.stall_time).all():
+            return "stall", f"{int(occupied.sum())} lanes stopped"
+        return None
+
+    # ---- checkpoints ----
+    def checkpoint_state(self):
+        return {
+            "times": self.times.copy(),
+            "occupancy": self.occupancy.copy(),
+            "halting": self.halting.copy(),
+            "speed": self.speed.copy(),
+            "head": self.head,
+            "vehicles": self.vehicles.copy(),
+            "stopped_since": self.stopped_since.copy(),
+            "progress_at": self.progress_at,
+        }
+
+    def restore_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+def longest_red(durations, green):
+    """Longest run of consecutive phases (cyclic) with green False, s."""
+    if not any(green):
+        return sum(durations)
+    longest = run = 0.0
+    for duration, g in zip(durations * 2, green * 2):
+        run = 0.0 if g else run + duration
+        longest = max(longest, run)
+    return longest
+
+
+def starvation_limits(topology, lanes, floor=STARVATION_TIME,
+                      margin=STARVATION_MARGIN, max_green=None):
+    """Seconds each lane may stay stopped before it counts as starved."""
+    limits = np.full(len(lanes), float(floor))
+    index = {lane: i for i, lane in enumerate(lanes)}
+    for topo in topology.values():
+        durations = [phase.duration for phase in topo["logic"].phases]
+        for lane, links in topo["lane_links"].items():
+            green = [any(state[i] in "Gg" for i in links if i < len(state))
+                     for state in topo["phases"]]
+            red = longest_red(durations, green)
+            if max_green:
+                red = max(red, max_green * (topo["num_phases"] - 1))
+            i = index[lane]
+            limits[i] = max(limits[i], red + margin)
+    return limits
+
+
+def _find_cycle(graph):
+    """A cycle of {node: [successors]} as a node list, None without one."""
+    state = {}          # node -> 1 on the current path, 2 done
+
+    def visit(node, path):
+        state[node] = 1
+        path.append(node)
+        for nxt in graph.get(node, ()):
+            if state.get(nxt) == 1:
+                return path[path.index(nxt):]
+            if nxt not in state:
+                cycle = visit(nxt, path)
+                if cycle:
+                    return cycle
+        state[node] = 2
+        path.pop()
+        return None
+
+    for node in graph:
+        if node not in state:
+            cycle = visit(node, [])
+            if cycle:
+                return cycle
+    return None
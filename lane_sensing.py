@@ -0,0 +1,58 @@
+import traci.constants as tc
+
+from sumo_backend import traci
+
+# ---------------- LANE SENSING ----------------
+# Every controlled lane is subscribed once; after each simulationStep a single
+# getAllSubscriptionResults call returns the whole lane state, so controllers
+# read queues from a deduplicated snapshot instead of polling TraCI per link.
+# ----------------------------------------------
+
+LANE_VARS = {
+    "halting": tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+    "vehicles": tc.LAST_STEP_VEHICLE_NUMBER,
+    "speed": tc.LAST_STEP_MEAN_SPEED,
+    "occupancy": tc.LAST_STEP_OCCUPANCY,
+}
+
+_lane_states = {name: {} for name in LANE_VARS}
+
+
+def topology_lanes(topology):
+    """All incoming and outgoing lanes of the given {tls: topology} map."""
+    lanes = {}
+    for topo in topology.values():
+        for lane in topo["incoming_lanes"]:
+            lanes[lane] = None
+        for lane in topo["outgoing_lanes"]:
+            lanes[lane] = None
+    return list(lanes)
+
+
+def subscribe_lanes(lanes):
+    var_ids = list(LANE_VARS.values())
+    for lane in lanes:
+        traci.lane.subscribe(lane, var_ids)
+
+
+def read_lane_states():
+    """
+    Pull every subscribed lane in one call (call once per simulationStep).
+    Returns {"halting": {lane: n}, "vehicles": ..., "speed": ..., "occupancy": ...}
+    """
+    results = traci.lane.getAllSubscriptionResults()
+
+    for name, var in LANE_VARS.items():
+        _lane_states[name] = {
+            lane: values[var] for lane, values in results.items()
+        }
+
+    return _lane_states
+
+
+def lane_states():
+    return _lane_states
+
+
+def lane_queue(lane_id):
+    return _lane_states["halting"][lane_id]
@@ -0,0 +1,248 @@
+import argparse
+import os
+import pickle
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import traci.constants as tc
+
+from tls_program import Logic, Phase
+
+# ---------------- NETWORK INDEX ----------------
+# A .net.xml is streamed once with iterparse into flat arrays (junctions,
+# edges, lanes, connections) plus the tlLogic programs, and the result is
+# pickled into a sidecar next to it (<net>.idx, rebuilt when the network
+# file changes). Loading the sidecar takes milliseconds, also for networks
+# too big for a DOM.
+#
+# The index answers the questions the runner otherwise asks TraCI at start
+# (trafficlight.getIDList, getCompleteRedYellowGreenDefinition,
+# getControlledLinks), so the topology can be built without a single call.
+# It describes the programs stored in the network file: scenarios loading
+# extra TLS programs through additional files need the TraCI topology.
+# -----------------------------------------------
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".idx"
+
+TLS_TYPES = {
+    "static": tc.TRAFFICLIGHT_TYPE_STATIC,
+    "actuated": tc.TRAFFICLIGHT_TYPE_ACTUATED,
+    "NEMA": tc.TRAFFICLIGHT_TYPE_NEMA,
+    "delay_based": tc.TRAFFICLIGHT_TYPE_DELAYBASED,
+}
+
+
+class NetIndex:
+    """
+    Arrays of one network; ids are lists, references between tables are
+    int32 row numbers (-1 = none).
+
+    junctions   junction_ids, junction_type, junction_xy (n x 2)
+    edges       edge_ids, edge_from, edge_to (junction rows), edge_internal
+    lanes       lane_ids, lane_edge, lane_length, lane_speed
+    connections conn_from, conn_to, conn_via (lane rows), conn_tls (tls
+                rows), conn_link (link index), conn_dir
+    tls         tls_ids (sorted like trafficlight.getIDList) and
+                programs {tls: [(programID, type, offset, phases)]}
+    """
+
+    def __init__(self, tables):
+        self.__dict__.update(tables)
+        self.lane_index = {lane: i for i, lane in enumerate(self.lane_ids)}
+        self.tls_index = {tls: i for i, tls in enumerate(self.tls_ids)}
+        # connections grouped by tls: rows of tls i are
+        # _conn_order[_conn_start[i]:_conn_start[i + 1]]
+        self._conn_order = np.argsort(self.conn_tls, kind="stable")
+        self._conn_start = np.searchsorted(
+            self.conn_tls[self._conn_order], np.arange(len(self.tls_ids) + 1)
+        )
+
+    def logic(self, tls, program=0):
+        """tlLogic of tls as a trafficlight Logic (what TraCI returns)."""
+        program_id, kind, _, phases = self.programs[tls][program]
+        return Logic(program_id, kind, 0, [
+            Phase(duration, state, min_dur, max_dur, next_phases, name)
+            for duration, state, min_dur, max_dur, next_phases, name in phases
+        ])
+
+    def controlled_links(self, tls):
+        """Like trafficlight.getControlledLinks: [[(in, out, via)], ...]"""
+        i = self.tls_index[tls]
+        rows = self._conn_order[self._conn_start[i]:self._conn_start[i + 1]]
+        links = [[] for _ in range(int(self.conn_link[rows].max()) + 1)] \
+            if len(rows) else []
+        lanes = self.lane_ids
+        for row in rows:
+            via = self.conn_via[row]
+            links[self.conn_link[row]].append((
+                lanes[self.conn_from[row]],
+                lanes[self.conn_to[row]],
+                lanes[via] if via >= 0 else "",
+            ))
+        return links
+
+
+# ---------------- PARSING ----------------
+
+def parse_net(net_file):
+    """Stream net_file into the NetIndex tables."""
+    junctions, junction_type, junction_xy = [], [], []
+    edges, edge_nodes, edge_internal = [], [], []
+    lanes, lane_edge, lane_length, lane_speed = [], [], [], []
+    connections = []        # (from lane, to lane, via, tls, link, dir)
+    programs = {}
+
+    edge_row = -1
+    phases = None
+    for event, elem in ET.iterparse(net_file, events=("start", "end")):
+        tag = elem.tag
+        if event == "end":
+            if tag in ("edge", "junction", "connection", "tlLogic"):
+                elem.clear()
+            continue
+
+        if tag == "edge":
+            edge_row = len(edges)
+            edges.append(elem.get("id"))
+            edge_nodes.append((elem.get("from"), elem.get("to")))
+            edge_internal.append(elem.get("function") == "internal")
+        elif tag == "lane" and edge_row >= 0:
+            lanes.append(elem.get("id"))
+            lane_edge.append(edge_row)
+            lane_length.append(float(elem.get("length")))
+            lane_speed.append(float(elem.get("speed")))
+        elif tag == "junction":
+            edge_row = -1
+            junctions.append(elem.get("id"))
+            junction_type.append(elem.get("type"))
+            junction_xy.append((float(elem.get("x")), float(elem.get("y"))))
+        elif tag == "tlLogic":
+            edge_row = -1
+            phases = []
+            programs.setdefault(elem.get("id"), []).append((
+                elem.get("programID"),
+                TLS_TYPES.get(elem.get("type"), tc.TRAFFICLIGHT_TYPE_STATIC),
+                float(elem.get("offset", 0)),
+                phases,
+            ))
+        elif tag == "phase" and phases is not None:
+            duration = float(elem.get("duration"))
+            phases.append((
+                duration,
+                elem.get("state"),
+                # unset bounds read back as the duration through TraCI
+                float(elem.get("minDur", duration)),
+                float(elem.get("maxDur", duration)),
+                tuple(int(n) for n in elem.get("next", "").split()),
+                elem.get("name", ""),
+            ))
+        elif tag == "connection":
+            edge_row = -1
+            connections.append((
+                f"{elem.get('from')}_{elem.get('fromLane')}",
+                f"{elem.get('to')}_{elem.get('toLane')}",
+                elem.get("via"),
+                elem.get("tl"),
+                int(elem.get("linkIndex", -1)),
+                elem.get("dir", ""),
+            ))
+
+    junction_row = {j: i for i, j in enumerate(junctions)}
+    lane_row = {lane: i for i, lane in enumerate(lanes)}
+    tls_ids = sorted(programs)
+    tls_row = {tls: i for i, tls in enumerate(tls_ids)}
+
+    def rows(ids, index):
+        return np.array([index.get(i, -1) for i in ids], dtype=np.int32)
+
+    return {
+        "junction_ids": junctions,
+        "junction_type": junction_type,
+        "junction_xy": np.array(junction_xy, dtype=np.float64).reshape(-1, 2),
+        "edge_ids": edges,
+        "edge_from": rows((src for src, _ in edge_nodes), junction_row),
+        "edge_to": rows((dst for _, dst in edge_nodes), junction_row),
+        "edge_internal": np.array(edge_internal, dtype=bool),
+        "lane_ids": lanes,
+        "lane_edge": np.array(lane_edge, dtype=np.int32),
+        "lane_length": np.array(lane_length, dtype=np.float32),
+        "lane_speed": np.array(lane_speed, dtype=np.float32),
+        "conn_from": rows((c[0] for c in connections), lane_row),
+        "conn_to": rows((c[1] for c in connections), lane_row),
+        "conn_via": rows((c[2] for c in connections), lane_row),
+        "conn_tls": rows((c[3] for c in connections), tls_row),
+        "conn_link": np.array([c[4] for c in connections], dtype=np.int32),
+        "conn_dir": [c[5] for c in connections],
+        "tls_ids": tls_ids,
+        "programs": programs,
+    }
+
+# -----------------------------------------
+
+
+def _source_stamp(net_file):
+    stat = os.stat(net_file)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def load_net(net_file, sidecar=True):
+    """
+    NetIndex of net_file, from its <net>.idx sidecar when that is current,
+    else parsed (and the sidecar written, if the folder is writable).
+    """
+    index_file = net_file + INDEX_SUFFIX
+    stamp = _source_stamp(net_file)
+    if sidecar and os.path.exists(index_file):
+        with open(index_file, "rb") as f:
+            cached = pickle.load(f)
+        if cached["version"] == INDEX_VERSION and cached["source"] == stamp:
+            return NetIndex(cached["tables"])
+
+    tables = parse_net(net_file)
+    if sidecar:
+        tmp = f"{index_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump({"version": INDEX_VERSION, "source": stamp,
+                             "tables": tables}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, index_file)
+        except OSError:
+            pass        # read-only network folder: parse every time
+    return NetIndex(tables)
+
+
+def config_net_file(sumocfg):
+    """Path of the net-file a .sumocfg loads."""
+    for _, elem in ET.iterparse(sumocfg):
+        if elem.tag == "net-file":
+            return os.path.join(os.path.dirname(sumocfg), elem.get("value"))
+    raise ValueError(f"{sumocfg} has no net-file")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Index a .net.xml (writes the .idx sidecar) and print "
+                    "its size."
+    )
+    parser.add_argument("net_file")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="ignore an existing sidecar")
+    args = parser.parse_args(argv)
+
+    if args.rebuild and os.path.exists(args.net_file + INDEX_SUFFIX):
+        os.remove(args.net_file + INDEX_SUFFIX)
+    started = time.perf_counter()
+    net = load_net(args.net_file)
+    elapsed = time.perf_counter() - started
+    print(f"{args.net_file}: {len(net.junction_ids)} junctions, "
+          f"{int((~net.edge_internal).sum())} edges, {len(net.lane_ids)} "
+          f"lanes, {len(net.conn_link)} connections, {len(net.tls_ids)} "
+          f"traffic lights ({elapsed * 1000:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
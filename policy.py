@@ -0,0 +1,171 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+# ---------------- BATCHED POLICY INFERENCE ----------------
+# A learned (or parametric) signal policy scores the phases of every due
+# junction in one forward pass instead of one model call per junction.
+#
+# PhaseLayout packs the pressure engine's per-phase rows into a padded
+# (junctions, max_phases, FEATURES) array; junctions with fewer phases are
+# padded with zero rows and masked out. MLPPolicy is one small MLP shared by
+# all phases (FEATURES in, one score out), so the whole batch is a couple of
+# matrix products over junctions x max_phases rows and the phase choice is a
+# masked argmax. The same observation layout is what rl_env.py trains on.
+#
+# Weights file: .npz with W0, b0, W1, b1, ... (ReLU between layers, the last
+# layer has one output) and optionally mean / std to normalise the features.
+# -----------------------------------------------------------
+
+FEATURES = ["q_up", "q_down", "age", "max_age", "current"]
+
+
+class PhaseLayout:
+    """Padded (junction, phase) view of the pressure engine's phase rows."""
+
+    def __init__(self, engine, topology, tls_ids):
+        self.tls_ids = list(tls_ids)
+        self.index = {tls: i for i, tls in enumerate(self.tls_ids)}
+        counts = [topology[tls]["num_phases"] for tls in self.tls_ids]
+        self.max_phases = max(counts, default=0)
+
+        # padding points at one extra all-zero row after the engine's rows
+        self.rows = np.full((len(self.tls_ids), self.max_phases),
+                            engine.num_rows, dtype=np.int64)
+        for i, tls in enumerate(self.tls_ids):
+            start, _ = engine.offset[tls]
+            self.rows[i, :counts[i]] = np.arange(start, start + counts[i])
+        self.mask = self.rows < engine.num_rows
+
+    def observe(self, terms, current, junctions=None):
+        """
+        Engine terms (with ages) and the phase each junction shows ->
+        float32 (junctions, max_phases, len(FEATURES)). junctions: layout
+        indices to pack, default all, in order.
+        """
+        rows = self.rows if junctions is None else self.rows[junctions]
+        obs = np.empty(rows.shape + (len(FEATURES),), dtype=np.float32)
+        for f, name in enumerate(FEATURES[:-1]):
+            obs[..., f] = np.append(terms[name], 0)[rows]
+        obs[..., -1] = (np.arange(self.max_phases)
+                        == np.asarray(current)[:, None])
+        return obs
+
+
+class MLPPolicy:
+
+    def __init__(self, weights, biases, mean=None, std=None):
+        if weights[0].shape[0] != len(FEATURES) or weights[-1].shape[1] != 1:
+            raise ValueError(
+                f"policy layers must map {len(FEATURES)} features to 1 score")
+        self.weights = [np.asarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.mean = None if mean is None else np.asarray(mean, np.float32)
+        self.std = None if std is None else np.asarray(std, np.float32)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            layers = sum(1 for name in data.files if name.startswith("W"))
+            return cls(
+                [data[f"W{i}"] for i in range(layers)],
+                [data[f"b{i}"] for i in range(layers)],
+                data["mean"] if "mean" in data.files else None,
+                data["std"] if "std" in data.files else None,
+            )
+
+    def save(self, path):
+        arrays = {}
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            arrays[f"W{i}"] = w
+            arrays[f"b{i}"] = b
+        if self.mean is not None:
+            arrays["mean"] = self.mean
+            arrays["std"] = self.std
+        np.savez(path, **arrays)
+
+    def scores(self, obs, mask):
+        """(n, phases, features) -> (n, phases) scores, -inf where masked."""
+        x = obs.reshape(-1, obs.shape[-1])
+        if self.mean is not None:
+            x = (x - self.mean) / self.std
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w + b
+            if i < last:
+                np.maximum(x, 0, out=x)
+        return np.where(mask, x.reshape(obs.shape[:-1]), -np.inf)
+
+    def act(self, obs, mask):
+        """-> best phase per junction (ties: lowest phase), scores"""
+        scores = self.scores(obs, mask)
+        return scores.argmax(axis=1), scores
+
+
+def linear_policy(alpha=1.0, beta=0.7, gamma=0.3):
+    """
+    One linear layer with V4's terms, alpha*q_up - beta*q_down + gamma*age,
+    without V4's floor at 0 (and no MAX_GREEN, which is controller logic).
+    """
+    w = np.zeros((len(FEATURES), 1))
+    w[FEATURES.index("q_up")] = alpha
+    w[FEATURES.index("q_down")] = -beta
+    w[FEATURES.index("age")] = gamma
+    return MLPPolicy([w], [np.zeros(1)])
+
+
+def random_policy(hidden, rng):
+    sizes = [len(FEATURES), *hidden, 1]
+    return MLPPolicy(
+        [rng.normal(0, 1 / np.sqrt(m), (m, n))
+         for m, n in zip(sizes, sizes[1:])],
+        [np.zeros(n) for n in sizes[1:]],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time one batched policy decision against per-junction "
+                    "calls for growing junction counts (synthetic states)."
+    )
+    parser.add_argument("--junctions", type=int, nargs="+",
+                        default=[9, 100, 400, 2500])
+    parser.add_argument("--phases", type=int, default=8,
+                        help="max phases; every other junction has half")
+    parser.add_argument("--hidden", type=int, nargs="*", default=[32, 32])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--export", default=None, metavar="PATH",
+                        help="write the linear policy with V4's weights "
+                             "and exit")
+    args = parser.parse_args(argv)
+
+    if args.export:
+        linear_policy().save(args.export)
+        print(args.export)
+        return
+
+    rng = np.random.default_rng(0)
+    policy = random_policy(args.hidden, rng)
+    print(f"{'junctions':>10s} {'batched ms':>11s} {'per-junction ms':>16s}")
+    for n in args.junctions:
+        obs = rng.random((n, args.phases, len(FEATURES)), dtype=np.float32)
+        mask = np.ones((n, args.phases), dtype=bool)
+        mask[1::2, args.phases // 2:] = False
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            policy.act(obs, mask)
+        batched = (time.perf_counter() - started) / args.repeat
+
+        started = time.perf_counter()
+        for _ in range(max(args.repeat // 10, 1)):
+            for i in range(n):
+                policy.act(obs[i:i + 1], mask[i:i + 1])
+        single = (time.perf_counter() - started) / max(args.repeat // 10, 1)
+        print(f"{n:10d} {batched * 1000:11.3f} {single * 1000:16.3f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,185 @@
+import numpy as np
+
+from lane_sensing import topology_lanes
+
+# ---------------- PRESSURE ENGINE ----------------
+# Every TLS is compiled once into a phase x movement incidence matrix plus
+# upstream / downstream lane index arrays. The green (phase, movement) pairs of
+# all junctions are then stacked into flat arrays, so the per-phase sums
+# q_up, q_down, age for the whole network are a handful of NumPy calls per
+# tick. The V3 / V4 / V5 formulas are selectable scoring functions below.
+# -------------------------------------------------
+
+
+def score_v3(terms):
+    """TRUE Max-Pressure: sum over (q_up - q_down) of all green movements"""
+    pressure = np.asarray(terms["q_up"] - terms["q_down"], dtype=float)
+    return {"pressure": pressure, "raw": pressure}
+
+
+def score_v4(terms, alpha, beta, gamma):
+    """Fairness + downstream aware: ALPHA*qi - BETA*qj + GAMMA*ai, floored at 0"""
+    raw = alpha * terms["q_up"] - beta * terms["q_down"] + gamma * terms["age"]
+    return {"pressure": np.maximum(raw, 0.0), "raw": raw}
+
+
+def score_v5(terms, alpha, beta_min, beta_max, gamma_min, gamma_max,
+             fairness_limit):
+    """Adaptive beta(t) / gamma(t); phases without a green movement score 0"""
+    q_up = terms["q_up"]
+    q_down = terms["q_down"]
+    max_age = terms["max_age"]
+    green = terms["has_green"]
+
+    beta = np.minimum(beta_max, np.maximum(beta_min, q_down / (q_up + 1.0)))
+    gamma = np.minimum(gamma_max, np.maximum(gamma_min, max_age / fairness_limit))
+    raw = alpha * q_up - beta * q_down + gamma * max_age
+
+    return {
+        "pressure": np.where(green, np.maximum(raw, 0.0), 0.0),
+        "raw": raw,
+        "beta": np.where(green, beta, 0.0),
+        "gamma": np.where(green, gamma, 0.0),
+    }
+
+
+SCORING = {
+    "v3": score_v3,
+    "v4": score_v4,
+    "v5": score_v5,
+}
+
+
+def compile_tls(topo, lane_index, no_lane):
+    """
+    Incidence matrix (num_phases x num_movements, 1 = green) and the
+    upstream / downstream lane index of every movement of one TLS.
+    """
+    movements = [
+        (in_lane, out_lane, idx)
+        for idx, link_group in enumerate(topo["links"])
+        for in_lane, out_lane, _ in link_group
+    ]
+
+    incidence = np.zeros((topo["num_phases"], len(movements)), dtype=np.int8)
+    for p, state in enumerate(topo["phases"]):
+        for m, (_, _, idx) in enumerate(movements):
+            if idx < len(state) and state[idx].lower() == 'g':
+                incidence[p, m] = 1
+
+    up_idx = np.array(
+        [lane_index[in_lane] for in_lane, _, _ in movements], dtype=np.int64
+    )
+    down_idx = np.array(
+        [lane_index[out_lane] if out_lane else no_lane
+         for _, out_lane, _ in movements],
+        dtype=np.int64
+    )
+    return incidence, up_idx, down_idx
+
+
+class PressureEngine:
+
+    def __init__(self, topology):
+        self.tls_ids = list(topology)
+        self.lanes = topology_lanes(topology)
+        self.lane_index = {lane: i for i, lane in enumerate(self.lanes)}
+        # one extra always-zero slot stands in for a missing downstream lane
+        self.no_lane = len(self.lanes)
+
+        self.incidence = {}
+        self.up_idx = {}
+        self.down_idx = {}
+        self.offset = {}
+        self.controlled = {}
+
+        rows, ups, downs = [], [], []
+        num_rows = 0
+
+        for tls in self.tls_ids:
+            incidence, up_idx, down_idx = compile_tls(
+                topology[tls], self.lane_index, self.no_lane
+            )
+            self.incidence[tls] = incidence
+            self.up_idx[tls] = up_idx
+            self.down_idx[tls] = down_idx
+            self.offset[tls] = (num_rows, num_rows + incidence.shape[0])
+            # controlled incoming lanes and their number of links
+            self.controlled[tls] = np.unique(
+                [self.lane_index[lane]
+                 for lane in topology[tls]["controlled_lanes"]],
+                return_counts=True
+            )
+
+            phase_rows, movement_cols = np.nonzero(incidence)
+            rows.append(phase_rows + num_rows)
+            ups.append(up_idx[movement_cols])
+            downs.append(down_idx[movement_cols])
+            num_rows += incidence.shape[0]
+
+        self.num_rows = num_rows
+        self._rows = np.concatenate(rows) if rows else np.zeros(0, np.int64)
+        self._up = np.concatenate(ups) if ups else np.zeros(0, np.int64)
+        self._down = np.concatenate(downs) if downs else np.zeros(0, np.int64)
+
+        # _rows is sorted, so each phase with green movements is one segment
+        self._green_rows, self._starts = np.unique(self._rows, return_index=True)
+        self.has_green = np.zeros(num_rows, dtype=bool)
+        self.has_green[self._green_rows] = True
+
+    def phases(self, tls):
+        start, end = self.offset[tls]
+        return slice(start, end)
+
+    def lane_vector(self, values, dtype=np.int64):
+        """{lane: value} -> dense vector over engine lanes (+ zero slot)."""
+        vec = np.zeros(len(self.lanes) + 1, dtype=dtype)
+        vec[:-1] = [values.get(lane, 0) for lane in self.lanes]
+        return vec
+
+    def age_vector(self):
+        """
+        Zeroed fairness age over engine lanes (+ zero slot); updated in place
+        with reset_age / advance_age and passed to score() as it is.
+        """
+        return np.zeros(len(self.lanes) + 1, dtype=np.int64)
+
+    def reset_age(self, ages, tls):
+        ages[self.controlled[tls][0]] = 0
+
+    def advance_age(self, ages, tls):
+        """Every controlled incoming lane of tls ages by one per link."""
+        lanes, links = self.controlled[tls]
+        ages[lanes] += links
+
+    def _segment_sum(self, values):
+        out = np.bincount(self._rows, weights=values, minlength=self.num_rows)
+        if values.dtype.kind in "iu":
+            out = out.astype(np.int64)
+        return out
+
+    def terms(self, queues, ages=None):
+        """Per-phase q_up, q_down, age sum and max age of every junction."""
+        terms = {
+            "q_up": self._segment_sum(queues[self._up]),
+            "q_down": self._segment_sum(queues[self._down]),
+            "has_green": self.has_green,
+        }
+
+        if ages is not None:
+            up_ages = ages[self._up]
+            max_age = np.zeros(self.num_rows, dtype=up_ages.dtype)
+            if len(up_ages):
+                max_age[self._green_rows] = np.maximum.reduceat(
+                    up_ages, self._starts
+                )
+            terms["age"] = self._segment_sum(up_ages)
+            terms["max_age"] = max_age
+
+        return terms
+
+    def score(self, queues, ages=None, scoring="v3", **params):
+        terms = self.terms(queues, ages)
+        scores = SCORING[scoring](terms, **params)
+        terms.update(scores)
+        return terms
@@ -0,0 +1,300 @@
+import argparse
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from experience import ExperienceStore
+from lane_sensing import read_lane_states, subscribe_lanes, topology_lanes
+from policy import FEATURES, PhaseLayout
+from pressure_engine import PressureEngine
+from runner import QUIET_SUMO_ARGS, SUMOCFG
+from sumo_backend import select_backend, sumo_binary, traci
+from tls_topology import build_topology, invalidate_topology
+
+# ---------------- RL ENVIRONMENT ----------------
+# Gym-style environment over one SUMO scenario: every DECISION_INTERVAL
+# seconds the agent picks a phase for every traffic light at once.
+#
+#   observation  float32 (num_tls, max_phases, len(FEATURES)): per phase
+#                the q_up / q_down / age sum / max age terms the V4 / V5
+#                controllers score, plus 1 on the phase currently shown;
+#                phases a junction does not have stay 0 (see phase_mask).
+#                The policy.py layout, so trained weights run as-is in
+#                the "policy" controller
+#   action       int array (num_tls,), a phase index per traffic light;
+#                ignored for junctions still inside min_green
+#   reward       minus the vehicles halting on the controlled lanes at the
+#                end of the interval
+#
+# reset() / step() follow the gymnasium API (obs, info) / (obs, reward,
+# terminated, truncated, info) without depending on it. VectorGridEnv runs
+# K environments in worker processes (one SUMO each, libsumo by default)
+# and returns stacked batches; finished environments reset themselves.
+# collect() steps them and can append every transition to an
+# ExperienceStore.
+# -------------------------------------------------
+
+# ---------------- CONFIG ----------------
+DEFAULT_BACKEND = "libsumo"
+DECISION_INTERVAL = 10        # s of simulation per step()
+MIN_GREEN = 10                # s before a junction may switch again
+MAX_SIM_TIME = 4000           # s, episode truncated after that
+# ---------------------------------------
+
+
+class GridEnv:
+
+    def __init__(self, sumocfg=SUMOCFG, backend=DEFAULT_BACKEND,
+                 decision_interval=DECISION_INTERVAL, min_green=MIN_GREEN,
+                 max_sim_time=MAX_SIM_TIME, label="rl"):
+        self.sumocfg = sumocfg
+        self.backend = backend
+        self.decision_interval = decision_interval
+        self.min_green = min_green
+        self.max_sim_time = max_sim_time
+        self.label = label
+        self._running = False
+
+        # the network is loaded once to size the spaces
+        self._start()
+        self.num_tls = len(self.tls_ids)
+        self.max_phases = self.layout.max_phases
+        self.observation_shape = (self.num_tls, self.max_phases, len(FEATURES))
+        self.phase_mask = self.layout.mask
+        self._incoming = np.array([
+            self.engine.lane_index[lane]
+            for tls in self.tls_ids
+            for lane in self.topology[tls]["incoming_lanes"]
+        ], dtype=np.int64)
+
+    def _start(self, seed=None):
+        if self._running:
+            traci.close()
+        select_backend(self.backend)
+        cmd = [sumo_binary(), "-c", self.sumocfg, *QUIET_SUMO_ARGS]
+        if seed is not None:
+            cmd += ["--seed", str(seed)]
+        traci.start(cmd, label=self.label)
+        self._running = True
+
+        invalidate_topology()
+        self.tls_ids = traci.trafficlight.getIDList()
+        self.topology = build_topology(self.tls_ids)
+        subscribe_lanes(topology_lanes(self.topology))
+        self.engine = PressureEngine(self.topology)
+        self.layout = PhaseLayout(self.engine, self.topology, self.tls_ids)
+
+        self.time = 0
+        self.ages = self.engine.age_vector()
+        self.last_switch = np.zeros(len(self.tls_ids), dtype=np.int64)
+        self.phases = np.array(
+            [traci.trafficlight.getPhase(tls) for tls in self.tls_ids]
+        )
+
+    def _observe(self):
+        queues = self.engine.lane_vector(read_lane_states()["halting"])
+        terms = self.engine.terms(queues, self.ages)
+        obs = self.layout.observe(terms, self.phases)
+        return obs, queues
+
+    def reset(self, seed=None):
+        """Restart the scenario; -> observation, info"""
+        self._start(seed)
+        obs, _ = self._observe()
+        return obs, {"time": self.time}
+
+    def step(self, action):
+        """-> observation, reward, terminated, truncated, info"""
+        action = np.asarray(action)
+        may_switch = self.time - self.last_switch >= self.min_green
+        for i in np.flatnonzero(may_switch & (action != self.phases)
+                                & self.phase_mask[np.arange(self.num_tls),
+                                                  action]):
+            tls = self.tls_ids[i]
+            traci.trafficlight.setPhase(tls, int(action[i]))
+            self.last_switch[i] = self.time
+            self.engine.reset_age(self.ages, tls)
+        for tls in self.tls_ids:
+            self.engine.advance_age(self.ages, tls)
+
+        self.time = min(self.time + self.decision_interval, self.max_sim_time)
+        traci.simulationStep(self.time)
+        self.phases = np.array(
+            [traci.trafficlight.getPhase(tls) for tls in self.tls_ids]
+        )
+
+        obs, queues = self._observe()
+        halted = int(queues[self._incoming].sum())
+        terminated = traci.simulation.getMinExpectedNumber() == 0
+        truncated = not terminated and self.time >= self.max_sim_time
+        return obs, -float(halted), terminated, truncated, {
+            "time": self.time, "halted": halted,
+        }
+
+    def close(self):
+        if self._running:
+            traci.close()
+            self._running = False
+
+
+# ---------------- VECTORIZED ----------------
+
+def _worker(conn, env_kwargs):
+    env = GridEnv(**env_kwargs)
+    conn.send((env.observation_shape, env.phase_mask, list(env.tls_ids)))
+    try:
+        while True:
+            command, data = conn.recv()
+            if command == "step":
+                obs, reward, terminated, truncated, info = env.step(data)
+                if terminated or truncated:
+                    info["final_observation"] = obs
+                    obs, _ = env.reset()
+                conn.send((obs, reward, terminated, truncated, info))
+            elif command == "reset":
+                conn.send(env.reset(data))
+            elif command == "close":
+                break
+    finally:
+        env.close()
+        conn.close()
+
+
+class VectorGridEnv:
+    """
+    num_envs GridEnv in worker processes, stepped in lockstep:
+    observations (num_envs, *observation_shape), rewards / terminated /
+    truncated (num_envs,), one info dict per env.
+    """
+
+    def __init__(self, num_envs, **env_kwargs):
+        self.num_envs = num_envs
+        self._conns = []
+        self._procs = []
+        for i in range(num_envs):
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(
+                target=_worker,
+                args=(child, dict(env_kwargs, label=f"rl-{i}")),
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+        specs = [conn.recv() for conn in self._conns]
+        self.observation_shape, self.phase_mask, self.tls_ids = specs[0]
+        self.num_tls = len(self.tls_ids)
+
+    def reset(self, seed=None):
+        for i, conn in enumerate(self._conns):
+            conn.send(("reset", None if seed is None else seed + i))
+        obs, infos = zip(*(conn.recv() for conn in self._conns))
+        return np.stack(obs), list(infos)
+
+    def step_async(self, actions):
+        for conn, action in zip(self._conns, actions):
+            conn.send(("step", action))
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, infos = zip(
+            *(conn.recv() for conn in self._conns)
+        )
+        return (np.stack(obs), np.array(rewards), np.array(terminated),
+                np.array(truncated), list(infos))
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(("close", None))
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join()
+
+# --------------------------------------------
+
+
+def random_actions(rng, phase_mask, num_envs):
+    """Uniform valid phase per traffic light, (num_envs, num_tls)."""
+    counts = phase_mask.sum(axis=1)
+    return (rng.random((num_envs, len(counts))) * counts).astype(np.int64)
+
+
+def collect(envs, store, steps, act, obs=None):
+    """
+    Step envs (a VectorGridEnv) steps times with act(obs) -> actions and add
+    one transition per env and step to store, if any (action: the phase of
+    every junction); next_obs of a finished episode is its final
+    observation. -> the observations to continue from, episodes finished
+    """
+    if obs is None:
+        obs, _ = envs.reset()
+    episodes = 0
+    for _ in range(steps):
+        actions = act(obs)
+        next_obs, rewards, terminated, truncated, infos = envs.step(actions)
+        episodes += int((terminated | truncated).sum())
+        if store is not None:
+            final = next_obs.copy()
+            for i, info in enumerate(infos):
+                if "final_observation" in info:
+                    final[i] = info["final_observation"]
+            store.add(obs, actions, rewards, final, terminated)
+        obs = next_obs
+    return obs, episodes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure RL environment throughput with random actions."
+    )
+    parser.add_argument("--num-envs", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--steps", type=int, default=200,
+                        help="vectorized steps to run")
+    parser.add_argument("--sumocfg", default=SUMOCFG)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--decision-interval", type=int,
+                        default=DECISION_INTERVAL)
+    parser.add_argument("--experience", metavar="DIR", default=None,
+                        help="also store the transitions there "
+                             "(experience.py)")
+    args = parser.parse_args(argv)
+
+    envs = VectorGridEnv(args.num_envs, sumocfg=args.sumocfg,
+                         backend=args.backend,
+                         decision_interval=args.decision_interval)
+    rng = np.random.default_rng(0)
+    store = None
+    if args.experience:
+        store = ExperienceStore(envs.observation_shape,
+                                directory=args.experience,
+                                action_shape=(envs.num_tls,))
+    try:
+        obs, _ = envs.reset(seed=0)
+        started = time.perf_counter()
+        _, episodes = collect(
+            envs, store, args.steps,
+            lambda obs: random_actions(rng, envs.phase_mask, args.num_envs),
+            obs)
+        elapsed = time.perf_counter() - started
+    finally:
+        envs.close()
+        if store is not None:
+            store.flush()
+
+    env_steps = args.steps * args.num_envs
+    print(f"{args.num_envs} envs: {env_steps / elapsed:.1f} env-steps/s "
+          f"({env_steps * args.decision_interval / elapsed:.0f} simulated "
+          f"s/s, {episodes} episodes finished)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
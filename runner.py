@@ -0,0 +1,552 @@
+import argparse
+import ast
+import os
+import sys
+
+from checkpoint import (
+    CHECKPOINT_DIR, SAVE_STATE_ARGS, checkpoint_name, exact_restore,
+    load_checkpoint, restore_simulation, save_checkpoint
+)
+from controllers import CONTROLLERS, get_controller
+from experience import TransitionRecorder
+from gridlock import GridlockDetector
+from lane_sensing import read_lane_states, subscribe_lanes, topology_lanes
+from net_index import config_net_file, load_net
+from pressure_engine import PressureEngine
+from scheduler import DecisionScheduler
+from sumo_backend import (
+    BACKENDS, backend_name, on_select, remove_select_hook, select_backend,
+    sumo_binary, traci
+)
+from telemetry import FORMATS, TelemetrySink
+from trace_backend import TraceRecorder, divergences, use_trace
+from traci_profile import NULL_PROFILER, Profiler
+from vehicle_metrics import read_vehicle_metrics, subscribe_vehicle_speeds
+from tls_topology import build_topology, invalidate_topology
+
+# ---------------- CONFIG ----------------
+SUMOCFG = "config/grid.sumocfg"
+
+LOW_SPEED_THRESHOLD = 0.5     # m/s
+LOW_SPEED_DURATION = 60       # seconds
+
+QUIET_SUMO_ARGS = ["--verbose", "false", "--no-step-log", "true",
+                   "--no-warnings", "true"]
+# ---------------------------------------
+
+RESULTS_HEADER = ["time", "avg_speed", "running", "halted"]
+
+
+class Run:
+    """
+    Shared state of one simulation run, handed to the controller: tls ids,
+    cached topology, pressure engine, decision scheduler, current lane
+    states, logs and the profiler (NULL_PROFILER when not profiling).
+    """
+
+    def __init__(self, controller, out_dir=".", log_format="csv",
+                 profiler=NULL_PROFILER):
+        self.controller = controller
+        self.out_dir = out_dir
+        self.log_format = log_format
+        self.step = 0
+        self.tls_ids = []
+        self.topology = {}
+        self.engine = None
+        self.scheduler = None
+        self.lane_states = None
+        self.telemetry = None
+        self.profiler = profiler
+
+    def open_logs(self, offsets=None):
+        results_file = (
+            self.controller.results_file
+            or f"results_{self.controller.name}_experiment.csv"
+        )
+        logs = {"results": (results_file, RESULTS_HEADER)}
+        logs.update(self.controller.logs)
+
+        self.telemetry = TelemetrySink(
+            self.out_dir, logs, self.log_format, offsets=offsets
+        )
+        # bound method: no extra call layer in the control loop
+        self.log = self.telemetry.log
+
+    def close_logs(self):
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.profiler.record("log_write", self.telemetry.write_seconds)
+            self.telemetry = None
+
+
+def run(controller_name, params=None, backend=None, sumocfg=SUMOCFG,
+        max_sim_time=None, out_dir=".", quiet=False, label="default",
+        log_format="csv", metrics_every=1, checkpoint_every=None,
+        checkpoint_dir=None, resume=None, fork=None, trace=None,
+        profiler=None, early_gridlock=False, gridlock_checkpoint=False,
+        net_index=False, experience=None):
+    """
+    Run one controller on the scenario until all vehicles cleared, gridlock
+    or max_sim_time. backend is "gui", "headless", "libsumo" or "ctm" (the
+    cell transmission surrogate, ctm_backend.py) (default: $SUMO_BACKEND,
+    else gui). log_format is "csv" or "binary" (columnar
+    .tlog files, see columnar.py). quiet silences progress output of both the
+    runner and SUMO.
+
+    metrics_every > 1 records metrics (results log, gridlock check, KPIs)
+    only every that many seconds; SUMO is then advanced straight to the next
+    decision or metrics time with simulationStep(target) instead of one step
+    at a time. Steps are seconds (step-length 1, begin 0 as in grid.sumocfg).
+
+    checkpoint_every saves a checkpoint (see checkpoint.py) every that many
+    seconds into checkpoint_dir (default <out_dir>/checkpoints).
+    resume continues the run a checkpoint was taken from: same controller
+    and params, its logs in out_dir are cut back to the checkpoint and
+    appended to. fork starts this controller fresh (new logs) from the
+    network state of a checkpoint taken by any controller, e.g. to compare
+    v3 / v4 / v5 after one shared warm-up; the KPIs keep counting from the
+    checkpointed values so forks stay comparable over the whole horizon.
+
+    trace: with backend "replay" the recorded trace to run on (no SUMO);
+    with any other backend every TraCI call of the run is recorded there.
+
+    profiler: a traci_profile.Profiler to time TraCI calls per API and the
+    phases of every step (see traci_profile.py for the sections).
+
+    early_gridlock also runs the lane-level GridlockDetector (gridlock.py)
+    on every metrics step and stops the run at the first spillback cycle,
+    starved lane or network stall instead of waiting for the average speed
+    check. gridlock_checkpoint saves a checkpoint of the failing state.
+
+    net_index builds the TLS topology from the network file (net_index.py)
+    instead of asking TraCI for every program and its controlled links.
+
+    experience: folder of an experience store (experience.py) that gets one
+    transition per junction decision; an existing store is appended to.
+
+    Returns a summary dict with the run KPIs.
+    """
+    if resume and fork:
+        raise ValueError("resume and fork are exclusive")
+    if backend_name(backend) == "ctm" and (
+            checkpoint_every or gridlock_checkpoint or resume or fork):
+        raise ValueError(
+            "the ctm backend has no state files: checkpoint_every, "
+            "gridlock_checkpoint, resume and fork need a SUMO backend")
+    ckpt = load_checkpoint(resume or fork) if (resume or fork) else None
+
+    if resume:
+        if ckpt["controller"] != controller_name:
+            raise ValueError(
+                f"checkpoint was taken by {ckpt['controller']!r}, "
+                f"use fork to continue it with {controller_name!r}"
+            )
+        if params and dict(ckpt["params"], **params) != ckpt["params"]:
+            raise ValueError("resume keeps the checkpoint params, use fork")
+        params = ckpt["params"]
+        log_format = ckpt["log_format"]
+
+    controller = get_controller(controller_name, params)
+    if max_sim_time is None:
+        max_sim_time = controller.max_sim_time
+    if checkpoint_dir is None:
+        checkpoint_dir = os.path.join(out_dir, CHECKPOINT_DIR)
+
+    say = (lambda *args: None) if quiet else print
+
+    recorder = None
+    prof = profiler or NULL_PROFILER
+    sim = None
+    transitions = None
+    started = False
+    # hooks and SUMO are set up inside: finally undoes whatever happened
+    try:
+        if trace and backend_name(backend) == "replay":
+            use_trace(trace)
+        elif trace:
+            recorder = TraceRecorder()
+            on_select(recorder.install)
+
+        if profiler is not None:
+            on_select(profiler.install)
+
+        select_backend(backend)
+        sumo_cmd = [sumo_binary(), "-c", sumocfg]
+        if quiet:
+            sumo_cmd += QUIET_SUMO_ARGS
+        if checkpoint_every or gridlock_checkpoint or ckpt:
+            sumo_cmd += SAVE_STATE_ARGS
+        traci.start(sumo_cmd, label=label)
+        started = True
+        say(f"{controller.title} started")
+
+        sim = Run(controller, out_dir, log_format, prof)
+        invalidate_topology()
+        if net_index:
+            net = load_net(config_net_file(sumocfg))
+            sim.tls_ids = net.tls_ids
+            sim.topology = build_topology(sim.tls_ids, net)
+        else:
+            sim.tls_ids = traci.trafficlight.getIDList()
+            sim.topology = build_topology(sim.tls_ids)
+        if ckpt:
+            # loadState drops subscriptions: restore first, subscribe after
+            restore_simulation(ckpt)
+        subscribe_lanes(topology_lanes(sim.topology))
+        sim.engine = PressureEngine(sim.topology)
+        sim.scheduler = DecisionScheduler(sim.tls_ids)
+        subscribe_vehicle_speeds()
+        transitions = (
+            TransitionRecorder(sim.engine, sim.topology, sim.tls_ids,
+                               experience)
+            if experience else None
+        )
+        detector = (
+            GridlockDetector(sim.topology,
+                             max_green=controller.p.get("MAX_GREEN"))
+            if early_gridlock and controller.gridlock_check else None
+        )
+
+        loop = {
+            "step": 0,
+            "last_metrics": 0,
+            "low_speed_start": None,    # for gridlock
+            "speed_sum": 0.0,           # over steps with vehicles running
+            "busy_steps": 0,
+            "halted_vehicle_seconds": 0,
+        }
+        if ckpt:
+            loop.update(ckpt["loop"])
+            say(f"{'Resumed' if resume else 'Forked'} from t={loop['step']}s")
+            if not exact_restore(ckpt):
+                say("Warning: checkpoint saved without the current state args "
+                    f"({' '.join(SAVE_STATE_ARGS)}), results will not match "
+                    "the uninterrupted run")
+            if detector is not None and "gridlock_detector" in loop:
+                detector.restore_state(loop["gridlock_detector"])
+
+        step = sim.step = loop["step"]
+        last_metrics = loop["last_metrics"]
+        low_speed_start = loop["low_speed_start"]
+        speed_sum = loop["speed_sum"]
+        busy_steps = loop["busy_steps"]
+        halted_vehicle_seconds = loop["halted_vehicle_seconds"]
+
+        gridlock_time = None
+        gridlock_reason = None
+        clearance_time = None
+        next_checkpoint = (
+            (step // checkpoint_every + 1) * checkpoint_every
+            if checkpoint_every else None
+        )
+
+        def loop_state():
+            """The loop counters a checkpoint restores."""
+            state = {
+                "step": step,
+                "last_metrics": last_metrics,
+                "low_speed_start": low_speed_start,
+                "speed_sum": speed_sum,
+                "busy_steps": busy_steps,
+                "halted_vehicle_seconds": halted_vehicle_seconds,
+            }
+            if detector is not None:
+                state["gridlock_detector"] = detector.checkpoint_state()
+            return state
+
+        if resume:
+            sim.open_logs(ckpt["log_offsets"])
+            controller.restore_state(sim, ckpt["controller_state"])
+            for tls, due_time in ckpt["scheduled"].items():
+                sim.scheduler.schedule(tls, due_time)
+        else:
+            sim.open_logs()
+            controller.start(sim)
+        # a queue forecaster learns from every step, so no fast-forwarding
+        forecaster = controller.forecaster
+
+        while step < max_sim_time:
+            prof.end_step(step)
+            if metrics_every > 1 and forecaster is None:
+                # nothing to decide or record before target: let SUMO run
+                target = min(last_metrics + metrics_every, max_sim_time)
+                next_due = sim.scheduler.next_time()
+                if next_due is not None:
+                    target = min(target, next_due)
+                target = max(target, step + 1)
+                with prof.section("simulate"):
+                    traci.simulationStep(target)
+                step = target
+            else:
+                with prof.section("simulate"):
+                    traci.simulationStep()
+                step += 1
+            sim.step = step
+            lanes_read = False
+
+            if forecaster is not None:
+                with prof.section("lane_read"):
+                    sim.lane_states = read_lane_states()
+                lanes_read = True
+                with prof.section("forecast"):
+                    forecaster.update(step, sim.engine.lane_vector(
+                        sim.lane_states["halting"]))
+
+            due = sim.scheduler.pop_due(step)
+            if due:
+                with prof.section("control_tick"):
+                    if not lanes_read:
+                        with prof.section("lane_read"):
+                            sim.lane_states = read_lane_states()
+                    if transitions is not None:
+                        observed = transitions.observe(
+                            sim.lane_states,
+                            getattr(controller, "fairness_age", None), due
+                        )
+                    controller.control(step, due)
+                    if transitions is not None:
+                        transitions.record(observed, due)
+
+            if step - last_metrics < metrics_every:
+                continue
+
+            # ---------- METRICS ----------
+            # one snapshot feeds the results log and the gridlock check
+            with prof.section("metrics"):
+                avg_speed, running, halted = read_vehicle_metrics()
+                sim.log("results", [step, avg_speed, running, halted])
+
+            if running > 0:
+                speed_sum += avg_speed
+                busy_steps += 1
+            halted_vehicle_seconds += halted * (step - last_metrics)
+            last_metrics = step
+
+            if controller.print_every and step % controller.print_every == 0:
+                say(
+                    f"t={step:4d}s | avg_speed={avg_speed:5.2f} m/s | running={running}"
+                )
+
+            # ---- GRIDLOCK DETECTION ----
+            if controller.gridlock_check:
+                if avg_speed < LOW_SPEED_THRESHOLD and running > 0:
+                    if low_speed_start is None:
+                        low_speed_start = step
+                    elif step - low_speed_start >= LOW_SPEED_DURATION:
+                        gridlock_reason = "low speed"
+                else:
+                    low_speed_start = None
+
+            if detector is not None and gridlock_reason is None:
+                if not due and not lanes_read:
+                    with prof.section("lane_read"):
+                        sim.lane_states = read_lane_states()
+                with prof.section("gridlock"):
+                    detector.update(step, sim.lane_states)
+                    verdict = detector.check()
+                if verdict:
+                    gridlock_reason = f"{verdict[0]}: {verdict[1]}"
+
+            if gridlock_reason is not None:
+                gridlock_time = step
+                say("\n==============================")
+                say("SYSTEM FAILURE: GRIDLOCK")
+                say(f"Failure time: {step} seconds")
+                say(f"Cause: {gridlock_reason}")
+                say("==============================\n")
+                if gridlock_checkpoint:
+                    path = save_checkpoint(
+                        checkpoint_name(checkpoint_dir, controller.name, step),
+                        sim, loop_state()
+                    )
+                    say(f"Gridlock checkpoint -> {path}")
+                break
+
+            # ---- ALL VEHICLES CLEARED ----
+            if traci.simulation.getMinExpectedNumber() == 0:
+                clearance_time = step
+                say("\nAll vehicles cleared.")
+                break
+
+            # ---- CHECKPOINT ----
+            if next_checkpoint is not None and step >= next_checkpoint:
+                path = save_checkpoint(
+                    checkpoint_name(checkpoint_dir, controller.name, step),
+                    sim, loop_state()
+                )
+                say(f"Checkpoint t={step}s -> {path}")
+                next_checkpoint = ((step // checkpoint_every + 1)
+                                   * checkpoint_every)
+
+        prof.end_step(step)
+        if transitions is not None:
+            transitions.finish(read_lane_states(),
+                               getattr(controller, "fairness_age", None))
+    finally:
+        if sim is not None:
+            sim.close_logs()
+        if transitions is not None:
+            transitions.store.flush()
+        if started:
+            traci.close()
+        if profiler is not None:
+            remove_select_hook(profiler.install)
+            profiler.stop()
+        if recorder is not None:
+            remove_select_hook(recorder.install)
+            if started:
+                recorder.save(trace, {"controller": controller.name,
+                                      "params": controller.p,
+                                      "sumocfg": sumocfg})
+
+    say(f"{controller.title} simulation ended")
+
+    summary = {
+        "controller": controller.name,
+        "steps": step,
+        "mean_speed": speed_sum / busy_steps if busy_steps else 0.0,
+        "halted_vehicle_seconds": halted_vehicle_seconds,
+        "clearance_time": clearance_time,
+        "gridlock_time": gridlock_time,
+        "gridlock_reason": gridlock_reason,
+    }
+    if trace and recorder is None:
+        summary["trace_divergences"] = divergences()
+        say(f"Replay: {summary['trace_divergences']} commands differ "
+            f"from the recorded run")
+    return summary
+
+
+def parse_value(text):
+    """"1.2" -> 1.2, "10" -> 10, anything else stays a string"""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def parse_params(items):
+    """["ALPHA=1.2", "MIN_GREEN=10"] -> {"ALPHA": 1.2, "MIN_GREEN": 10}"""
+    params = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        params[key] = parse_value(value)
+    return params
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run one registered traffic-signal controller on SUMO."
+    )
+    parser.add_argument(
+        "controller", choices=sorted(CONTROLLERS),
+        help="base | v1 fixed-time | v2 queue-threshold | v3 max-pressure | "
+             "v4 fairness | v5 adaptive"
+    )
+    parser.add_argument(
+        "--backend", choices=sorted(BACKENDS), default=None,
+        help="gui (TraCI + sumo-gui), headless (TraCI + sumo), libsumo "
+             "(in-process), replay (a --trace recording, no SUMO) or ctm "
+             "(cell transmission surrogate, no SUMO); "
+             "default: $SUMO_BACKEND, else gui"
+    )
+    parser.add_argument("--sumocfg", default=SUMOCFG)
+    parser.add_argument("--max-sim-time", type=int, default=None)
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument(
+        "--log-format", choices=sorted(FORMATS), default="csv",
+        help="csv (default) or binary columnar .tlog logs"
+    )
+    parser.add_argument(
+        "--metrics-every", type=int, default=1, metavar="SECONDS",
+        help="record metrics every N seconds and let SUMO run freely "
+             "between decisions (default 1: every step)"
+    )
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=None, metavar="SECONDS",
+        help="save a checkpoint every N simulated seconds"
+    )
+    parser.add_argument(
+        "--checkpoint-dir", default=None,
+        help="default: <out-dir>/checkpoints"
+    )
+    restart = parser.add_mutually_exclusive_group()
+    restart.add_argument(
+        "--resume", metavar="CKPT",
+        help="continue the run a checkpoint was taken from"
+    )
+    restart.add_argument(
+        "--fork", metavar="CKPT",
+        help="start this controller from the network state of a checkpoint"
+    )
+    parser.add_argument(
+        "--trace", metavar="PATH",
+        help="record every TraCI call to PATH, or replay PATH with "
+             "--backend replay"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="time TraCI calls and step phases, print a report and save "
+             "profile_<controller>.json to --out-dir"
+    )
+    parser.add_argument(
+        "--profile-timeline", action="store_true",
+        help="with --profile, also save a per-step timeline CSV"
+    )
+    parser.add_argument(
+        "--early-gridlock", action="store_true",
+        help="stop at the first spillback cycle, starved lane or network "
+             "stall (gridlock.py) instead of after 60 s of low speed"
+    )
+    parser.add_argument(
+        "--gridlock-checkpoint", action="store_true",
+        help="save a checkpoint when the run gridlocks"
+    )
+    parser.add_argument(
+        "--net-index", action="store_true",
+        help="read the TLS topology from the network file (cached in a "
+             ".idx sidecar) instead of querying TraCI"
+    )
+    parser.add_argument(
+        "--experience", metavar="DIR",
+        help="append one (state, phase, reward, next state) transition per "
+             "junction decision to the experience store in DIR"
+    )
+    parser.add_argument(
+        "--param", action="append", metavar="NAME=VALUE",
+        help="override a controller CONFIG value, e.g. --param ALPHA=1.2"
+    )
+    args = parser.parse_args(argv)
+    profiler = (
+        Profiler(timeline=args.profile_timeline) if args.profile else None
+    )
+
+    run(
+        args.controller,
+        params=parse_params(args.param),
+        backend=args.backend,
+        sumocfg=args.sumocfg,
+        max_sim_time=args.max_sim_time,
+        out_dir=args.out_dir,
+        log_format=args.log_format,
+        metrics_every=args.metrics_every,
+        checkpoint_every=args.checkpoint_every,
+        checkpoint_dir=args.checkpoint_dir,
+        resume=args.resume,
+        fork=args.fork,
+        trace=args.trace,
+        profiler=profiler,
+        early_gridlock=args.early_gridlock,
+        gridlock_checkpoint=args.gridlock_checkpoint,
+        net_index=args.net_index,
+        experience=args.experience,
+    )
+
+    if profiler is not None:
+        print(profiler.format_report())
+        for path in profiler.save(args.out_dir, args.controller):
+            print(f"Profile saved to {path}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
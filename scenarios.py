@@ -0,0 +1,314 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# ---------------- SCENARIO GENERATOR ----------------
+# Synthetic load-test scenarios: an N x M signalised grid from netgenerate
+# plus a trip file following a demand profile. Every scenario lands in its
+# own folder of the cache, named after its size and a hash of all its
+# parameters, so asking for the same scenario again reuses the files.
+#
+# Demand profiles (vehicles_per_hour is the mean over the horizon):
+#   constant   evenly spaced departures, random origin / destination edges
+#   peak       peak-hour ramp: the rate climbs linearly from PEAK_LOW x mean
+#              at the start to (2 - PEAK_LOW) x mean mid-horizon and back
+#   surge      constant background plus a directional surge: SURGE_SHARE of
+#              all trips cross the grid in surge_direction during the middle
+#              third of the horizon
+# ----------------------------------------------------
+
+# ---------------- CONFIG ----------------
+SCENARIO_DIR = "scenarios"
+MAX_GRID_SIZE = 50
+
+GRID_LENGTH = 200              # m between junctions
+GRID_LANES = 2
+TLS_LAYOUT = "opposites"       # netgenerate --tls.layout
+GREEN_TIME = None              # s, None: netgenerate default (31)
+YELLOW_TIME = None             # s, None: derived from the speed limit
+
+SECONDS = 600                  # demand horizon
+VEHICLES_PER_HOUR_PER_JUNCTION = 400   # the bundled 3x3 grid: 600 trips / 600 s
+
+PEAK_LOW = 0.5
+SURGE_SHARE = 0.5
+
+DEMANDS = ["constant", "peak", "surge"]
+DIRECTIONS = ["east", "west", "north", "south"]
+# ---------------------------------------
+
+
+def scenario_key(params):
+    return hashlib.sha1(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()[:10]
+
+
+# ---------------- NETWORK ----------------
+
+def generate_network(net_file, rows, cols, lanes, length, tls_layout,
+                     green_time, yellow_time):
+    if cols == rows:
+        size = ["--grid.number", str(rows)]
+    else:
+        size = ["--grid.x-number", str(cols), "--grid.y-number", str(rows)]
+    timing = []
+    if green_time is not None:
+        timing += ["--tls.green.time", str(green_time)]
+    if yellow_time is not None:
+        timing += ["--tls.yellow.time", str(yellow_time)]
+    subprocess.run([
+        "netgenerate", "--grid", *size,
+        "--grid.length", str(length),
+        "--default.lanenumber", str(lanes),
+        "--default-junction-type", "traffic_light",
+        "--tls.layout", tls_layout,
+        *timing,
+        "--no-turnarounds", "false",
+        "--output-file", net_file,
+    ], check=True, capture_output=True)
+
+
+def read_edges(net_file):
+    """-> [(edge id, (from x, from y), (to x, to y))] of the normal edges"""
+    nodes = {}
+    edges = []
+    for _, elem in ET.iterparse(net_file):
+        if elem.tag == "junction":
+            nodes[elem.get("id")] = (float(elem.get("x")), float(elem.get("y")))
+        elif elem.tag == "edge" and elem.get("function") != "internal":
+            edges.append((elem.get("id"), elem.get("from"), elem.get("to")))
+        elem.clear()
+    return [(edge, nodes[src], nodes[dst]) for edge, src, dst in edges]
+
+# -----------------------------------------
+
+
+# ---------------- DEMAND ----------------
+
+def departures(rate, seconds, vehicles):
+    """
+    Departure times of vehicles trips spread along rate(t) (relative weight
+    per second): trip i leaves when the cumulative demand reaches i.
+    """
+    grid = np.arange(seconds + 1, dtype=float)
+    weights = rate(grid[:-1] + 0.5)
+    cumulative = np.concatenate([[0.0], np.cumsum(weights)])
+    cumulative *= vehicles / cumulative[-1]
+    return np.interp(np.arange(vehicles), cumulative, grid)
+
+
+def peak_rate(seconds):
+    def rate(t):
+        return PEAK_LOW + 2 * (1 - PEAK_LOW) * (
+            1 - np.abs(2 * t / seconds - 1)
+        )
+    return rate
+
+
+def crossing_edges(edges, direction):
+    """Edges entering the grid on the side opposite direction, and leaving it."""
+    axis, sign = {
+        "east": (0, 1), "west": (0, -1), "north": (1, 1), "south": (1, -1),
+    }[direction]
+    heading = [
+        (edge, src[axis], dst[axis]) for edge, src, dst in edges
+        if (dst[axis] - src[axis]) * sign > 0
+    ]
+    first = min(min(s, d) * sign for _, s, d in heading)
+    last = max(max(s, d) * sign for _, s, d in heading)
+    sources = [edge for edge, s, _ in heading if s * sign == first]
+    sinks = [edge for edge, _, d in heading if d * sign == last]
+    return sources, sinks
+
+
+def generate_trips(route_file, edges, demand, vehicles_per_hour, seconds,
+                   direction, seed):
+    if vehicles_per_hour <= 0:
+        raise ValueError(
+            f"vehicles_per_hour must be > 0, got {vehicles_per_hour}")
+    rng = random.Random(seed)
+    edge_ids = [edge for edge, _, _ in edges]
+    period = 3600 / vehicles_per_hour
+    total = int(seconds / period)
+    trips = []      # (depart, from, to)
+
+    if demand == "constant":
+        for i in range(total):
+            src, dst = rng.sample(edge_ids, 2)
+            trips.append((i * period, src, dst))
+    elif demand == "peak":
+        for depart in departures(peak_rate(seconds), seconds, total):
+            src, dst = rng.sample(edge_ids, 2)
+            trips.append((depart, src, dst))
+    elif demand == "surge":
+        surge = int(total * SURGE_SHARE)
+        background = total - surge
+        period = seconds / background if background else 0.0
+        for i in range(background):
+            src, dst = rng.sample(edge_ids, 2)
+            trips.append((i * period, src, dst))
+        sources, sinks = crossing_edges(edges, direction)
+        start, span = seconds / 3, seconds / 3
+        for i in range(surge):
+            trips.append((start + i * span / surge,
+                          rng.choice(sources), rng.choice(sinks)))
+        trips.sort(key=lambda trip: trip[0])
+    else:
+        raise ValueError(f"unknown demand {demand!r} (available: {DEMANDS})")
+
+    with open(route_file, "w") as f:
+        f.write("<routes>\n")
+        for i, (depart, src, dst) in enumerate(trips):
+            f.write(f'    <trip id="veh{i}" depart="{depart:.2f}" '
+                    f'from="{src}" to="{dst}"/>\n')
+        f.write("</routes>\n")
+    return len(trips)
+
+# ----------------------------------------
+
+
+def write_config(sumocfg, net_file, route_file, seconds):
+    with open(sumocfg, "w") as f:
+        f.write(f"""<configuration>
+    <input>
+        <net-file value="{os.path.basename(net_file)}"/>
+        <route-files value="{os.path.basename(route_file)}"/>
+    </input>
+    <time>
+        <begin value="0"/>
+        <end value="{seconds}"/>
+        <step-length value="1"/>
+    </time>
+</configuration>
+""")
+
+
+def grid_scenario(rows, cols=None, lanes=GRID_LANES, length=GRID_LENGTH,
+                  tls_layout=TLS_LAYOUT, green_time=GREEN_TIME,
+                  yellow_time=YELLOW_TIME, demand="constant",
+                  vehicles_per_hour=None, seconds=SECONDS, direction="east",
+                  seed=0, directory=SCENARIO_DIR):
+    """
+    sumocfg of a rows x cols grid scenario, generated on first use.
+    vehicles_per_hour defaults to VEHICLES_PER_HOUR_PER_JUNCTION per junction.
+    """
+    cols = cols or rows
+    if not (2 <= rows <= MAX_GRID_SIZE and 2 <= cols <= MAX_GRID_SIZE):
+        raise ValueError(f"grid sizes go from 2 to {MAX_GRID_SIZE}")
+    if demand not in DEMANDS:
+        raise ValueError(f"unknown demand {demand!r} (available: {DEMANDS})")
+    if direction not in DIRECTIONS:
+        raise ValueError(f"unknown direction {direction!r}")
+    if vehicles_per_hour is None:
+        vehicles_per_hour = VEHICLES_PER_HOUR_PER_JUNCTION * rows * cols
+
+    params = {
+        "rows": rows, "cols": cols, "lanes": lanes, "length": length,
+        "tls_layout": tls_layout, "green_time": green_time,
+        "yellow_time": yellow_time, "demand": demand,
+        "vehicles_per_hour": vehicles_per_hour, "seconds": seconds,
+        "seed": seed,
+    }
+    if demand == "surge":
+        params["direction"] = direction
+    name = f"grid_{rows}x{cols}_{demand}_{scenario_key(params)}"
+    scenario_dir = os.path.join(directory, name)
+    sumocfg = os.path.join(scenario_dir, f"{name}.sumocfg")
+    if os.path.exists(sumocfg):
+        return sumocfg
+
+    # built aside and renamed: parallel callers never see half a scenario
+    os.makedirs(directory, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f".{name}.", dir=directory)
+    try:
+        net_file = os.path.join(build_dir, f"{name}.net.xml")
+        route_file = os.path.join(build_dir, f"{name}.rou.xml")
+        generate_network(net_file, rows, cols, lanes, length, tls_layout,
+                         green_time, yellow_time)
+        generate_trips(route_file, read_edges(net_file), demand,
+                       vehicles_per_hour, seconds, direction, seed)
+        write_config(os.path.join(build_dir, f"{name}.sumocfg"),
+                     net_file, route_file, seconds)
+        with open(os.path.join(build_dir, "scenario.json"), "w") as f:
+            json.dump(params, f, indent=2)
+        os.rename(build_dir, scenario_dir)
+    except OSError:
+        if not os.path.exists(sumocfg):     # not just lost a race
+            raise
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return sumocfg
+
+
+def parse_scenario(spec, directory=SCENARIO_DIR):
+    """
+    "grid:10x10", "grid:10" or "grid:20x30:peak" (any demand) -> sumocfg of
+    the generated scenario with the default settings.
+    """
+    kind, _, rest = spec.partition(":")
+    size, _, demand = rest.partition(":")
+    if kind != "grid" or not size:
+        raise ValueError(f"unknown scenario {spec!r}")
+    rows, _, cols = size.partition("x")
+    return grid_scenario(int(rows), int(cols or rows),
+                         demand=demand or "constant", directory=directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate (or reuse) a synthetic grid scenario and "
+                    "print its sumocfg."
+    )
+    parser.add_argument("size", help="ROWSxCOLS, e.g. 10x10 (up to 50x50)")
+    parser.add_argument("--lanes", type=int, default=GRID_LANES)
+    parser.add_argument("--length", type=float, default=GRID_LENGTH,
+                        help="m between junctions")
+    parser.add_argument("--tls-layout", default=TLS_LAYOUT,
+                        choices=["opposites", "incoming", "alternateOneWay"])
+    parser.add_argument("--green-time", type=int, default=GREEN_TIME,
+                        help="default: netgenerate's 31 s")
+    parser.add_argument("--yellow-time", type=int, default=YELLOW_TIME,
+                        help="default: derived from the speed limit")
+    parser.add_argument("--demand", choices=DEMANDS, default="constant")
+    parser.add_argument(
+        "--vehicles-per-hour", type=float, default=None,
+        help=f"default {VEHICLES_PER_HOUR_PER_JUNCTION} per junction"
+    )
+    parser.add_argument("--seconds", type=int, default=SECONDS)
+    parser.add_argument("--direction", choices=DIRECTIONS, default="east",
+                        help="where the surge heads (--demand surge)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=SCENARIO_DIR)
+    args = parser.parse_args(argv)
+    if args.vehicles_per_hour is not None and args.vehicles_per_hour <= 0:
+        parser.error("--vehicles-per-hour must be > 0")
+
+    rows, _, cols = args.size.partition("x")
+    print(grid_scenario(
+        int(rows), int(cols or rows),
+        lanes=args.lanes,
+        length=args.length,
+        tls_layout=args.tls_layout,
+        green_time=args.green_time,
+        yellow_time=args.yellow_time,
+        demand=args.demand,
+        vehicles_per_hour=args.vehicles_per_hour,
+        seconds=args.seconds,
+        direction=args.direction,
+        seed=args.seed,
+        directory=args.dir,
+    ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+import heapq
+
+# ---------------- DECISION SCHEDULER ----------------
+# Min-heap of (next decision time, tls order, tls). The runner only hands
+# junctions that are due to the controller instead of scanning every TLS
+# each step, and knows when the next decision is so it can advance SUMO by
+# several steps at once when nothing else needs to be looked at.
+# ----------------------------------------------------
+
+
+class DecisionScheduler:
+
+    def __init__(self, tls_ids):
+        self._order = {tls: i for i, tls in enumerate(tls_ids)}
+        self._heap = []
+        self._due = {}      # tls -> its current decision time
+
+    def schedule(self, tls, time):
+        """(Re)schedule tls; an earlier entry for the same tls is dropped."""
+        self._due[tls] = time
+        heapq.heappush(self._heap, (time, self._order[tls], tls))
+
+    def cancel(self, tls):
+        self._due.pop(tls, None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._due.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_time(self):
+        """Earliest pending decision time, None if nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Junctions due at or before now, in tls_ids order."""
+        due = []
+        heap = self._heap
+        while True:
+            self._drop_stale()
+            if not heap or heap[0][0] > now:
+                break
+            _, _, tls = heapq.heappop(heap)
+            del self._due[tls]
+            due.append(tls)
+        due.sort(key=self._order.__getitem__)
+        return due
+
+    def pending(self):
+        return dict(self._due)
@@ -0,0 +1,87 @@
+import importlib
+import os
+
+# ---------------- CONFIG ----------------
+# backend name -> (python module, SUMO binary)
+BACKENDS = {
+    "gui": ("traci", "sumo-gui"),          # TraCI socket + GUI (old default)
+    "headless": ("traci", "sumo"),         # TraCI socket, no GUI
+    "libsumo": ("libsumo", "sumo"),        # in-process, no socket round trips
+    "replay": ("trace_backend", None),     # recorded trace, no SUMO at all
+    "ctm": ("ctm_backend", None),          # cell transmission model, no SUMO
+}
+DEFAULT_BACKEND = "gui"
+BACKEND_ENV = "SUMO_BACKEND"              # e.g. SUMO_BACKEND=libsumo
+# ---------------------------------------
+
+
+class TraciProxy:
+    """
+    Stand-in for the traci module. Every project module does
+    `from sumo_backend import traci`; select_backend() copies the chosen
+    module's namespace onto this object, so traci.lane / traci.simulation ...
+    resolve as plain attribute lookups to traci or libsumo.
+    """
+
+    def __getattr__(self, name):
+        # only reached before a backend was selected
+        if name.startswith("__"):
+            raise AttributeError(name)
+        select_backend()
+        return getattr(self, name)
+
+    def _use(self, module):
+        self.__dict__.clear()
+        self.__dict__.update(vars(module))
+
+
+traci = TraciProxy()
+
+_selected = {"name": None, "binary": None}
+_select_hooks = []
+
+
+def on_select(hook):
+    """
+    hook(traci) runs after every select_backend(), e.g. to wrap the domains
+    of the freshly populated proxy for instrumentation. Returns hook.
+    """
+    _select_hooks.append(hook)
+    return hook
+
+
+def remove_select_hook(hook):
+    if hook in _select_hooks:
+        _select_hooks.remove(hook)
+
+
+def backend_name(name=None):
+    name = name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(
+            f"unknown SUMO backend {name!r} (available: {', '.join(BACKENDS)})"
+        )
+    return name
+
+
+def select_backend(name=None):
+    """Point the shared traci proxy at a backend; returns the name used."""
+    name = backend_name(name)
+    module_name, binary = BACKENDS[name]
+    traci._use(importlib.import_module(module_name))
+    _selected["name"] = name
+    _selected["binary"] = binary
+    for hook in _select_hooks:
+        hook(traci)
+    return name
+
+
+def selected_backend():
+    return _selected["name"]
+
+
+def sumo_binary():
+    """SUMO executable of the selected backend (None for replay)."""
+    if _selected["name"] is None:
+        select_backend()
+    return _selected["binary"]
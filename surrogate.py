@@ -0,0 +1,246 @@
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+from controllers import CONTROLLERS, get_controller
+from runner import SUMOCFG, run
+from sweep import grid_configs, parse_values
+
+# ---------------- SURROGATE PRE-SCREENING ----------------
+# Uses the cell transmission backend (ctm_backend.py) to rank controllers and
+# parameter sets before spending SUMO runs on them.
+#
+#   calibrate  every controller once on ctm and once on SUMO (or from the
+#              results_* files a SUMO run left in --ref-dir), the KPIs side
+#              by side, their rank correlation across controllers and the
+#              wall times
+#   rank       a parameter grid of one controller on ctm, best first by
+#              --by; --confirm N re-runs the best N in SUMO
+#
+# KPIs come from the results file of each run (time, avg_speed, running,
+# halted per step), computed the same way for both simulators. The model's
+# absolute numbers are off (queues are fluid, halting is per cell), so use
+# it for ordering, and check the calibration before trusting an ordering.
+# ----------------------------------------------------------
+
+# ---------------- CONFIG ----------------
+SURROGATE_DIR = "surrogate"
+SURROGATE_BACKEND = "ctm"
+REFERENCE_BACKEND = "headless"
+CALIBRATION_CONTROLLERS = ["base", "v1", "v2", "v3", "v4", "v5"]
+# ---------------------------------------
+
+# KPI -> True when larger is better
+KPIS = {
+    "end_time": False,
+    "halted_vehicle_seconds": False,
+    "mean_speed": True,
+    "peak_running": False,
+}
+
+
+def results_path(controller, out_dir):
+    c = get_controller(controller)
+    return os.path.join(
+        out_dir, c.results_file or f"results_{controller}_experiment.csv")
+
+
+def results_kpis(path):
+    """KPIS of one results CSV."""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"{path} has no rows")
+    t = np.array([float(r["time"]) for r in rows])
+    speed = np.array([float(r["avg_speed"]) for r in rows])
+    running = np.array([int(r["running"]) for r in rows])
+    halted = np.array([int(r["halted"]) for r in rows])
+    busy = running > 0
+    return {
+        "end_time": float(t[-1]),
+        "halted_vehicle_seconds": float(
+            (halted * np.diff(np.concatenate([[0.0], t]))).sum()),
+        "mean_speed": float(speed[busy].mean()) if busy.any() else 0.0,
+        "peak_running": int(running.max()),
+    }
+
+
+def run_kpis(controller, params=None, backend=SURROGATE_BACKEND,
+             out_dir=SURROGATE_DIR, sumocfg=SUMOCFG, max_sim_time=None):
+    """One quiet run -> KPIS plus wall_time and gridlock_time."""
+    os.makedirs(out_dir, exist_ok=True)
+    started = time.perf_counter()
+    summary = run(controller, params=params, backend=backend,
+                  sumocfg=sumocfg, max_sim_time=max_sim_time,
+                  out_dir=out_dir, quiet=True, label=f"surrogate-{backend}")
+    wall_time = time.perf_counter() - started
+    kpis = results_kpis(results_path(controller, out_dir))
+    kpis["gridlock_time"] = summary["gridlock_time"]
+    kpis["wall_time"] = round(wall_time, 3)
+    return kpis
+
+
+def rank_correlation(a, b):
+    """Spearman's rho of two equally long sequences (ties: mean rank)."""
+    def ranks(x):
+        x = np.asarray(x, dtype=np.float64)
+        order = np.argsort(x, kind="stable")
+        r = np.empty(len(x))
+        r[order] = np.arange(len(x))
+        for value in np.unique(x):
+            same = x == value
+            r[same] = r[same].mean()
+        return r
+
+    if len(a) < 2:
+        return float("nan")
+    ra, rb = ranks(a), ranks(b)
+    if ra.std() == 0 or rb.std() == 0:
+        return float("nan")
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+
+def calibrate(controllers=CALIBRATION_CONTROLLERS, ref_dir=None,
+              reference_backend=REFERENCE_BACKEND, out_dir=SURROGATE_DIR,
+              sumocfg=SUMOCFG):
+    """
+    -> per controller {"controller", "ctm": kpis, "sumo": kpis} and per KPI
+    the rank correlation between the two across controllers. SUMO KPIs are
+    read from ref_dir when given, else a reference_backend run produces
+    them.
+    """
+    rows = []
+    for name in controllers:
+        surrogate = run_kpis(name, backend=SURROGATE_BACKEND,
+                             out_dir=os.path.join(out_dir, "ctm"),
+                             sumocfg=sumocfg)
+        if ref_dir:
+            reference = results_kpis(results_path(name, ref_dir))
+        else:
+            reference = run_kpis(name, backend=reference_backend,
+                                 out_dir=os.path.join(out_dir, "sumo"),
+                                 sumocfg=sumocfg)
+        rows.append({"controller": name, "ctm": surrogate, "sumo": reference})
+
+    correlation = {
+        kpi: rank_correlation([r["ctm"][kpi] for r in rows],
+                              [r["sumo"][kpi] for r in rows])
+        for kpi in KPIS
+    }
+    return rows, correlation
+
+
+def screen(controller, configs, by="halted_vehicle_seconds", confirm=0,
+           reference_backend=REFERENCE_BACKEND, out_dir=SURROGATE_DIR,
+           sumocfg=SUMOCFG, max_sim_time=None):
+    """
+    Every params dict of configs on ctm, best first by KPI by; the best
+    confirm ones are run again on reference_backend (their KPIs under
+    "sumo_<kpi>"). -> result dicts
+    """
+    for params in configs:
+        get_controller(controller, params)      # typos fail before any run
+
+    results = []
+    for params in configs:
+        kpis = run_kpis(controller, params, SURROGATE_BACKEND,
+                        os.path.join(out_dir, "ctm"), sumocfg, max_sim_time)
+        results.append({**params, **kpis})
+    results.sort(key=lambda r: -r[by] if KPIS[by] else r[by])
+
+    for result in results[:confirm]:
+        params = {name: result[name] for name in configs[0]}
+        kpis = run_kpis(controller, params, reference_backend,
+                        os.path.join(out_dir, "sumo"), sumocfg, max_sim_time)
+        result.update({f"sumo_{kpi}": kpis[kpi] for kpi in
+                       [*KPIS, "wall_time"]})
+    return results
+
+
+def _print_table(rows):
+    header = list(dict.fromkeys(name for row in rows for name in row))
+    print(" ".join(f"{h:>14s}" for h in header))
+    for row in rows:
+        print(" ".join(
+            f"{row[h]:>14.4g}" if isinstance(row.get(h), float)
+            else f"{row.get(h, '')!s:>14s}" for h in header))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Pre-screen controllers and parameter sets on the cell "
+                    "transmission surrogate and check it against SUMO."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cal = sub.add_parser("calibrate", help="surrogate vs SUMO KPIs")
+    cal.add_argument("--controllers", nargs="+", choices=sorted(CONTROLLERS),
+                     default=CALIBRATION_CONTROLLERS)
+    cal.add_argument("--ref-dir", default=None,
+                     help="read SUMO results_* files from here instead of "
+                          "running SUMO")
+
+    rank = sub.add_parser("rank", help="rank a parameter grid on the surrogate")
+    rank.add_argument("controller", choices=sorted(CONTROLLERS))
+    rank.add_argument(
+        "--grid", action="append", metavar="NAME=V1,V2,...",
+        help="grid values of one param, e.g. --grid ALPHA=0.8,1.0,1.2"
+    )
+    rank.add_argument("--by", choices=sorted(KPIS),
+                      default="halted_vehicle_seconds")
+    rank.add_argument("--confirm", type=int, default=0, metavar="N",
+                      help="re-run the best N in SUMO")
+    rank.add_argument("--max-sim-time", type=int, default=None)
+    rank.add_argument("--output", default=None,
+                      help="also write the ranking to this CSV")
+
+    for p in (cal, rank):
+        p.add_argument("--reference-backend", default=REFERENCE_BACKEND)
+        p.add_argument("--sumocfg", default=SUMOCFG)
+        p.add_argument("--out-dir", default=SURROGATE_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        rows, correlation = calibrate(
+            args.controllers, args.ref_dir, args.reference_backend,
+            args.out_dir, args.sumocfg)
+        table = []
+        for row in rows:
+            line = {"controller": row["controller"]}
+            for kpi in KPIS:
+                line[f"ctm_{kpi}"] = row["ctm"][kpi]
+                line[f"sumo_{kpi}"] = row["sumo"][kpi]
+            table.append(line)
+        _print_table(table)
+        print()
+        for kpi, rho in correlation.items():
+            print(f"rank correlation {kpi:>24s}: {rho:.2f}")
+        ctm_time = sum(r["ctm"]["wall_time"] for r in rows)
+        if args.ref_dir is None:
+            sumo_time = sum(r["sumo"]["wall_time"] for r in rows)
+            print(f"wall time: ctm {ctm_time:.2f}s, {args.reference_backend} "
+                  f"{sumo_time:.2f}s ({sumo_time / ctm_time:.1f}x)")
+        else:
+            print(f"wall time: ctm {ctm_time:.2f}s")
+        return
+
+    configs = grid_configs(parse_values(args.grid))
+    results = screen(args.controller, configs, args.by, args.confirm,
+                     args.reference_backend, args.out_dir, args.sumocfg,
+                     args.max_sim_time)
+    _print_table(results)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        header = list(dict.fromkeys(n for r in results for n in r))
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=header)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
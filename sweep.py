@@ -0,0 +1,301 @@
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from controllers import CONTROLLERS, get_controller
+from runner import SUMOCFG, parse_value, run
+
+# ---------------- CONFIG ----------------
+SWEEP_DIR = "sweeps"
+RESULTS_FILE = "sweep_results.csv"
+DEFAULT_BACKEND = "headless"     # workers never open a GUI
+
+KPI_COLUMNS = [
+    "steps",
+    "mean_speed",
+    "halted_vehicle_seconds",
+    "clearance_time",
+    "gridlock_time",
+    "wall_time",
+]
+# ---------------------------------------
+
+
+# ---------------- PARAMETER SETS ----------------
+
+def grid_configs(grid):
+    """{"ALPHA": [0.8, 1.0], "BETA": [0.5, 0.7]} -> every combination"""
+    names = list(grid)
+    return [
+        dict(zip(names, values))
+        for values in itertools.product(*(grid[n] for n in names))
+    ]
+
+
+def _scale(unit, ranges):
+    configs = []
+    for row in unit:
+        config = {}
+        for (name, (low, high)), u in zip(ranges.items(), row):
+            value = low + u * (high - low)
+            # integer bounds (MIN_GREEN, FAIRNESS_LIMIT ...) stay integers
+            if isinstance(low, int) and isinstance(high, int):
+                value = int(round(value))
+            config[name] = value
+        configs.append(config)
+    return configs
+
+
+def random_configs(ranges, n, seed=0):
+    """n uniform samples from {"ALPHA": (low, high), ...}"""
+    rng = np.random.default_rng(seed)
+    return _scale(rng.random((n, len(ranges))), ranges)
+
+
+def lhs_configs(ranges, n, seed=0):
+    """n Latin-hypercube samples: each range is cut into n strata used once"""
+    rng = np.random.default_rng(seed)
+    dims = len(ranges)
+    strata = np.stack([rng.permutation(n) for _ in range(dims)], axis=1)
+    unit = (strata + rng.random((n, dims))) / n
+    return _scale(unit, ranges)
+
+# -----------------------------------------------
+
+
+def _canonical(value):
+    """Numbers as floats, so ALPHA=1 and ALPHA=1.0 get the same id."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def config_id(controller, params, sumocfg, max_sim_time):
+    key = json.dumps(
+        [controller, sorted((name, _canonical(value))
+                            for name, value in params.items()),
+         sumocfg, max_sim_time],
+        sort_keys=True
+    )
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def results_header(results_path, param_names):
+    """
+    Header for appending runs with param_names: the existing file's when
+    it has the same params, else the union, with the file rewritten under it.
+    """
+    header = ["id", "controller", *param_names, "status", *KPI_COLUMNS]
+    if not os.path.exists(results_path):
+        return header
+    with open(results_path, newline="") as f:
+        reader = csv.DictReader(f)
+        old = reader.fieldnames or []
+        rows = list(reader)
+    old_params = old[old.index("controller") + 1:old.index("status")] \
+        if "controller" in old and "status" in old else []
+    if set(old_params) >= set(param_names):
+        return old
+    params = sorted(set(old_params) | set(param_names))
+    header = ["id", "controller", *params, "status", *KPI_COLUMNS]
+    with open(results_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return header
+
+
+def completed_ids(results_path):
+    """ids of runs already finished in an earlier (interrupted) sweep"""
+    if not os.path.exists(results_path):
+        return set()
+    with open(results_path, newline="") as f:
+        return {row["id"] for row in csv.DictReader(f) if row["status"] == "ok"}
+
+
+def run_config(job):
+    """Worker: one SUMO instance, outputs and log in the run's own folder."""
+    run_id, controller, params, options = job
+    run_dir = os.path.join(options["out_dir"], "runs", run_id)
+    os.makedirs(run_dir, exist_ok=True)
+
+    started = time.time()
+    with open(os.path.join(run_dir, "run.log"), "w") as log:
+        stdout = sys.stdout
+        sys.stdout = log
+        try:
+            summary = run(
+                controller,
+                params=params,
+                backend=options["backend"],
+                sumocfg=options["sumocfg"],
+                max_sim_time=options["max_sim_time"],
+                out_dir=run_dir,
+                quiet=True,
+                label=f"sweep-{run_id}",
+                early_gridlock=options["early_gridlock"],
+                experience=(os.path.join(options["experience"], run_id)
+                            if options["experience"] else None),
+            )
+            summary["status"] = "ok"
+        except Exception as e:
+            summary = {"status": f"error: {e}"}
+        finally:
+            sys.stdout = stdout
+
+    summary["wall_time"] = round(time.time() - started, 3)
+    return run_id, params, summary
+
+
+def sweep(controller, configs, out_dir=None, workers=None,
+          backend=DEFAULT_BACKEND, sumocfg=SUMOCFG, max_sim_time=None,
+          early_gridlock=False, experience=None):
+    """
+    Run every config of one controller across a process pool and append one
+    row per finished run to <out_dir>/sweep_results.csv. Runs already
+    recorded as ok are skipped, so an interrupted sweep resumes where it
+    stopped. early_gridlock stops doomed runs at the first sign of gridlock
+    (see gridlock.py) instead of letting them run on. experience: root
+    folder where every run records its transitions into <run id>/ (read
+    them together with experience.StoreSet).
+    """
+    out_dir = out_dir or os.path.join(SWEEP_DIR, controller)
+    os.makedirs(out_dir, exist_ok=True)
+    results_path = os.path.join(out_dir, RESULTS_FILE)
+
+    # fail early on typos instead of in every worker
+    for params in configs:
+        get_controller(controller, params)
+
+    param_names = sorted({name for params in configs for name in params})
+
+    done = completed_ids(results_path)
+    options = {
+        "out_dir": out_dir,
+        "backend": backend,
+        "sumocfg": sumocfg,
+        "max_sim_time": max_sim_time,
+        "early_gridlock": early_gridlock,
+        "experience": experience,
+    }
+    jobs = []
+    for params in configs:
+        run_id = config_id(controller, params, sumocfg, max_sim_time)
+        if run_id not in done:
+            jobs.append((run_id, controller, params, options))
+            done.add(run_id)   # duplicate configs run once
+
+    print(f"Sweep {controller}: {len(configs)} configs, "
+          f"{len(configs) - len(jobs)} already done, {len(jobs)} to run")
+    if not jobs:
+        return results_path
+
+    new_file = not os.path.exists(results_path)
+    header = results_header(results_path, param_names)
+    with open(results_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=header, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+
+        workers = workers or os.cpu_count()
+        # one task per child: every run gets a fresh SUMO / libsumo process
+        with multiprocessing.Pool(workers, maxtasksperchild=1) as pool:
+            for n, (run_id, params, summary) in enumerate(
+                    pool.imap_unordered(run_config, jobs), 1):
+                writer.writerow({
+                    "id": run_id, "controller": controller, **params, **summary
+                })
+                f.flush()
+                print(f"[{n}/{len(jobs)}] {run_id} {summary['status']} "
+                      f"({summary['wall_time']:.1f}s)")
+
+    return results_path
+
+
+def parse_values(items):
+    """["ALPHA=0.8,1.0,1.2"] -> {"ALPHA": [0.8, 1.0, 1.2]}"""
+    grid = {}
+    for item in items or []:
+        name, _, values = item.partition("=")
+        grid[name] = [parse_value(v) for v in values.split(",")]
+    return grid
+
+
+def parse_ranges(items):
+    """["ALPHA=0.5:1.5"] -> {"ALPHA": (0.5, 1.5)}"""
+    ranges = {}
+    for item in items or []:
+        name, _, bounds = item.partition("=")
+        low, _, high = bounds.partition(":")
+        ranges[name] = (parse_value(low), parse_value(high))
+    return ranges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Parallel, resumable parameter sweep of one controller."
+    )
+    parser.add_argument("controller", choices=sorted(CONTROLLERS))
+    parser.add_argument(
+        "--grid", action="append", metavar="NAME=V1,V2,...",
+        help="grid values of one param, e.g. --grid ALPHA=0.8,1.0,1.2"
+    )
+    parser.add_argument(
+        "--range", action="append", metavar="NAME=LOW:HIGH",
+        help="sampling range of one param, e.g. --range BETA=0.3:0.9"
+    )
+    parser.add_argument("--sample", choices=["random", "lhs"], default="lhs")
+    parser.add_argument("-n", "--samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0,
+                        help="keep fixed to resume a sampled sweep")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND)
+    parser.add_argument("--sumocfg", default=SUMOCFG)
+    parser.add_argument("--max-sim-time", type=int, default=None)
+    parser.add_argument("--out-dir", default=None)
+    parser.add_argument(
+        "--early-gridlock", action="store_true",
+        help="abort runs at the first spillback cycle, starved lane or stall"
+    )
+    parser.add_argument(
+        "--experience", metavar="DIR", default=None,
+        help="record each run's transitions into DIR/<run id> "
+             "(experience.py)"
+    )
+    args = parser.parse_args(argv)
+
+    grid = parse_values(args.grid)
+    ranges = parse_ranges(args.range)
+
+    if ranges:
+        sampler = lhs_configs if args.sample == "lhs" else random_configs
+        sampled = sampler(ranges, args.samples, args.seed)
+        configs = [
+            {**g, **s} for g in grid_configs(grid) for s in sampled
+        ]
+    else:
+        configs = grid_configs(grid)
+
+    sweep(
+        args.controller,
+        configs,
+        out_dir=args.out_dir,
+        workers=args.workers,
+        backend=args.backend,
+        sumocfg=args.sumocfg,
+        max_sim_time=args.max_sim_time,
+        early_gridlock=args.early_gridlock,
+        experience=args.experience,
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
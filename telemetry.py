@@ -0,0 +1,154 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+from columnar import ColumnarWriter
+
+# ---------------- TELEMETRY SINK ----------------
+# Rows logged from the control loop are appended to per-log columnar buffers
+# (one list per column). Full buffers are handed to a background thread that
+# writes them to disk, so the simulation thread never waits on file I/O. The
+# hand-off queue is bounded: only if the writer falls more than MAX_PENDING
+# batches behind does log() block (backpressure instead of unbounded memory).
+# ------------------------------------------------
+
+BATCH_ROWS = 4096
+MAX_PENDING = 64
+
+FORMATS = {
+    "csv": ".csv",
+    "binary": ".tlog",       # columnar.py format
+}
+
+
+class CsvLogWriter:
+
+    def __init__(self, path, header, offset=None):
+        """offset: resume an existing log, dropping everything after it"""
+        if offset is None:
+            self._file = open(path, "w", newline="")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(header)
+        else:
+            self._file = open(path, "r+", newline="")
+            self._file.truncate(offset)
+            self._file.seek(offset)
+            self._writer = csv.writer(self._file)
+
+    def write_batch(self, columns):
+        self._writer.writerows(zip(*columns))
+
+    def flush(self):
+        self._file.flush()
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+
+def log_path(out_dir, file_name, fmt):
+    """results_v4_experiment.csv -> <out_dir>/results_v4_experiment<ext>"""
+    base, _ = os.path.splitext(file_name)
+    return os.path.join(out_dir, base + FORMATS[fmt])
+
+
+class TelemetrySink:
+
+    def __init__(self, out_dir, logs, fmt="csv", batch_rows=BATCH_ROWS,
+                 max_pending=MAX_PENDING, offsets=None):
+        """
+        logs: {name: (file name, header)} as declared by the controllers.
+        offsets: {name: byte size} from offsets() of an earlier sink; the
+        existing files are cut back to those sizes and appended to (resume).
+        """
+        if fmt not in FORMATS:
+            raise ValueError(
+                f"unknown log format {fmt!r} (available: {', '.join(FORMATS)})"
+            )
+        os.makedirs(out_dir, exist_ok=True)
+        writer_cls = CsvLogWriter if fmt == "csv" else ColumnarWriter
+
+        self.fmt = fmt
+        self.batch_rows = batch_rows
+        self.paths = {}
+        self._writers = {}
+        self._buffers = {}
+        for name, (file_name, header) in logs.items():
+            path = log_path(out_dir, file_name, fmt)
+            self.paths[name] = path
+            offset = None if offsets is None else offsets[name]
+            self._writers[name] = writer_cls(path, header, offset=offset)
+            self._buffers[name] = [[] for _ in header]
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self.write_seconds = 0.0        # writer thread busy time
+        self._thread = threading.Thread(
+            target=self._drain, name="telemetry-writer", daemon=True
+        )
+        self._thread.start()
+
+    # ---- simulation thread ----
+    def log(self, name, row):
+        columns = self._buffers[name]
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= self.batch_rows:
+            self._submit(name)
+
+    def _submit(self, name):
+        columns = self._buffers[name]
+        if not columns or not columns[0]:
+            return
+        if self._error is not None:
+            raise self._error
+        self._buffers[name] = [[] for _ in columns]
+        self._queue.put((name, columns))
+
+    def flush(self):
+        """Write every buffered row and wait until it reached the files."""
+        for name in self._buffers:
+            self._submit(name)
+        self._queue.put(("__flush__", None))
+        self._queue.join()
+        if self._error is not None:
+            raise self._error
+
+    def offsets(self):
+        """Byte size of every log file; call right after flush()."""
+        return {name: writer.tell() for name, writer in self._writers.items()}
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+            for writer in self._writers.values():
+                writer.close()
+
+    # ---- writer thread ----
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                name, columns = item
+                if self._error is not None:
+                    continue
+                if name == "__flush__":
+                    for writer in self._writers.values():
+                        writer.flush()
+                else:
+                    start = time.perf_counter()
+                    self._writers[name].write_batch(columns)
+                    self.write_seconds += time.perf_counter() - start
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
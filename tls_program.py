@@ -0,0 +1,31 @@
+# ---------------- TLS PROGRAM DATA ----------------
+# SUMO-free stand-ins for traci.trafficlight.Logic / Phase, shared by the
+# modules that describe signal programs without a running SUMO: the static
+# network index (net_index.py) and the replay / cell transmission backends.
+# --------------------------------------------------
+
+
+class Phase:
+
+    def __init__(self, duration, state, minDur=-1, maxDur=-1, next=(),
+                 name=""):
+        self.duration = duration
+        self.state = state
+        self.minDur = minDur
+        self.maxDur = maxDur
+        self.next = list(next)
+        self.name = name
+
+
+class Logic:
+
+    def __init__(self, programID, type, currentPhaseIndex, phases=None,
+                 subParameter=None):
+        self.programID = programID
+        self.type = type
+        self.currentPhaseIndex = currentPhaseIndex
+        self.phases = list(phases or [])
+        self.subParameter = dict(subParameter or {})
+
+    def getPhases(self):
+        return self.phases
@@ -0,0 +1,107 @@
+from sumo_backend import traci
+
+# ---------------- TOPOLOGY CACHE ----------------
+# Signal programs and controlled links do not change during a run unless a
+# controller installs a new program, so they are read from TraCI once per TLS
+# and reused by every control tick. Call invalidate_topology() (or use
+# set_program / set_program_logic below) whenever a program is changed.
+# build_topology(net=...) takes the initial programs from a net_index.NetIndex
+# instead, without any TraCI call; changed programs are still read from TraCI.
+# ------------------------------------------------
+
+_topology = {}
+
+
+def _unique(items):
+    return list(dict.fromkeys(items))
+
+
+def topology_from_logic(tls_id, logic, links):
+    """
+    Build the static description of one traffic light from its first
+    program logic and its controlled links (one link group per signal index).
+    """
+    phases = [phase.state for phase in logic.phases]
+
+    green_links = []
+    for state in phases:
+        movements = []
+        for link_group, signal in zip(links, state):
+            if signal.lower() != 'g':
+                continue
+            for in_lane, out_lane, _ in link_group:
+                movements.append((in_lane, out_lane))
+        green_links.append(movements)
+
+    controlled_lanes = [
+        in_lane
+        for link_group in links
+        for in_lane, _, _ in link_group
+    ]
+
+    lane_links = {}
+    for idx, link_group in enumerate(links):
+        for in_lane, _, _ in link_group:
+            lane_links.setdefault(in_lane, []).append(idx)
+
+    return {
+        "tls": tls_id,
+        "logic": logic,
+        "phases": phases,
+        "num_phases": len(phases),
+        "links": links,
+        "green_links": green_links,
+        "controlled_lanes": controlled_lanes,
+        "incoming_lanes": _unique(controlled_lanes),
+        "outgoing_lanes": _unique(
+            out_lane
+            for link_group in links
+            for _, out_lane, _ in link_group
+            if out_lane
+        ),
+        "lane_links": lane_links,
+    }
+
+
+def load_topology(tls_id):
+    logic = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls_id)[0]
+    links = traci.trafficlight.getControlledLinks(tls_id)
+    return topology_from_logic(tls_id, logic, links)
+
+
+def get_topology(tls_id):
+    if tls_id not in _topology:
+        _topology[tls_id] = load_topology(tls_id)
+    return _topology[tls_id]
+
+
+def build_topology(tls_ids=None, net=None):
+    """Load (or reuse) the topology of every TLS; returns {tls: topology}."""
+    if net is not None:
+        for tls in net.tls_ids if tls_ids is None else tls_ids:
+            if tls not in _topology:
+                _topology[tls] = topology_from_logic(
+                    tls, net.logic(tls), net.controlled_links(tls)
+                )
+        if tls_ids is None:
+            tls_ids = net.tls_ids
+    if tls_ids is None:
+        tls_ids = traci.trafficlight.getIDList()
+    return {tls: get_topology(tls) for tls in tls_ids}
+
+
+def invalidate_topology(tls_id=None):
+    if tls_id is None:
+        _topology.clear()
+    else:
+        _topology.pop(tls_id, None)
+
+
+def set_program(tls_id, program_id):
+    traci.trafficlight.setProgram(tls_id, program_id)
+    invalidate_topology(tls_id)
+
+
+def set_program_logic(tls_id, logic):
+    traci.trafficlight.setCompleteRedYellowGreenDefinition(tls_id, logic)
+    invalidate_topology(tls_id)
@@ -0,0 +1,288 @@
+import bisect
+import collections
+import os
+import pickle
+import zlib
+
+from tls_program import Logic, Phase
+
+# ---------------- TRACI TRACE RECORD / REPLAY ----------------
+# Recording: TraceRecorder wraps the traci proxy of a live run (headless or
+# libsumo) and stores every call as (sim time, api, args) -> result.
+# Replaying: this module is itself a backend ("replay" in sumo_backend),
+# implementing the traci calls used by the project from such a trace at
+# memory speed, no SUMO needed. Controller code runs unchanged on it.
+#
+# Getters are answered from the trace in the order they were recorded for
+# the same (time, api, args). A getter the recorded run did not make at that
+# time gets the last value recorded before it (e.g. a controller with another
+# CONTROL_INTERVAL replayed on a v4 trace); one never recorded before raises
+# TraceMismatch. Commands (set*, subscribe*, saveState ...) are only checked.
+# Both stale reads and commands the recorded run did not issue are counted
+# as divergences: 0 means the controller did exactly what was recorded.
+# --------------------------------------------------------------
+
+TRACE_VERSION = 1
+COMPRESS_LEVEL = 6
+
+DOMAINS = ["trafficlight", "lane", "vehicle", "simulation", "junction", "edge"]
+COMMAND_PREFIXES = ("set", "subscribe", "unsubscribe", "saveState",
+                    "loadState")
+
+
+class TraceMismatch(LookupError):
+    pass
+
+
+def _plain(value):
+    """Backend result -> picklable plain value (libsumo objects included)."""
+    if isinstance(value, (list, tuple)):
+        return type(value)(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if hasattr(value, "programID") and hasattr(value, "phases"):
+        return Logic(
+            value.programID, value.type, value.currentPhaseIndex,
+            [Phase(p.duration, p.state, p.minDur, p.maxDur, tuple(p.next),
+                   p.name) for p in value.phases],
+        )
+    return value
+
+
+def _key(args):
+    """Call args as a hashable key (lists become tuples, logics tuples)."""
+    if isinstance(args, (list, tuple)):
+        return tuple(_key(a) for a in args)
+    if isinstance(args, dict):
+        return tuple(sorted((k, _key(v)) for k, v in args.items()))
+    if hasattr(args, "programID") and hasattr(args, "phases"):
+        return ("Logic", args.programID, args.type, args.currentPhaseIndex,
+                tuple((p.duration, p.state, _bound(p.minDur, p.duration),
+                       _bound(p.maxDur, p.duration), tuple(p.next), p.name)
+                      for p in args.phases))
+    return args
+
+
+def _bound(value, duration):
+    """Unset minDur / maxDur: duration in traci, INVALID_DOUBLE in libsumo."""
+    return -1 if value < 0 or value == duration else value
+
+
+def _is_command(api):
+    """simulationStep and set* / subscribe* ... calls; api is "domain.func"."""
+    return (api == "simulationStep"
+            or api.split(".", 1)[-1].startswith(COMMAND_PREFIXES))
+
+
+def _advance(time, args):
+    """Sim time after simulationStep(*args); steps are seconds."""
+    target = args[0] if args else 0
+    return target if target else time + 1
+
+
+# ---------------- FILE FORMAT ----------------
+
+def save_trace(path, calls, meta=None):
+    """calls: [(time, api, args, result), ...] in call order"""
+    apis = list(dict.fromkeys(api for _, api, _, _ in calls))
+    api_index = {api: i for i, api in enumerate(apis)}
+    data = pickle.dumps({
+        "version": TRACE_VERSION,
+        "meta": meta or {},
+        "apis": apis,
+        "calls": [(t, api_index[api], args, result)
+                  for t, api, args, result in calls],
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(zlib.compress(data, COMPRESS_LEVEL))
+
+
+def load_trace(path):
+    """-> (meta, [(time, api, args, result), ...])"""
+    with open(path, "rb") as f:
+        trace = pickle.loads(zlib.decompress(f.read()))
+    if trace["version"] != TRACE_VERSION:
+        raise ValueError(f"{path}: trace version {trace['version']}")
+    apis = trace["apis"]
+    return trace["meta"], [
+        (t, apis[api], args, result) for t, api, args, result in trace["calls"]
+    ]
+
+# ---------------------------------------------
+
+
+# ---------------- RECORDING ----------------
+
+class _RecordedDomain:
+
+    def __init__(self, domain, name, recorder):
+        self._domain = domain
+        self._name = name
+        self._recorder = recorder
+
+    def __getattr__(self, attr):
+        value = getattr(self._domain, attr)
+        if not callable(value) or isinstance(value, type) \
+                or attr in ("Phase", "Logic"):
+            return value
+        api = f"{self._name}.{attr}"
+        recorder = self._recorder
+
+        def recorded(*args):
+            result = value(*args)
+            recorder.calls.append((
+                recorder.time, api, _key(args),
+                None if _is_command(api) else _plain(result)
+            ))
+            return result
+
+        setattr(self, attr, recorded)
+        return recorded
+
+
+class TraceRecorder:
+    """
+    Records the traci calls of a live run. install() is an
+    sumo_backend.on_select hook; save() writes the trace.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.time = 0
+
+    def install(self, proxy):
+        if proxy.__dict__.get("__name__") == __name__:
+            return      # never record a replay
+        self.calls = []
+        self.time = 0
+        for name in DOMAINS:
+            if name in vars(proxy):
+                vars(proxy)[name] = _RecordedDomain(
+                    vars(proxy)[name], name, self
+                )
+        step = vars(proxy)["simulationStep"]
+
+        def simulation_step(*args):
+            result = step(*args)
+            self.time = _advance(self.time, args)
+            self.calls.append((self.time, "simulationStep", _key(args), None))
+            return result
+
+        vars(proxy)["simulationStep"] = simulation_step
+
+    def save(self, path, meta=None):
+        save_trace(path, self.calls, meta)
+
+# -------------------------------------------
+
+
+# ---------------- REPLAY BACKEND ----------------
+# module level: select_backend("replay") copies this namespace onto the
+# traci proxy, like it does for traci / libsumo
+
+_replay = {
+    "path": None,
+    "index": None,      # (time, api, args) -> deque of results
+    "history": None,    # (api, args) -> (times, last result at each time)
+    "commands": None,   # Counter of recorded (time, api, args) commands
+    "time": 0,
+    "divergences": 0,
+}
+
+
+def use_trace(path):
+    """Trace the next start() replays."""
+    _replay["path"] = path
+
+
+def _lookup(api, args):
+    key = (_replay["time"], api, _key(args))
+    if _is_command(api):
+        commands = _replay["commands"]
+        if commands[key] > 0:
+            commands[key] -= 1
+        else:
+            _replay["divergences"] += 1
+        return None
+    results = _replay["index"].get(key)
+    if results:
+        return results.popleft() if len(results) > 1 else results[0]
+
+    times, values = _replay["history"].get(key[1:], ((), ()))
+    i = bisect.bisect_right(times, key[0]) - 1
+    if i < 0:
+        raise TraceMismatch(
+            f"{api}{args} at t={key[0]} is not in {_replay['path']}"
+        )
+    _replay["divergences"] += 1
+    return values[i]
+
+
+class _ReplayDomain:
+
+    Phase = Phase
+    Logic = Logic
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        api = f"{self._name}.{attr}"
+
+        def replayed(*args):
+            return _lookup(api, args)
+
+        setattr(self, attr, replayed)
+        return replayed
+
+
+trafficlight = _ReplayDomain("trafficlight")
+lane = _ReplayDomain("lane")
+vehicle = _ReplayDomain("vehicle")
+simulation = _ReplayDomain("simulation")
+junction = _ReplayDomain("junction")
+edge = _ReplayDomain("edge")
+
+
+def start(cmd=None, label=None, **kwargs):
+    """Load the trace set with use_trace(); cmd (the SUMO command) is unused."""
+    if _replay["path"] is None:
+        raise RuntimeError("replay backend: call use_trace(path) first")
+    _, calls = load_trace(_replay["path"])
+    index = {}
+    history = {}
+    commands = collections.Counter()
+    for t, api, args, result in calls:
+        if _is_command(api):
+            commands[(t, api, args)] += 1
+            continue
+        index.setdefault((t, api, args), collections.deque()).append(result)
+        times, values = history.setdefault((api, args), ([], []))
+        if times and times[-1] == t:
+            values[-1] = result
+        else:
+            times.append(t)
+            values.append(result)
+    _replay["index"] = index
+    _replay["history"] = history
+    _replay["commands"] = commands
+    _replay["time"] = 0
+    _replay["divergences"] = 0
+
+
+def simulationStep(step=0):
+    _replay["time"] = _advance(_replay["time"], (step,))
+    _lookup("simulationStep", (step,) if step else ())
+
+
+def close(wait=True):
+    _replay["index"] = None
+    _replay["history"] = None
+
+
+def divergences():
+    """Commands of the last replay that the recorded run did not issue."""
+    return _replay["divergences"]
@@ -0,0 +1,219 @@
+import collections
+import contextlib
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+# ---------------- PROFILING ----------------
+# Opt-in instrumentation of one run. A Profiler installed through
+# sumo_backend.on_select wraps the traci proxy so every call is counted and
+# timed per API (lane.getAllSubscriptionResults, trafficlight.setPhase,
+# simulationStep ...). The runner and the controllers time their phases
+# with profiler.section(name); disabled, run.profiler is NULL_PROFILER whose
+# section() hands back one shared no-op context manager, and the traci proxy
+# is left untouched.
+#
+# Sections timed by the runner / controllers:
+#   simulate      traci.simulationStep (SUMO stepping + round trip)
+#   control_tick  lane state read + controller decision, per decision step
+#   lane_read     read_lane_states
+#   pressure      pressure engine scoring (v3 / v4 / v5)
+#   forecast      queue forecaster update (QUEUE_INPUT "forecast" runs)
+#   metrics       vehicle metrics + results row
+#   gridlock      GridlockDetector update + check (early_gridlock runs)
+#   log_write     writer thread time spent writing logs (one sample per run)
+# -------------------------------------------
+
+PROFILED_DOMAINS = ["trafficlight", "lane", "vehicle", "simulation",
+                    "junction", "edge"]
+
+_NULL_SECTION = contextlib.nullcontext()
+
+
+class NullProfiler:
+    """What run.profiler is when profiling is off."""
+
+    def section(self, name):
+        return _NULL_SECTION
+
+    def record(self, name, seconds):
+        pass
+
+    def end_step(self, step):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class _Section:
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class _ProfiledDomain:
+
+    def __init__(self, domain, name, profiler):
+        self._domain = domain
+        self._name = name
+        self._profiler = profiler
+
+    def __getattr__(self, attr):
+        value = getattr(self._domain, attr)
+        if not callable(value) or isinstance(value, type):
+            return value
+        wrapped = self._profiler._timed(f"{self._name}.{attr}", value)
+        setattr(self, attr, wrapped)    # later lookups skip __getattr__
+        return wrapped
+
+
+class Profiler:
+
+    def __init__(self, timeline=False):
+        """timeline: also keep per-step section times and traci call counts"""
+        self.calls = collections.Counter()
+        self.call_seconds = collections.defaultdict(float)
+        self.samples = collections.defaultdict(list)
+        self.timeline = [] if timeline else None
+        self._step_seconds = collections.defaultdict(float)
+        self._step_calls = None
+        self._started = time.perf_counter()
+        self.wall_seconds = None
+
+    # ---- traci instrumentation (sumo_backend.on_select hook) ----
+    def install(self, proxy):
+        for name in PROFILED_DOMAINS:
+            if name in vars(proxy):
+                vars(proxy)[name] = _ProfiledDomain(
+                    vars(proxy)[name], name, self
+                )
+        vars(proxy)["simulationStep"] = self._timed(
+            "simulationStep", vars(proxy)["simulationStep"]
+        )
+
+    def _timed(self, api, func):
+        calls = self.calls
+        call_seconds = self.call_seconds
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                call_seconds[api] += time.perf_counter() - start
+                calls[api] += 1
+
+        return timed
+
+    # ---- sections ----
+    def section(self, name):
+        return _Section(self, name)
+
+    def record(self, name, seconds):
+        self.samples[name].append(seconds)
+        if self.timeline is not None:
+            self._step_seconds[name] += seconds
+
+    def end_step(self, step):
+        """Close the timeline row of step; the first call only starts it."""
+        if self.timeline is None:
+            return
+        total_calls = sum(self.calls.values())
+        if self._step_calls is not None:
+            self.timeline.append(
+                (step, dict(self._step_seconds), total_calls - self._step_calls)
+            )
+        self._step_seconds.clear()
+        self._step_calls = total_calls
+
+    def stop(self):
+        self.wall_seconds = time.perf_counter() - self._started
+
+    # ---- report ----
+    def report(self):
+        wall = self.wall_seconds
+        if wall is None:
+            wall = time.perf_counter() - self._started
+        sections = {}
+        for name, samples in self.samples.items():
+            ms = np.asarray(samples) * 1000
+            sections[name] = {
+                "count": len(samples),
+                "total_s": round(float(ms.sum()) / 1000, 6),
+                "mean_ms": round(float(ms.mean()), 4),
+                "p50_ms": round(float(np.percentile(ms, 50)), 4),
+                "p99_ms": round(float(np.percentile(ms, 99)), 4),
+            }
+        traci_calls = {
+            api: {
+                "calls": n,
+                "total_s": round(self.call_seconds[api], 6),
+                "mean_us": round(self.call_seconds[api] / n * 1e6, 2),
+            }
+            for api, n in self.calls.most_common()
+        }
+        return {
+            "wall_s": round(wall, 4),
+            "traci_total_s": round(sum(self.call_seconds.values()), 6),
+            "sections": sections,
+            "traci": traci_calls,
+        }
+
+    def format_report(self):
+        report = self.report()
+        lines = [
+            f"Profile: {report['wall_s']:.3f} s wall, "
+            f"{report['traci_total_s']:.3f} s in TraCI calls",
+            f"  {'section':24s} {'count':>8s} {'total s':>9s} "
+            f"{'p50 ms':>9s} {'p99 ms':>9s}",
+        ]
+        for name, s in sorted(report["sections"].items(),
+                              key=lambda item: -item[1]["total_s"]):
+            lines.append(f"  {name:24s} {s['count']:8d} {s['total_s']:9.3f} "
+                         f"{s['p50_ms']:9.3f} {s['p99_ms']:9.3f}")
+        lines.append(f"  {'traci api':48s} {'calls':>8s} {'total s':>9s} "
+                     f"{'mean us':>9s}")
+        for api, c in report["traci"].items():
+            lines.append(f"  {api:48s} {c['calls']:8d} {c['total_s']:9.3f} "
+                         f"{c['mean_us']:9.1f}")
+        return "\n".join(lines)
+
+    def save(self, out_dir, name):
+        """
+        profile_<name>.json and, with timeline, profile_timeline_<name>.csv
+        (one row per step: section times in ms and traci calls).
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = [os.path.join(out_dir, f"profile_{name}.json")]
+        with open(paths[0], "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+        if self.timeline is not None:
+            sections = sorted({s for _, times, _ in self.timeline for s in times})
+            paths.append(os.path.join(out_dir, f"profile_timeline_{name}.csv"))
+            with open(paths[1], "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(
+                    ["time", *(f"{s}_ms" for s in sections), "traci_calls"]
+                )
+                for step, times, calls in self.timeline:
+                    writer.writerow([
+                        step,
+                        *(round(times.get(s, 0.0) * 1000, 4) for s in sections),
+                        calls,
+                    ])
+        return paths
@@ -0,0 +1,50 @@
+import numpy as np
+import traci.constants as tc
+
+from sumo_backend import traci
+
+# ---------------- VEHICLE METRICS ----------------
+# One context subscription on an arbitrary junction with a range larger than
+# the network delivers the speed of every running vehicle after each
+# simulationStep, so the per-step metrics need a single TraCI call instead of
+# getIDList plus two getSpeed calls per vehicle.
+# -------------------------------------------------
+
+HALTED_SPEED = 0.1        # m/s, same threshold as the old per-vehicle loop
+CONTEXT_RANGE = 1e7       # m, covers any network we simulate
+
+_anchor = {"junction": None}
+
+
+def subscribe_vehicle_speeds():
+    junction = traci.junction.getIDList()[0]
+    traci.junction.subscribeContext(
+        junction, tc.CMD_GET_VEHICLE_VARIABLE, CONTEXT_RANGE, [tc.VAR_SPEED]
+    )
+    _anchor["junction"] = junction
+
+
+def vehicle_speeds():
+    """Speed of every running vehicle as a float64 array."""
+    results = traci.junction.getContextSubscriptionResults(_anchor["junction"])
+    if not results:
+        return np.zeros(0)
+    return np.fromiter(
+        (values[tc.VAR_SPEED] for values in results.values()),
+        dtype=np.float64, count=len(results)
+    )
+
+
+def read_vehicle_metrics():
+    """-> avg_speed, running, halted for the step just simulated"""
+    speeds = vehicle_speeds()
+    running = len(speeds)
+
+    if running == 0:
+        return 0.0, 0, 0
+
+    # cumsum adds left to right like the old sum() loop, so avg_speed stays
+    # bit-identical to earlier results files (np.mean sums pairwise)
+    avg_speed = float(speeds.cumsum()[-1]) / running
+    halted = int(np.count_nonzero(speeds < HALTED_SPEED))
+    return avg_speed, running, halted